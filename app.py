@@ -1,302 +1,289 @@
-from flask import Flask, render_template, request, send_file, flash, redirect, url_for, session
-import PyPDF2
-from docx import Document
+from flask import Flask, render_template, request, send_file, flash, redirect, url_for, session, jsonify, Response, g
 import io
+import json
+import logging
 import os
-import google.generativeai as genai
-from html.parser import HTMLParser
+import sqlite3
+import time
+import uuid
 from werkzeug.utils import secure_filename
 from dotenv import load_dotenv
+from job_queue import create_job_queue, current_job, DONE, FAILED
+from metrics import timed, request_log, record_document, annotate, render_prometheus
+from text_cache import content_key
+from upload_spool import open_mapped, spool_upload, remove_upload, remove_stale_uploads
+from relevance_filter import filter_lease_text
+from lease_diff import diff_lease, REVISION_MAX_CHANGED_RATIO
+from lease_corpus import extract_documents, build_corpus
+from template_model import compile_template, compile_template_upload
+from structured_extraction import render_term_sheet, encode_record, decode_record
+from result_store import create_result_store
+from lease_index import QueryError
+from tenant_usage import (get_usage_ledger, create_admission_control, create_tenant_directory, tenant_context,
+                          AdmissionError, TenantError, DEFAULT_TENANT)
+from lease_core import (read_document, read_document_pages, format_name, render_export, rent_terms_for,
+                        EXPORT_FORMATS, RENDER_VERSION,
+                        DEFAULT_TEMPLATE, get_result_cache, get_lease_index, stream_term_sheet,
+                        stream_revised_term_sheet, generate_structured_record, index_lease)
 
 # Load environment variables from .env file
 load_dotenv()
 
+# Pipeline stages report sizes and timings at INFO
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO'))
+
 app = Flask(__name__)
 app.secret_key = os.environ.get('SECRET_KEY', 'dev-secret-key-please-change-in-production')
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
-app.config['UPLOAD_FOLDER'] = '/tmp/uploads'
+# Uploads are spooled to UPLOAD_FOLDER and memory-mapped, so the limit is not bounded by RAM
+app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('MAX_UPLOAD_MB', '256')) * 1024 * 1024
+app.config['UPLOAD_FOLDER'] = os.environ.get('UPLOAD_FOLDER', '/tmp/uploads')
 
-# Ensure upload folder exists
+# Ensure upload folder exists, without files left by jobs that never ran
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+remove_stale_uploads(app.config['UPLOAD_FOLDER'], int(os.environ.get('UPLOAD_MAX_AGE_SECONDS', '86400')))
 
-class HTMLTextExtractor(HTMLParser):
-    """Extract text content from HTML"""
-    def __init__(self):
-        super().__init__()
-        self.text = []
-        self.skip_tags = set()
-        
-    def handle_starttag(self, tag, attrs):
-        # Skip content inside style and script tags
-        if tag in ('style', 'script'):
-            self.skip_tags.add(tag)
-            
-    def handle_endtag(self, tag):
-        # Re-enable content extraction when closing style/script tags
-        self.skip_tags.discard(tag)
-        
-    def handle_data(self, data):
-        # Only add data if we're not inside a skip tag
-        if not self.skip_tags and data.strip():
-            self.text.append(data.strip())
-        
-    def get_text(self):
-        return '\n'.join(self.text)
-
-def read_html(file):
-    """Extract text from HTML file
-    
-    Args:
-        file: A file-like object (from user upload or opened file)
-    """
-    # Always expect a file-like object, never a path string
-    html_content = file.read()
-    if isinstance(html_content, bytes):
-        html_content = html_content.decode('utf-8', errors='ignore')
-    
-    parser = HTMLTextExtractor()
-    parser.feed(html_content)
-    return parser.get_text()
-
-def read_pdf(file):
-    """Extract text from PDF file"""
-    pdf_reader = PyPDF2.PdfReader(file)
-    text = ""
-    for page in pdf_reader.pages:
-        text += page.extract_text() + "\n"
-    return text
-
-def read_docx(file):
-    """Extract text from DOCX file"""
-    doc = Document(file)
-    text = ""
-    for paragraph in doc.paragraphs:
-        text += paragraph.text + "\n"
-    return text
-
-def read_document(file, filename):
-    """Read document based on file type"""
-    if filename.endswith('.pdf'):
-        return read_pdf(file)
-    elif filename.endswith('.docx'):
-        return read_docx(file)
-    elif filename.endswith('.htm') or filename.endswith('.html'):
-        return read_html(file)
-    else:
-        return file.read().decode('utf-8')
-
-def create_docx_from_text(text):
-    """Create a DOCX document from text"""
-    doc = Document()
-    
-    # Split text into lines and add to document
-    lines = text.split('\n')
-    for line in lines:
-        doc.add_paragraph(line)
-    
-    # Save to BytesIO object
-    docx_file = io.BytesIO()
-    doc.save(docx_file)
-    docx_file.seek(0)
-    return docx_file
-
-def list_available_models(api_key):
-    """List available Gemini models"""
-    try:
-        genai.configure(api_key=api_key)
-        models = []
-        for model in genai.list_models():
-            if 'generateContent' in model.supported_generation_methods:
-                models.append(model.name)
-        return models
-    except Exception as e:
-        return []
-
-# Load default template from file
-def load_default_template():
-    """Load the default template from Term Sheet Template_app.html"""
-    template_path = os.path.join(os.path.dirname(__file__), "Term Sheet Template_app.html")
-    try:
-        if os.path.exists(template_path):
-            with open(template_path, 'r', encoding='utf-8', errors='ignore') as f:
-                return read_html(f)
-        else:
-            # Fallback to a basic template if file not found
-            return """COMMERCIAL LEASE TERM SHEET
-
-Property Address: [Address]
-Tenant Name: [Tenant Name]
-Landlord Name: [Landlord Name]
-
-LEASE TERMS:
-
-1. PREMISES
-   - Suite/Unit Number: [Suite]
-   - Rentable Square Feet: [SF]
-   - Use: [Permitted Use]
-
-2. LEASE TERM
-   - Commencement Date: [Date]
-   - Expiration Date: [Date]
-   - Term Length: [Years/Months]
-   - Option to Extend: [Yes/No, Terms]
-
-3. BASE RENT
-   - Initial Annual Base Rent: [Amount]
-   - Monthly Base Rent: [Amount]
-   - Rent Escalations: [Schedule]
-
-4. ADDITIONAL RENT
-   - Operating Expenses: [Details]
-   - Property Taxes: [Details]
-   - Utilities: [Responsibility]
-   - CAM Charges: [Details]
-
-5. SECURITY DEPOSIT
-   - Amount: [Amount]
-   - Terms: [Details]
-
-6. TENANT IMPROVEMENTS
-   - Tenant Improvement Allowance: [Amount]
-   - Construction Period: [Timeline]
-
-7. PARKING
-   - Number of Spaces: [Number]
-   - Type: [Reserved/Unreserved]
-   - Cost: [Amount if any]
-
-8. SPECIAL PROVISIONS
-   - [Any special terms or conditions]
-
-9. BROKER INFORMATION
-   - Landlord's Broker: [Name]
-   - Tenant's Broker: [Name]
-"""
-    except Exception as e:
-        # Return fallback template if there's an error
-        return """COMMERCIAL LEASE TERM SHEET
-
-Property Address: [Address]
-Tenant Name: [Tenant Name]
-Landlord Name: [Landlord Name]
-
-LEASE TERMS:
-
-1. PREMISES
-2. LEASE TERM
-3. BASE RENT
-4. ADDITIONAL RENT
-5. SECURITY DEPOSIT
-6. TENANT IMPROVEMENTS
-7. PARKING
-8. SPECIAL PROVISIONS
-9. BROKER INFORMATION
-"""
-
-DEFAULT_TEMPLATE = load_default_template()
-
-def generate_term_sheet(template_text, lease_text, api_key):
-    """Generate term sheet using Gemini API"""
-    
-    prompt = f"""You are a commercial real estate expert. You have been provided with:
-1. A lease term sheet template
-2. A full commercial lease document
-
-Your task is to analyze the commercial lease and extract all relevant information to create a completed lease term sheet that matches the template format exactly.
+# Background workers for term sheet generation (size set by JOB_WORKERS)
+job_queue = create_job_queue()
 
-LEASE TERM SHEET TEMPLATE:
-{template_text}
+# Persistent cache of generated term sheets, shared with app_streamlit.py
+result_cache = get_result_cache()
 
-COMMERCIAL LEASE:
-{lease_text}
+# Generated term sheets live server-side; the session only holds a result ID
+result_store = create_result_store()
+result_store.start_sweeper(int(os.environ.get('RESULT_SWEEP_INTERVAL_SECONDS', '600')))
+app.config['PERMANENT_SESSION_LIFETIME'] = result_store.ttl_seconds
 
-Please generate a completed lease term sheet that:
-1. Follows the exact structure and format of the template
-2. Extracts all relevant information from the commercial lease
-3. Fills in all sections of the template with appropriate data from the lease
-4. Maintains professional formatting
-5. Uses clear, concise language
-6. If information is not found in the lease, indicate "Not specified in lease"
+# Every generated term sheet is also indexed for search across the portfolio
+lease_index = get_lease_index()
 
-Generate the completed lease term sheet now:"""
+# Gemini usage is accounted per tenant (team); jobs over a tenant's limits are refused
+usage_ledger = get_usage_ledger()
+admission = create_admission_control(usage_ledger)
+tenants = create_tenant_directory()
 
-    try:
-        genai.configure(api_key=api_key)
-        # Use gemini-2.5-pro for advanced lease analysis capabilities
-        model = genai.GenerativeModel('gemini-2.5-pro')
-        
-        full_prompt = f"""You are an expert commercial real estate attorney specializing in lease analysis and term sheet creation.
+def request_tenant():
+    """The tenant a request is accounted to: the X-Tenant header, else the team set in the session
 
-{prompt}"""
-        
-        response = model.generate_content(
-            full_prompt,
-            generation_config=genai.types.GenerationConfig(
-                temperature=0.3,
-                max_output_tokens=4000,
-            )
-        )
-        return response.text
-        
-    except Exception as e:
-        error_msg = str(e)
-        # If model not found, try to list available models
-        if "not found" in error_msg.lower() or "not supported" in error_msg.lower():
-            available_models = list_available_models(api_key)
-            if available_models:
-                models_str = "\n".join([f"  - {m}" for m in available_models])
-                return f"Error: The specified model is not available.\n\nAvailable models that support content generation:\n{models_str}\n\nOriginal error: {error_msg}"
-            else:
-                return f"Error generating term sheet: {error_msg}\n\nTip: Common model names include 'gemini-2.5-pro', 'gemini-1.5-flash', 'gemini-1.5-pro', or 'gemini-pro'"
-        return f"Error generating term sheet: {error_msg}"
+    Raises TenantError for a tenant that is not configured or a missing X-Tenant-Key.
+    """
+    if request.headers.get('X-Tenant'):
+        return tenants.resolve(request.headers['X-Tenant'], request.headers.get('X-Tenant-Key'))
+    # Session teams were checked when they were set; one since removed falls back to the default
+    tenant = session.get('tenant')
+    return tenant if tenant in tenants.names else DEFAULT_TENANT
+
+@app.before_request
+def start_request_log():
+    """Give every request an ID (X-Request-ID if the caller sent one) and time it"""
+    g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex
+    g.request_log = request_log(g.request_id, method=request.method, path=request.path)
+    g.request_log.__enter__()
+
+@app.after_request
+def add_request_id(response):
+    response.headers['X-Request-ID'] = g.request_id
+    annotate(status=response.status_code)
+    return response
+
+@app.teardown_request
+def finish_request_log(exc):
+    request_log_cm = g.pop('request_log', None)
+    if request_log_cm is not None:
+        request_log_cm.__exit__(type(exc) if exc else None, exc, exc.__traceback__ if exc else None)
 
 @app.route('/')
 def index():
     """Home page with upload form"""
-    # Get API key from environment variable or session
-    default_api_key = os.environ.get('GEMINI_API_KEY')
-    api_key_configured = default_api_key is not None or session.get('api_key') is not None
+    # Get API key from environment variable (the shared key pool) or session
+    default_api_key = os.environ.get('GEMINI_API_KEYS') or os.environ.get('GEMINI_API_KEY')
+    api_key_configured = bool(default_api_key) or session.get('api_key') is not None
+    
+    # A previous result with a lease snapshot can be revised with an amended lease
+    prior = result_store.get(session.get('result_id'))
+    revise_filename = prior['lease_filename'] if prior and prior['lease_text'] else None
     
     return render_template('index.html', 
                          default_template_preview=DEFAULT_TEMPLATE[:1000],
-                         api_key_configured=api_key_configured)
+                         api_key_configured=api_key_configured,
+                         tenant=session.get('tenant', ''),
+                         revise_filename=revise_filename)
 
 @app.route('/set_api_key', methods=['POST'])
 def set_api_key():
-    """Set the API key in session"""
+    """Set the API key and team in session"""
     api_key = request.form.get('api_key', '').strip()
+    tenant = request.form.get('tenant', '').strip()
+    if tenant:
+        try:
+            session['tenant'] = tenants.resolve(tenant, request.form.get('tenant_key', ''))
+        except TenantError as e:
+            flash(str(e), 'error')
+            return redirect(url_for('index'))
     if api_key:
         session['api_key'] = api_key
         flash('API key set successfully!', 'success')
+    elif tenant:
+        flash(f"Usage is now accounted to {session['tenant']}.", 'success')
     else:
         flash('Please provide a valid API key.', 'error')
     return redirect(url_for('index'))
 
+def run_generation_job(lease_uploads, lease_filename, template_text, api_key, full_text=False,
+                       structured=False, prior_result_id=None, request_id=None, tenant=None):
+    """Background job: extract the lease text and generate the term sheet
+
+    lease_uploads holds (path, filename, text key) for each uploaded
+    document, spooled to UPLOAD_FOLDER; the files are deleted once the job
+    has finished. Several documents (a lease with its amendments and
+    exhibits) are merged into one corpus first.
+
+    With prior_result_id, the lease is treated as a revision of that result:
+    only the sections that changed since its lease text snapshot are sent,
+    together with its term sheet, unless too much of the lease changed.
+
+    api_key is the user's own key, or None for the shared key pool; either
+    way Gemini usage is accounted to tenant.
+    """
+    # The job logs under the ID of the request that enqueued it
+    with request_log(request_id or uuid.uuid4().hex, job=True, lease_filename=lease_filename,
+                     tenant=tenant), tenant_context(tenant):
+        try:
+            return _generate_for_job(lease_uploads, lease_filename, template_text, api_key,
+                                     full_text, structured, prior_result_id)
+        finally:
+            for lease_path, _, _ in lease_uploads:
+                remove_upload(lease_path)
+
+def extract_upload(upload):
+    """Extract one spooled upload as (filename, pages, size in bytes)"""
+    lease_path, filename, text_key = upload
+    with open_mapped(lease_path) as lease_file:
+        pages = read_document_pages(lease_file, filename, text_key)
+    return filename, pages, os.path.getsize(lease_path)
+
+def read_lease_uploads(lease_uploads, lease_filename):
+    """Return (lease text, legend, per-document info) for one or more spooled uploads"""
+    if len(lease_uploads) == 1:
+        lease_path, filename, text_key = lease_uploads[0]
+        with open_mapped(lease_path) as lease_file:
+            lease_text = read_document(lease_file, filename, text_key)
+        record_document(format_name(filename), os.path.getsize(lease_path), len(lease_text))
+        return lease_text, '', []
+    
+    documents = extract_documents(lease_uploads, extract_upload)
+    for document in documents:
+        record_document(format_name(document.filename), document.size_bytes, document.chars)
+    corpus = build_corpus(documents)
+    app.logger.info('%s: %s', lease_filename, corpus.summary())
+    documents_info = [document.to_dict() for document in corpus.documents]
+    annotate(documents=documents_info, text_chars=len(corpus.text))
+    return corpus.text, corpus.legend, documents_info
+
+def _generate_for_job(lease_uploads, lease_filename, template_text, api_key, full_text,
+                      structured, prior_result_id):
+    with timed('extract'):
+        lease_text, legend, documents = read_lease_uploads(lease_uploads, lease_filename)
+    if documents:
+        # Name the result after the base lease rather than the first file uploaded
+        lease_filename = f"{documents[0]['filename']} (+{len(lease_uploads) - 1} documents)"
+    job = current_job()
+    
+    if structured:
+        # Extract a typed record and render the prose term sheet from it locally
+        with timed('filter'):
+            filtered = filter_lease_text(lease_text, template_text, full_text=full_text)
+        app.logger.info('%s: %s', lease_filename, filtered.summary())
+        compiled = compile_template(template_text)
+        record, error = generate_structured_record(compiled, legend + filtered.text, api_key)
+        with timed('render_text'):
+            term_sheet = error or render_term_sheet(compiled, record)
+        if job is not None:
+            job.append_output(term_sheet)
+        with timed('store'):
+            result_id = result_store.save(term_sheet, lease_filename, lease_text=lease_text,
+                                          record=encode_record(record) if record is not None else None)
+        if not error:
+            index_lease(term_sheet, lease_filename, lease_text, template_text, record, result_id)
+        return {'result_id': result_id, 'lease_filename': lease_filename, 'documents': documents}
+    
+    stream = None
+    prior = result_store.get(prior_result_id)
+    if prior and prior['lease_text']:
+        with timed('diff'):
+            diff = diff_lease(prior['lease_text'], lease_text)
+        app.logger.info('%s: revision of %s: %s', lease_filename, prior['lease_filename'], diff.summary())
+        if diff.changed_ratio <= REVISION_MAX_CHANGED_RATIO:
+            stream = stream_revised_term_sheet(prior['term_sheet'], diff, api_key)
+    if stream is None:
+        # Send only the passages relevant to the template unless full text was requested
+        with timed('filter'):
+            filtered = filter_lease_text(lease_text, template_text, full_text=full_text)
+        app.logger.info('%s: %s', lease_filename, filtered.summary())
+        stream = stream_term_sheet(template_text, legend + filtered.text, api_key)
+    
+    # Publish text as it streams in so /jobs/<id>/stream can forward it
+    parts = []
+    for text in stream:
+        parts.append(text)
+        if job is not None:
+            job.append_output(text)
+    with timed('store'):
+        result_id = result_store.save(''.join(parts), lease_filename, lease_text=lease_text)
+    index_lease(''.join(parts), lease_filename, lease_text, template_text, result_id=result_id)
+    return {'result_id': result_id, 'lease_filename': lease_filename, 'documents': documents}
+
 @app.route('/generate', methods=['POST'])
 def generate():
-    """Generate term sheet from uploaded files"""
-    # Get API key
-    api_key = session.get('api_key') or os.environ.get('GEMINI_API_KEY')
+    """Enqueue term sheet generation for the uploaded files"""
+    # A user's own key, or None for the shared pool of GEMINI_API_KEYS
+    api_key = session.get('api_key')
     
-    if not api_key:
+    if not api_key and not (os.environ.get('GEMINI_API_KEYS') or os.environ.get('GEMINI_API_KEY')):
         flash('Please configure your Gemini API key first.', 'error')
         return redirect(url_for('index'))
     
+    # Refuse work over the tenant's limits before anything is uploaded or sent to Gemini
+    try:
+        tenant = request_tenant()
+    except TenantError as e:
+        if request.accept_mimetypes.best == 'application/json':
+            return jsonify({'error': str(e), 'reason': 'tenant'}), 403
+        flash(str(e), 'error')
+        return redirect(url_for('index'))
+    try:
+        admission.check(tenant, job_queue.queued(tenant))
+    except AdmissionError as e:
+        annotate(tenant=tenant, rejected=e.reason)
+        if request.accept_mimetypes.best == 'application/json':
+            response = jsonify({'error': str(e), 'reason': e.reason, 'retry_after': e.retry_after})
+            response.headers['Retry-After'] = str(e.retry_after)
+            return response, 429
+        flash(str(e), 'error')
+        return redirect(url_for('index'))
+    
     # Check if lease file is uploaded
     if 'lease_file' not in request.files:
         flash('No lease file uploaded.', 'error')
         return redirect(url_for('index'))
     
-    lease_file = request.files['lease_file']
+    # A lease may come with its amendments and exhibits
+    lease_files = [f for f in request.files.getlist('lease_file') if f.filename != '']
     
-    if lease_file.filename == '':
+    if not lease_files:
         flash('No lease file selected.', 'error')
         return redirect(url_for('index'))
     
+    lease_uploads = []
     try:
-        # Read lease document
-        lease_filename = secure_filename(lease_file.filename)
-        lease_text = read_document(lease_file, lease_filename)
+        # Spool the uploads to disk now, hashing them on the way; extraction happens on the worker
+        for lease_file in lease_files:
+            filename = secure_filename(lease_file.filename)
+            lease_path, lease_digest, _ = spool_upload(lease_file.stream, app.config['UPLOAD_FOLDER'],
+                                                       filename)
+            lease_uploads.append((lease_path, filename, content_key(lease_digest, filename)))
+        lease_filename = lease_uploads[0][1]
+        if len(lease_uploads) > 1:
+            lease_filename += f" (+{len(lease_uploads) - 1} documents)"
         
         # Get template text
         use_custom_template = request.form.get('use_custom_template') == 'on'
@@ -305,65 +292,249 @@ def generate():
             template_file = request.files['template_file']
             if template_file.filename != '':
                 template_filename = secure_filename(template_file.filename)
-                template_text = read_document(template_file, template_filename)
+                compiled = compile_template_upload(
+                    template_file.read(), template_filename,
+                    lambda data: read_document(io.BytesIO(data), template_filename))
+                template_text = compiled.text
             else:
                 template_text = DEFAULT_TEMPLATE
         else:
             template_text = DEFAULT_TEMPLATE
         
-        # Generate term sheet
-        term_sheet = generate_term_sheet(template_text, lease_text, api_key)
+        full_text = request.form.get('full_text') == 'on'
+        structured = request.form.get('structured') == 'on'
+        # Revise the term sheet currently in the session instead of starting over
+        prior_result_id = session.get('result_id') if request.form.get('revise') == 'on' else None
+        job_id = job_queue.submit_for(tenant, run_generation_job, lease_uploads, lease_filename,
+                                      template_text, api_key, full_text, structured, prior_result_id,
+                                      g.request_id, tenant)
+        # The job deletes the spooled uploads when it finishes
+        lease_uploads = []
         
-        # Store in session for display and download
-        session['term_sheet'] = term_sheet
+        # Keep only the job ID in the session; /result polls until it finishes
+        session.pop('result_id', None)
+        session['job_id'] = job_id
         session['lease_filename'] = lease_filename
         
-        flash('Term sheet generated successfully!', 'success')
+        if request.accept_mimetypes.best == 'application/json':
+            return jsonify({
+                'job_id': job_id,
+                'status_url': url_for('job_status', job_id=job_id),
+                'result_url': url_for('job_result', job_id=job_id),
+            }), 202
+        
         return redirect(url_for('result'))
         
     except Exception as e:
+        for lease_path, _, _ in lease_uploads:
+            remove_upload(lease_path)
         flash(f'Error processing documents: {str(e)}', 'error')
         return redirect(url_for('index'))
 
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    """Report the status of a background generation job"""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    status = job.to_dict()
+    status['result_url'] = url_for('job_result', job_id=job_id)
+    return jsonify(status)
+
+@app.route('/jobs/<job_id>/result')
+def job_result(job_id):
+    """Return the generated term sheet once the job has finished"""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    if job.status == FAILED:
+        return jsonify({'status': job.status, 'error': job.error}), 500
+    if job.status != DONE:
+        return jsonify({'status': job.status}), 202
+    stored = result_store.get(job.result['result_id'])
+    if stored is None:
+        return jsonify({'error': 'Result expired'}), 404
+    return jsonify({
+        'status': job.status,
+        'result_id': stored['id'],
+        'term_sheet': stored['term_sheet'],
+        'record': decode_record(stored['record']),
+        'lease_filename': stored['lease_filename'],
+        'documents': job.result.get('documents', []),
+    })
+
+@app.route('/jobs/<job_id>/stream')
+def job_stream(job_id):
+    """Stream a job's term sheet text as Server-Sent Events while it is generated"""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    
+    def events():
+        sent = 0
+        while True:
+            finished = job.status in (DONE, FAILED)
+            # Read the status first so no output appended before completion is missed
+            while sent < len(job.output):
+                yield f"event: delta\ndata: {json.dumps({'text': job.output[sent]})}\n\n"
+                sent += 1
+            if finished:
+                yield f"event: {job.status}\ndata: {json.dumps({'error': job.error})}\n\n"
+                return
+            time.sleep(0.1)
+    
+    return Response(events(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/result')
 def result():
     """Display the generated term sheet"""
-    term_sheet = session.get('term_sheet')
-    lease_filename = session.get('lease_filename', 'unknown')
+    job_id = session.get('job_id')
+    if job_id:
+        job = job_queue.get(job_id)
+        if job is None:
+            session.pop('job_id', None)
+            flash('The generation job has expired. Please try again.', 'error')
+            return redirect(url_for('index'))
+        if job.status == FAILED:
+            session.pop('job_id', None)
+            flash(f'Error processing documents: {job.error}', 'error')
+            return redirect(url_for('index'))
+        if job.status != DONE:
+            return render_template('result.html',
+                                 job_id=job_id,
+                                 lease_filename=session.get('lease_filename', 'unknown'))
+        
+        # Remember the result for display and download
+        session.pop('job_id', None)
+        session.pop('lease_filename', None)
+        session['result_id'] = job.result['result_id']
+        session.permanent = True
+        flash('Term sheet generated successfully!', 'success')
     
-    if not term_sheet:
+    stored = result_store.get(session.get('result_id'))
+    
+    if not stored:
         flash('No term sheet generated yet.', 'error')
         return redirect(url_for('index'))
     
     return render_template('result.html', 
-                         term_sheet=term_sheet,
-                         lease_filename=lease_filename)
+                         term_sheet=stored['term_sheet'],
+                         lease_filename=stored['lease_filename'] or 'unknown')
+
+def result_rent_terms(result_id, stored):
+    """Rent schedule inputs for a stored result, or None when its rent or term is missing
+
+    Structured results keep their record; prose term sheets use the record
+    parsed from them when they were indexed.
+    """
+    if stored['record']:
+        record = decode_record(stored['record'])
+    else:
+        try:
+            record = lease_index.record_for_result(result_id)
+        except sqlite3.Error as e:
+            app.logger.warning('Could not look up the record of %s: %s', result_id, e)
+            record = None
+    return rent_terms_for(record, stored['term_sheet'])
 
 @app.route('/download')
 def download():
-    """Download the generated term sheet as DOCX"""
-    term_sheet = session.get('term_sheet')
-    
-    if not term_sheet:
-        flash('No term sheet to download.', 'error')
-        return redirect(url_for('index'))
+    """Download the generated term sheet as DOCX, or as PDF with format=pdf
+
+    Each format is rendered once per result and stored with it, so repeated
+    downloads are served from the store.
+    """
+    export_format = request.args.get('format', 'docx')
+    if export_format not in EXPORT_FORMATS:
+        flash(f'Unknown download format: {export_format}', 'error')
+        return redirect(url_for('result'))
+    mimetype, extension = EXPORT_FORMATS[export_format]
+    render_name = f"{export_format}-v{RENDER_VERSION}"
+    result_id = session.get('result_id')
     
     try:
-        docx_file = create_docx_from_text(term_sheet)
+        data = result_store.get_render(result_id, render_name)
+        annotate(render_cache='hit' if data is not None else 'miss')
+        if data is None:
+            stored = result_store.get(result_id)
+            if not stored:
+                flash('No term sheet to download.', 'error')
+                return redirect(url_for('index'))
+            rent_terms = result_rent_terms(result_id, stored)
+            with timed('render'):
+                data = render_export(stored['term_sheet'], export_format, rent_terms)
+            result_store.save_render(result_id, render_name, data)
         return send_file(
-            docx_file,
-            mimetype='application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+            io.BytesIO(data),
+            mimetype=mimetype,
             as_attachment=True,
-            download_name='lease_term_sheet.docx'
+            download_name=f'lease_term_sheet{extension}',
+            etag=f"{result_id}-{render_name}",
         )
     except Exception as e:
         flash(f'Error creating download: {str(e)}', 'error')
         return redirect(url_for('result'))
 
+@app.route('/cache/stats')
+def cache_stats():
+    """Report result cache hit/miss counters"""
+    return jsonify(result_cache.stats())
+
+@app.route('/usage')
+def usage():
+    """Report Gemini usage per tenant (and per API key with by_key=on) over the last days"""
+    days = max(1, request.args.get('days', 1, type=int))
+    summary = usage_ledger.summary(days, by_key=request.args.get('by_key') == 'on')
+    for entry in summary:
+        entry['queued'] = job_queue.queued(entry['tenant'])
+        entry['daily_budget'] = admission.budget(entry['tenant'])
+    return jsonify({'days': days, 'tenants': summary})
+
+@app.route('/leases/search')
+def search_leases():
+    """Search indexed leases by full text (q) and field conditions (where), newest first
+
+    Example: /leases/search?where=expiration_date>=2027-01-01&where=expiration_date<2028-01-01
+    &where=rent_psf>40&fields=rent_psf,expiration_date. Pass next_cursor back as cursor for
+    the next page.
+    """
+    fields = [name for name in request.args.get('fields', '').split(',') if name]
+    try:
+        page = lease_index.search(query=request.args.get('q') or None,
+                                  conditions=request.args.getlist('where'),
+                                  limit=request.args.get('limit', 50, type=int),
+                                  cursor=request.args.get('cursor') or None,
+                                  fields=fields)
+    except QueryError as e:
+        return jsonify({'error': str(e)}), 400
+    if page['next_cursor']:
+        args = request.args.to_dict(flat=False)
+        args['cursor'] = page['next_cursor']
+        page['next_url'] = url_for('search_leases', **args)
+    return jsonify(page)
+
+@app.route('/leases/<int:lease_id>')
+def lease_detail(lease_id):
+    """Return an indexed lease with its term sheet, record and fields"""
+    lease = lease_index.get(lease_id)
+    if lease is None:
+        return jsonify({'error': 'Unknown lease'}), 404
+    if request.args.get('lease_text') != 'on':
+        # Lease text can be megabytes; only send it when asked for
+        lease.pop('lease_text')
+    return jsonify(lease)
+
+@app.route('/metrics')
+def metrics():
+    """Expose stage latencies, document sizes, token counts and errors to Prometheus"""
+    return Response(render_prometheus(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/clear')
 def clear():
     """Clear the session and start over"""
-    session.pop('term_sheet', None)
+    session.pop('result_id', None)
+    session.pop('job_id', None)
     session.pop('lease_filename', None)
     flash('Session cleared. You can start a new analysis.', 'info')
     return redirect(url_for('index'))
@@ -1,10 +1,20 @@
 import streamlit as st
-import PyPDF2
-from docx import Document
-import io
-import os
-import google.generativeai as genai
-from html.parser import HTMLParser
+import hashlib
+import logging
+import uuid
+from metrics import timed, request_log, record_document, annotate
+from text_cache import content_key
+from relevance_filter import filter_lease_text
+from lease_diff import diff_lease, REVISION_MAX_CHANGED_RATIO
+from key_pool import load_api_keys
+from tenant_usage import (create_admission_control, create_tenant_directory, tenant_context,
+                          AdmissionError, TenantError)
+from lease_corpus import extract_documents, build_corpus
+from template_model import compile_template, compile_template_upload
+from structured_extraction import render_term_sheet, parse_term_sheet
+from lease_core import (read_document, read_document_pages, format_name, render_exports, rent_terms_for,
+                        DEFAULT_TEMPLATE, get_result_cache, stream_term_sheet, stream_revised_term_sheet,
+                        generate_structured_record, index_lease, GenerationError)
 
 # Set page configuration
 st.set_page_config(
@@ -13,238 +23,38 @@ st.set_page_config(
     layout="wide"
 )
 
-class HTMLTextExtractor(HTMLParser):
-    """Extract text content from HTML"""
-    def __init__(self):
-        super().__init__()
-        self.text = []
-        self.skip_tags = set()
-        
-    def handle_starttag(self, tag, attrs):
-        # Skip content inside style and script tags
-        if tag in ('style', 'script'):
-            self.skip_tags.add(tag)
-            
-    def handle_endtag(self, tag):
-        # Re-enable content extraction when closing style/script tags
-        self.skip_tags.discard(tag)
-        
-    def handle_data(self, data):
-        # Only add data if we're not inside a skip tag
-        if not self.skip_tags and data.strip():
-            self.text.append(data.strip())
-        
-    def get_text(self):
-        return '\n'.join(self.text)
-
-def read_html(file):
-    """Extract text from HTML file"""
-    if isinstance(file, str):
-        # File path
-        with open(file, 'r', encoding='utf-8', errors='ignore') as f:
-            html_content = f.read()
-    else:
-        # File-like object
-        html_content = file.read()
-        if isinstance(html_content, bytes):
-            html_content = html_content.decode('utf-8', errors='ignore')
-    
-    parser = HTMLTextExtractor()
-    parser.feed(html_content)
-    return parser.get_text()
-
-def read_pdf(file):
-    """Extract text from PDF file"""
-    pdf_reader = PyPDF2.PdfReader(file)
-    text = ""
-    for page in pdf_reader.pages:
-        text += page.extract_text() + "\n"
-    return text
-
-def read_docx(file):
-    """Extract text from DOCX file"""
-    doc = Document(file)
-    text = ""
-    for paragraph in doc.paragraphs:
-        text += paragraph.text + "\n"
-    return text
-
-def read_document(file):
-    """Read document based on file type"""
-    if file.name.endswith('.pdf'):
-        return read_pdf(file)
-    elif file.name.endswith('.docx'):
-        return read_docx(file)
-    elif file.name.endswith('.htm') or file.name.endswith('.html'):
-        return read_html(file)
-    else:
-        return file.read().decode('utf-8')
-
-def create_docx_from_text(text):
-    """Create a DOCX document from text"""
-    doc = Document()
-    
-    # Split text into lines and add to document
-    lines = text.split('\n')
-    for line in lines:
-        doc.add_paragraph(line)
-    
-    # Save to BytesIO object
-    docx_file = io.BytesIO()
-    doc.save(docx_file)
-    docx_file.seek(0)
-    return docx_file.getvalue()
-
-def list_available_models(api_key):
-    """List available Gemini models"""
-    try:
-        genai.configure(api_key=api_key)
-        models = []
-        for model in genai.list_models():
-            if 'generateContent' in model.supported_generation_methods:
-                models.append(model.name)
-        return models
-    except Exception as e:
-        return []
-
-# Load default template from file
-def load_default_template():
-    """Load the default template from Term Sheet Template_app.html"""
-    template_path = os.path.join(os.path.dirname(__file__), "Term Sheet Template_app.html")
-    try:
-        if os.path.exists(template_path):
-            return read_html(template_path)
-        else:
-            # Fallback to a basic template if file not found
-            return """COMMERCIAL LEASE TERM SHEET
-
-Property Address: [Address]
-Tenant Name: [Tenant Name]
-Landlord Name: [Landlord Name]
-
-LEASE TERMS:
-
-1. PREMISES
-   - Suite/Unit Number: [Suite]
-   - Rentable Square Feet: [SF]
-   - Use: [Permitted Use]
-
-2. LEASE TERM
-   - Commencement Date: [Date]
-   - Expiration Date: [Date]
-   - Term Length: [Years/Months]
-   - Option to Extend: [Yes/No, Terms]
-
-3. BASE RENT
-   - Initial Annual Base Rent: [Amount]
-   - Monthly Base Rent: [Amount]
-   - Rent Escalations: [Schedule]
-
-4. ADDITIONAL RENT
-   - Operating Expenses: [Details]
-   - Property Taxes: [Details]
-   - Utilities: [Responsibility]
-   - CAM Charges: [Details]
-
-5. SECURITY DEPOSIT
-   - Amount: [Amount]
-   - Terms: [Details]
+# Persistent cache of generated term sheets, shared with app.py
+result_cache = get_result_cache()
 
-6. TENANT IMPROVEMENTS
-   - Tenant Improvement Allowance: [Amount]
-   - Construction Period: [Timeline]
+# Gemini usage is accounted per tenant (team), as in app.py
+tenants = create_tenant_directory()
+admission = create_admission_control()
 
-7. PARKING
-   - Number of Spaces: [Number]
-   - Type: [Reserved/Unreserved]
-   - Cost: [Amount if any]
+def upload_text_key(file):
+    """Text cache key of an upload; uploads are already in memory, so hashing does not read the file again"""
+    return content_key(hashlib.sha256(file.getvalue()).hexdigest(), file.name)
 
-8. SPECIAL PROVISIONS
-   - [Any special terms or conditions]
+def read_lease_files(lease_files):
+    """Return (lease text, legend, per-document info) for one or more uploaded files
 
-9. BROKER INFORMATION
-   - Landlord's Broker: [Name]
-   - Tenant's Broker: [Name]
-"""
-    except Exception as e:
-        # Return fallback template if there's an error
-        return """COMMERCIAL LEASE TERM SHEET
-
-Property Address: [Address]
-Tenant Name: [Tenant Name]
-Landlord Name: [Landlord Name]
-
-LEASE TERMS:
-
-1. PREMISES
-2. LEASE TERM
-3. BASE RENT
-4. ADDITIONAL RENT
-5. SECURITY DEPOSIT
-6. TENANT IMPROVEMENTS
-7. PARKING
-8. SPECIAL PROVISIONS
-9. BROKER INFORMATION
-"""
-
-DEFAULT_TEMPLATE = load_default_template()
-
-def generate_term_sheet(template_text, lease_text, api_key):
-    """Generate term sheet using Gemini API"""
+    Several files (a lease with its amendments and exhibits) are extracted
+    concurrently and merged into one corpus.
+    """
+    if len(lease_files) == 1:
+        lease_text = read_document(lease_files[0], lease_files[0].name, upload_text_key(lease_files[0]))
+        record_document(format_name(lease_files[0].name), lease_files[0].size, len(lease_text))
+        return lease_text, '', []
     
-    prompt = f"""You are a commercial real estate expert. You have been provided with:
-1. A lease term sheet template
-2. A full commercial lease document
-
-Your task is to analyze the commercial lease and extract all relevant information to create a completed lease term sheet that matches the template format exactly.
-
-LEASE TERM SHEET TEMPLATE:
-{template_text}
-
-COMMERCIAL LEASE:
-{lease_text}
+    documents = extract_documents(lease_files, lambda f: (
+        f.name, read_document_pages(f, f.name, upload_text_key(f)), f.size))
+    for document in documents:
+        record_document(format_name(document.filename), document.size_bytes, document.chars)
+    corpus = build_corpus(documents)
+    logging.getLogger(__name__).info('%s', corpus.summary())
+    documents_info = [document.to_dict() for document in corpus.documents]
+    annotate(documents=documents_info, text_chars=len(corpus.text))
+    return corpus.text, corpus.legend, documents_info
 
-Please generate a completed lease term sheet that:
-1. Follows the exact structure and format of the template
-2. Extracts all relevant information from the commercial lease
-3. Fills in all sections of the template with appropriate data from the lease
-4. Maintains professional formatting
-5. Uses clear, concise language
-6. If information is not found in the lease, indicate "Not specified in lease"
-
-Generate the completed lease term sheet now:"""
-
-    try:
-        genai.configure(api_key=api_key)
-        # Use gemini-2.5-pro for advanced lease analysis capabilities
-        model = genai.GenerativeModel('gemini-2.5-pro')
-        
-        full_prompt = f"""You are an expert commercial real estate attorney specializing in lease analysis and term sheet creation.
-
-{prompt}"""
-        
-        response = model.generate_content(
-            full_prompt,
-            generation_config=genai.types.GenerationConfig(
-                temperature=0.3,
-                max_output_tokens=4000,
-            )
-        )
-        return response.text
-        
-    except Exception as e:
-        error_msg = str(e)
-        # If model not found, try to list available models
-        if "not found" in error_msg.lower() or "not supported" in error_msg.lower():
-            available_models = list_available_models(api_key)
-            if available_models:
-                models_str = "\n".join([f"  - {m}" for m in available_models])
-                return f"Error: The specified model is not available.\n\nAvailable models that support content generation:\n{models_str}\n\nOriginal error: {error_msg}"
-            else:
-                return f"Error generating term sheet: {error_msg}\n\nTip: Common model names include 'gemini-2.5-pro', 'gemini-1.5-flash', 'gemini-1.5-pro', or 'gemini-pro'"
-        return f"Error generating term sheet: {error_msg}"
-
-# Main app
 def main():
     st.title("📄 Lease Term Sheet Generator")
     st.markdown("""
@@ -255,27 +65,27 @@ def main():
     # API Key configuration
     st.sidebar.header("Configuration")
     
-    # Try to get default API key from secrets
+    # The shared pool of GEMINI_API_KEYS (api_key None), else a default key from secrets
+    pooled = bool(load_api_keys())
     default_api_key = None
-    try:
-        default_api_key = st.secrets.get('gemini', {}).get('api_key', None)
-    except Exception:
-        pass
+    if not pooled:
+        try:
+            default_api_key = st.secrets.get('gemini', {}).get('api_key', None)
+        except Exception:
+            pass
     
     # API Key input - optional if default is available
-    if default_api_key:
-        st.sidebar.success("✅ Using default Gemini API key")
+    if pooled or default_api_key:
+        st.sidebar.success("✅ Using the shared Gemini API key pool" if pooled else "✅ Using default Gemini API key")
         use_custom_key = st.sidebar.checkbox("Use custom API key", value=False)
+        api_key = None
         if use_custom_key:
             api_key = st.sidebar.text_input(
                 "Google Gemini API Key", 
                 type="password",
                 help="Enter your Google Gemini API key to override the default"
             )
-            if not api_key:
-                api_key = default_api_key
-        else:
-            api_key = default_api_key
+        api_key = api_key or default_api_key
     else:
         st.sidebar.info("💡 No default API key configured")
         api_key = st.sidebar.text_input(
@@ -284,7 +94,22 @@ def main():
             help="Enter your Google Gemini API key to enable AI-powered analysis"
         )
     
-    if not api_key:
+    team = st.sidebar.text_input("Team (optional)", help="Gemini usage and limits are tracked per team")
+    team_key = st.sidebar.text_input("Team key", type="password", help="Only needed if your team has one")
+    try:
+        tenant = tenants.resolve(team, team_key)
+    except TenantError as e:
+        st.sidebar.error(str(e))
+        return
+    
+    # Result cache counters
+    cache_stats = result_cache.stats()
+    st.sidebar.caption(
+        f"Result cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses, "
+        f"{cache_stats['entries']} entries"
+    )
+    
+    if not api_key and not pooled:
         st.warning("⚠️ Please enter your Google Gemini API key in the sidebar to use this application.")
         st.info("""
         To use this application:
@@ -319,66 +144,145 @@ def main():
     
     with col2:
         st.subheader("2️⃣ Upload Commercial Lease")
-        lease_file = st.file_uploader(
+        lease_files = st.file_uploader(
             "Upload lease (PDF, DOCX, or TXT)",
             type=['pdf', 'docx', 'txt'],
             key="lease",
-            help="Upload the commercial lease document to analyze"
+            accept_multiple_files=True,
+            help="Upload the commercial lease document to analyze, together with any amendments and exhibits; later amendments take precedence"
         )
         
-        if lease_file:
-            st.success(f"✅ Lease uploaded: {lease_file.name}")
+        if lease_files:
+            st.success(f"✅ Lease uploaded: {', '.join(f.name for f in lease_files)}")
+        
+        full_text = st.checkbox("Send full lease text", value=False,
+                                help="By default only the passages relevant to the template are sent for long leases")
+        structured = st.checkbox("Structured extraction", value=False,
+                                 help="Extract typed fields as JSON and render the term sheet from them")
+        
+        # The last generated term sheet can be revised with an amended lease
+        prior = st.session_state.get('prior_result')
+        revise = False
+        if prior:
+            revise = st.checkbox(f"Revise the previous term sheet ({prior['lease_filename']})", value=False,
+                                 help="For amendments and redlines: only the lease sections that changed are re-analyzed")
     
     # Process documents when lease is uploaded
-    if lease_file:
+    if lease_files:
         st.markdown("---")
+        lease_filename = lease_files[0].name
+        if len(lease_files) > 1:
+            lease_filename += f" (+{len(lease_files) - 1} documents)"
         
         if st.button("🚀 Generate Term Sheet", type="primary"):
-            with st.spinner("Reading documents..."):
+            # One request ID and JSON log line (METRICS_JSON_LOGS) per generation
+            try:
+                admission.check(tenant)
+            except AdmissionError as e:
+                st.error(f"❌ {e}")
+                return
+            with request_log(uuid.uuid4().hex, lease_filename=lease_filename, tenant=tenant), \
+                    tenant_context(tenant):
+                with st.spinner("Reading documents..."):
+                    try:
+                        # Get template text (use custom or default)
+                        if use_custom_template and template_file:
+                            compiled = compile_template_upload(
+                                template_file.getvalue(), template_file.name,
+                                lambda data: read_document(template_file, template_file.name,
+                                                           upload_text_key(template_file)))
+                            template_text = compiled.text
+                        else:
+                            template_text = DEFAULT_TEMPLATE
+                        
+                        # Read the lease and any amendments and exhibits
+                        with timed('extract'):
+                            lease_text, legend, documents = read_lease_files(lease_files)
+                        
+                        # Keep only the passages relevant to the template
+                        with timed('filter'):
+                            filtered = filter_lease_text(lease_text, template_text, full_text=full_text)
+                        
+                        st.success("✅ Documents read successfully!")
+                        st.caption(filtered.summary())
+                        for document in documents:
+                            st.caption(f"{document['filename']} ({document['kind']}): "
+                                       f"{document['chars']:,} characters in {document['seconds']:.2f}s")
+                        
+                        # Show preview in expanders
+                        with st.expander("📄 View Template Preview"):
+                            st.text_area("Template Content", template_text[:2000] + "..." if len(template_text) > 2000 else template_text, height=200, disabled=True)
+                        
+                        with st.expander("📄 View Lease Preview"):
+                            st.text_area("Lease Content", lease_text[:2000] + "..." if len(lease_text) > 2000 else lease_text, height=200, disabled=True)
+                        
+                    except Exception as e:
+                        st.error(f"❌ Error reading documents: {str(e)}")
+                        return
+                
                 try:
-                    # Get template text (use custom or default)
-                    if use_custom_template and template_file:
-                        template_text = read_document(template_file)
-                    else:
-                        template_text = DEFAULT_TEMPLATE
-                    
-                    # Read lease document
-                    lease_text = read_document(lease_file)
-                    
-                    st.success("✅ Documents read successfully!")
-                    
-                    # Show preview in expanders
-                    with st.expander("📄 View Template Preview"):
-                        st.text_area("Template Content", template_text[:2000] + "..." if len(template_text) > 2000 else template_text, height=200, disabled=True)
-                    
-                    with st.expander("📄 View Lease Preview"):
-                        st.text_area("Lease Content", lease_text[:2000] + "..." if len(lease_text) > 2000 else lease_text, height=200, disabled=True)
+                    st.markdown("---")
+                    st.subheader("📋 Generated Lease Term Sheet")
+                    st.caption("🤖 Analyzing lease and generating term sheet... text appears as it is generated.")
                     
-                except Exception as e:
-                    st.error(f"❌ Error reading documents: {str(e)}")
-                    return
-            
-            with st.spinner("🤖 Analyzing lease and generating term sheet... This may take 30-60 seconds."):
-                try:
-                    # Generate term sheet
-                    term_sheet = generate_term_sheet(template_text, lease_text, api_key)
+                    if structured:
+                        # Extract a typed record and render the prose term sheet from it locally
+                        compiled = compile_template(template_text)
+                        with st.spinner("Extracting lease terms..."):
+                            record, error = generate_structured_record(compiled, legend + filtered.text, api_key)
+                        if error:
+                            st.error(error)
+                            return
+                        with timed('render_text'):
+                            term_sheet = render_term_sheet(compiled, record)
+                        st.text(term_sheet)
+                        with st.expander("🧾 View Extracted Fields (JSON)"):
+                            st.json(record)
+                    else:
+                        record = None
+                        stream = None
+                        if revise:
+                            with timed('diff'):
+                                diff = diff_lease(prior['lease_text'], lease_text)
+                            st.caption(diff.summary())
+                            if diff.changed_ratio <= REVISION_MAX_CHANGED_RATIO:
+                                stream = stream_revised_term_sheet(prior['term_sheet'], diff, api_key)
+                        if stream is None:
+                            stream = stream_term_sheet(template_text, legend + filtered.text, api_key)
+                        # Render the term sheet incrementally as Gemini streams it
+                        term_sheet = st.write_stream(stream)
                     
+                    st.session_state['prior_result'] = {
+                        'lease_filename': lease_filename,
+                        'lease_text': lease_text,
+                        'term_sheet': term_sheet,
+                    }
+                    if record is None:
+                        # Prose term sheets are parsed back into fields for indexing and rent analytics
+                        record = parse_term_sheet(compile_template(template_text), term_sheet)
+                    index_lease(term_sheet, lease_filename, lease_text, template_text, record)
+                    rent_terms = rent_terms_for(record, term_sheet)
                     st.success("✅ Term sheet generated successfully!")
                     
-                    # Display result
-                    st.markdown("---")
-                    st.subheader("📋 Generated Lease Term Sheet")
-                    st.markdown(term_sheet)
-                    
                     # Download button
-                    docx_data = create_docx_from_text(term_sheet)
+                    with timed('render'):
+                        exports = render_exports(term_sheet, ['docx', 'pdf'], rent_terms)
                     st.download_button(
                         label="⬇️ Download Term Sheet",
-                        data=docx_data,
+                        data=exports['docx'],
                         file_name="lease_term_sheet.docx",
                         mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
                     )
+                    st.download_button(
+                        label="⬇️ Download PDF",
+                        data=exports['pdf'],
+                        file_name="lease_term_sheet.pdf",
+                        mime="application/pdf"
+                    )
                     
+                except GenerationError as e:
+                    # Text streamed before the failure is incomplete; nothing is offered for download
+                    st.error(f"❌ {e}")
                 except Exception as e:
                     st.error(f"❌ Error generating term sheet: {str(e)}")
     else:
@@ -0,0 +1,297 @@
+"""Generate term sheets for a whole directory (or manifest) of leases
+
+Usage:
+    python batch_generate.py LEASE_DIR_OR_MANIFEST --output-dir OUT [options]
+
+Extraction runs on a process pool and Gemini calls run with bounded async
+concurrency. Every lease is appended to a progress journal as it finishes,
+so an interrupted run can be restarted with the same arguments: leases that
+were already written are skipped and failed ones are retried. One DOCX (and,
+with --formats, a PDF) is written per lease, rendered on a second process
+pool so styled output never holds up the event loop, plus a summary CSV of
+timings and failures. Rent
+schedule inputs are journaled with each lease, so rent analytics for every
+finished lease, including those from earlier runs, are computed in one pass
+and added to the summary. Gemini calls are spread over the
+GEMINI_API_KEYS pool unless --api-key is given, and accounted to --tenant.
+"""
+import argparse
+import asyncio
+import csv
+import json
+import math
+import os
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from lease_core import (read_document, generate_term_sheet, GenerationError, render_exports, rent_terms_for,
+                        DEFAULT_TEMPLATE, EXPORT_FORMATS)
+from relevance_filter import filter_lease_text
+from structured_extraction import parse_term_sheet
+from tenant_usage import create_admission_control, tenant_context, AdmissionError
+from template_model import compile_template
+from upload_spool import open_mapped
+
+LEASE_EXTENSIONS = ('.pdf', '.docx', '.txt', '.htm', '.html')
+SUMMARY_FIELDS = ['path', 'status', 'output', 'chars', 'prompt_chars', 'extract_seconds',
+                  'generate_seconds', 'render_seconds', 'total_rent', 'npv', 'effective_rent_psf',
+                  'error']
+
+def collect_leases(source):
+    """Return lease paths from a directory or a manifest file (one path per line)"""
+    if os.path.isdir(source):
+        return sorted(
+            os.path.join(root, name)
+            for root, _, names in os.walk(source)
+            for name in names
+            if name.lower().endswith(LEASE_EXTENSIONS)
+        )
+    base = os.path.dirname(os.path.abspath(source))
+    with open(source, 'r', encoding='utf-8') as f:
+        lines = [line.strip() for line in f]
+    return [os.path.join(base, line) for line in lines if line and not line.startswith('#')]
+
+def source_root(source, paths):
+    """Directory lease output names are made relative to: the directory, or the manifest's leases' common one"""
+    if source and os.path.isdir(source):
+        return source
+    return os.path.commonpath([os.path.dirname(os.path.abspath(path)) for path in paths]) if paths else source
+
+def output_names(paths, root):
+    """Return {lease path: output name without extension}, unique for every lease
+
+    Names mirror the lease's directory below root, so "a/lease.pdf" and
+    "b/lease.pdf" are written to different files. Leases sharing a name in
+    one directory ("lease.pdf", "lease.docx") keep their extension in it.
+    Raises ValueError if two leases would still be written to one file.
+    """
+    stems = {path: os.path.splitext(os.path.relpath(os.path.abspath(path), os.path.abspath(root)))
+             for path in paths}
+    shared = Counter(stem.lower() for stem, _ in stems.values())
+    names = {}
+    for path, (stem, ext) in stems.items():
+        suffix = f"_{ext.lstrip('.').lower()}" if shared[stem.lower()] > 1 and ext else ''
+        names[path] = f"{stem}{suffix}_term_sheet"
+    owners = {}
+    for path, name in names.items():
+        other = owners.setdefault(name.lower(), path)
+        if other != path:
+            raise ValueError(f"{other} and {path} would both be written to {name}")
+    return names
+
+def load_journal(journal_path):
+    """Return the latest journal entry for each lease path"""
+    entries = {}
+    if os.path.exists(journal_path):
+        with open(journal_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # A torn final line from a crash is ignored
+                    continue
+                entries[entry['path']] = entry
+    return entries
+
+def _init_extract_worker():
+    # Documents are already spread across processes; keep PDF extraction serial
+    os.environ['PDF_WORKERS'] = '1'
+
+def extract_lease(path):
+    """Read one lease in a pool worker and return (text, seconds)"""
+    started = time.perf_counter()
+    with open_mapped(path) as f:
+        text = read_document(f, os.path.basename(path).lower())
+    return text, time.perf_counter() - started
+
+def output_path_for(name, output_dir, export_format='docx'):
+    """Path of a lease's term sheet, from its output_names() name"""
+    return os.path.join(output_dir, f"{name}{EXPORT_FORMATS[export_format][1]}")
+
+def write_outputs(term_sheet, output_paths, rent_terms=None):
+    """Render a term sheet in a pool worker, one file per {format: path}, and return seconds"""
+    started = time.perf_counter()
+    for export_format, data in render_exports(term_sheet, list(output_paths), rent_terms).items():
+        os.makedirs(os.path.dirname(output_paths[export_format]) or '.', exist_ok=True)
+        with open(output_paths[export_format], 'wb') as f:
+            f.write(data)
+    return time.perf_counter() - started
+
+class BatchRunner:
+    """Runs the extraction -> generation -> rendering pipeline for many leases
+
+    At most max_in_flight leases (default: concurrency + extract_workers)
+    are between extraction and rendering at once, so extraction stays only
+    a little ahead of the Gemini calls and holds few leases' text.
+    """
+    def __init__(self, template_text, api_key, output_dir, journal_path,
+                 extract_workers, concurrency, full_text=False, formats=('docx',), render_workers=1,
+                 output_names=None, max_in_flight=None):
+        self.template_text = template_text
+        self.api_key = api_key
+        self.output_dir = output_dir
+        self.journal_path = journal_path
+        self.extract_workers = extract_workers
+        self.concurrency = concurrency
+        self.full_text = full_text
+        self.formats = list(formats)
+        self.render_workers = render_workers
+        # Output file names by lease path (see output_names); worked out from the paths if not given
+        self.output_names = output_names
+        self.max_in_flight = max_in_flight or concurrency + extract_workers
+        self.compiled_template = compile_template(template_text)
+
+    def _record(self, entry):
+        # Journal writes happen on the event loop thread, one line per lease
+        with open(self.journal_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+    async def _process(self, path, executor, render_executor, semaphore):
+        loop = asyncio.get_running_loop()
+        entry = {'path': path, 'status': 'failed', 'output': ''}
+        try:
+            text, entry['extract_seconds'] = await loop.run_in_executor(executor, extract_lease, path)
+            entry['chars'] = len(text)
+            filtered = filter_lease_text(text, self.template_text, full_text=self.full_text)
+            entry['prompt_chars'] = filtered.filtered_chars
+
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    term_sheet = await asyncio.to_thread(generate_term_sheet, self.template_text,
+                                                         filtered.text, self.api_key)
+                except GenerationError as e:
+                    raise RuntimeError(str(e).splitlines()[0]) from e
+                entry['generate_seconds'] = time.perf_counter() - started
+
+            rent_terms = rent_terms_for(parse_term_sheet(self.compiled_template, term_sheet), term_sheet)
+            outputs = {export_format: output_path_for(self.output_names[path], self.output_dir, export_format)
+                       for export_format in self.formats}
+            entry['render_seconds'] = await loop.run_in_executor(render_executor, write_outputs,
+                                                                 term_sheet, outputs, rent_terms)
+            if rent_terms is not None:
+                # Journaled, so the summary of a resumed run still covers this lease
+                entry['rent_terms'] = rent_terms.to_dict()
+            entry['output'] = outputs[self.formats[0]]
+            entry['status'] = 'done'
+        except Exception as e:
+            entry['error'] = str(e)
+        self._record(entry)
+        print(f"[{entry['status']}] {path}", file=sys.stderr)
+        return entry
+
+    async def run(self, paths):
+        """Process paths with max_in_flight workers taking leases from a queue; returns entries in order"""
+        if self.output_names is None:
+            self.output_names = output_names(paths, source_root(None, paths))
+        semaphore = asyncio.Semaphore(self.concurrency)
+        queue = asyncio.Queue()
+        for item in enumerate(paths):
+            queue.put_nowait(item)
+        entries = [None] * len(paths)
+
+        async def worker(executor, render_executor):
+            while not queue.empty():
+                index, path = queue.get_nowait()
+                entries[index] = await self._process(path, executor, render_executor, semaphore)
+
+        with ProcessPoolExecutor(max_workers=self.extract_workers,
+                                 initializer=_init_extract_worker) as executor, \
+                ProcessPoolExecutor(max_workers=self.render_workers) as render_executor:
+            await asyncio.gather(*(worker(executor, render_executor)
+                                   for _ in range(min(self.max_in_flight, len(paths)))))
+        return entries
+
+def add_rent_analytics(entries):
+    """Fill the rent columns of finished journal entries, evaluating every lease in one array pass"""
+    paths = [path for path, entry in entries.items() if entry['status'] == 'done' and entry.get('rent_terms')]
+    if not paths:
+        return
+    # NumPy is only loaded once a summary has rent schedules to evaluate
+    from rent_analytics import analyze_leases, terms_from_dict
+    analysis = analyze_leases([terms_from_dict(entries[path]['rent_terms']) for path in paths])
+    for row, path in enumerate(paths):
+        for name in ('total_rent', 'npv', 'effective_rent_psf'):
+            value = float(analysis[name][row])
+            entries[path][name] = '' if math.isnan(value) else round(value, 2)
+
+def write_summary(summary_path, entries):
+    with open(summary_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=SUMMARY_FIELDS, extrasaction='ignore')
+        writer.writeheader()
+        for entry in entries:
+            writer.writerow(entry)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate lease term sheets in batch.')
+    parser.add_argument('source', help='Directory of leases or a manifest file listing lease paths')
+    parser.add_argument('--output-dir', '-o', required=True, help='Where term sheets are written')
+    parser.add_argument('--template', help='Custom template file (default: built-in template)')
+    parser.add_argument('--api-key',
+                        help='Gemini API key (default: the GEMINI_API_KEYS pool, or GEMINI_API_KEY)')
+    parser.add_argument('--tenant', default='batch', help='Tenant Gemini usage is accounted to')
+    parser.add_argument('--extract-workers', type=int, default=os.cpu_count() or 1,
+                        help='Processes used for text extraction')
+    parser.add_argument('--concurrency', type=int, default=4,
+                        help='Gemini calls allowed in flight at once')
+    parser.add_argument('--max-in-flight', type=int,
+                        help='Leases extracted but not yet written at once '
+                             '(default: --concurrency plus --extract-workers)')
+    parser.add_argument('--formats', nargs='+', choices=sorted(EXPORT_FORMATS), default=['docx'],
+                        help='Term sheet formats to write (default: docx)')
+    parser.add_argument('--render-workers', type=int, default=os.cpu_count() or 1,
+                        help='Processes used for DOCX/PDF rendering')
+    parser.add_argument('--full-text', action='store_true',
+                        help='Send the full lease text instead of only relevant passages')
+    parser.add_argument('--journal', help='Progress journal (default: OUTPUT_DIR/progress.jsonl)')
+    parser.add_argument('--summary', help='Summary CSV (default: OUTPUT_DIR/summary.csv)')
+    args = parser.parse_args(argv)
+
+    if not (args.api_key or os.environ.get('GEMINI_API_KEYS') or os.environ.get('GEMINI_API_KEY')):
+        parser.error('A Gemini API key is required (--api-key, GEMINI_API_KEYS or GEMINI_API_KEY).')
+    try:
+        create_admission_control().check(args.tenant)
+    except AdmissionError as e:
+        parser.error(str(e))
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    journal_path = args.journal or os.path.join(args.output_dir, 'progress.jsonl')
+    summary_path = args.summary or os.path.join(args.output_dir, 'summary.csv')
+
+    template_text = DEFAULT_TEMPLATE
+    if args.template:
+        with open(args.template, 'rb') as f:
+            template_text = read_document(f, os.path.basename(args.template).lower())
+
+    paths = collect_leases(args.source)
+    try:
+        names = output_names(paths, source_root(args.source, paths))
+    except ValueError as e:
+        parser.error(f"Output file names collide: {e}")
+    journal = load_journal(journal_path)
+    # Finished leases are skipped; failed or interrupted ones are retried
+    pending = [path for path in paths
+               if journal.get(path, {}).get('status') != 'done'
+               or not os.path.exists(journal[path]['output'])]
+    print(f"{len(paths)} leases, {len(paths) - len(pending)} already processed, "
+          f"{len(pending)} to go", file=sys.stderr)
+
+    runner = BatchRunner(template_text, args.api_key, args.output_dir, journal_path,
+                         args.extract_workers, args.concurrency, args.full_text,
+                         args.formats, args.render_workers, names, args.max_in_flight)
+    with tenant_context(args.tenant):
+        asyncio.run(runner.run(pending))
+
+    entries = load_journal(journal_path)
+    add_rent_analytics(entries)
+    write_summary(summary_path, [entries[path] for path in paths if path in entries])
+    failed = sum(1 for path in paths if entries.get(path, {}).get('status') != 'done')
+    print(f"Summary written to {summary_path}; {failed} failed", file=sys.stderr)
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,78 @@
+"""Measure time to first byte of a term sheet with and without model routing
+
+Usage (from the repository root):
+    python -m benchmarks.bench_first_byte [--latency 0.5] [--seconds-per-line 0.2] [--repeat 3]
+
+Gemini is never called. The stub provider takes --latency seconds to its
+first line and --seconds-per-line for each line after it, so streamed
+text arrives gradually while a non-streamed call returns after the last
+line. Each case generates a new lease's term sheet, so nothing is served
+from the result cache:
+
+- stream: what the web apps do; the final tier is streamed at once
+- routed: generate_term_sheet's path; the fast tier is generated in full
+  and checked first. The stub's text never passes the checks, so this is
+  the escalation case, the worst one for time to first byte
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+def run_case(route, repeat):
+    """Return (best seconds to first text, best seconds to last text)"""
+    from lease_core.generation import stream_term_sheet
+    from lease_core.template import DEFAULT_TEMPLATE
+    first_best = total_best = None
+    for number in range(repeat):
+        lease = f"Lease {number} ({'routed' if route else 'stream'}) between Landlord and Tenant.\n" * 50
+        started = time.perf_counter()
+        first = None
+        for _ in stream_term_sheet(DEFAULT_TEMPLATE, lease, None, route=route):
+            if first is None:
+                first = time.perf_counter() - started
+        total = time.perf_counter() - started
+        first_best = first if first_best is None else min(first_best, first)
+        total_best = total if total_best is None else min(total_best, total)
+    return first_best, total_best
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure term sheet time to first byte against the stub provider.')
+    parser.add_argument('--latency', type=float, default=0.5, help='Stub seconds to the first line of a call')
+    parser.add_argument('--seconds-per-line', type=float, default=0.2, help='Stub seconds per generated line')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per case (best is kept)')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as scratch:
+        return report(scratch, args)
+
+def report(scratch, args):
+    # The stub settings are read when the client modules are imported, so set them first
+    os.environ.update({
+        'GEMINI_STUB': 'on',
+        'GEMINI_API_KEYS': 'stub-key',
+        'GEMINI_STUB_LATENCY_SECONDS': str(args.latency),
+        'GEMINI_STUB_SECONDS_PER_LINE': str(args.seconds_per_line),
+        'RESULT_CACHE_PATH': os.path.join(scratch, 'results.db'),
+        'USAGE_LEDGER_PATH': os.path.join(scratch, 'usage.db'),
+    })
+    from lease_core.generation import model_router
+    if not model_router.fast_tiers:
+        print('MODEL_TIERS has a single model, so routing never runs', file=sys.stderr)
+
+    # One untimed run pays for imports, the event loop and template compilation
+    from lease_core.generation import generate_term_sheet
+    from lease_core.template import DEFAULT_TEMPLATE
+    generate_term_sheet(DEFAULT_TEMPLATE, 'Warm-up lease between Landlord and Tenant.\n', None)
+
+    print(f"{'case':<8} {'first byte s':>13} {'complete s':>11}")
+    results = {}
+    for name, route in (('stream', False), ('routed', True)):
+        results[name] = run_case(route, args.repeat)
+        print(f"{name:<8} {results[name][0]:>13.3f} {results[name][1]:>11.3f}")
+    print(f"\nRouting adds {results['routed'][0] - results['stream'][0]:.3f}s to the first byte")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
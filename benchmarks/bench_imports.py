@@ -0,0 +1,55 @@
+"""Measure cold import time of the app modules and which heavy dependencies they load
+
+Usage (from the repository root):
+    python -m benchmarks.bench_imports [--modules app lease_core batch_generate] [--repeat 5]
+
+Every import runs in a fresh interpreter, as on a newly started container,
+and the median wall time is reported. The heavy column lists the Gemini
+SDK, PDF, DOCX and NumPy packages that were loaded by the import itself;
+lease_core loads them only on first use.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ['google.generativeai', 'PyPDF2', 'docx', 'numpy']
+
+_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - started
+print(json.dumps({{'seconds': seconds, 'heavy': [name for name in {heavy!r} if name in sys.modules]}}))
+"""
+
+def measure_import(module, repeat):
+    """Return (median seconds, heavy modules loaded) for importing module in fresh interpreters"""
+    samples = []
+    heavy = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-c', _PROBE.format(module=module, heavy=HEAVY_MODULES)],
+                                cwd=ROOT, capture_output=True, text=True, check=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        samples.append(result['seconds'])
+        heavy = result['heavy']
+    return statistics.median(samples), heavy
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure cold import time of the app modules.')
+    parser.add_argument('--modules', nargs='+', default=['lease_core', 'app', 'batch_generate'],
+                        help='Modules to import')
+    parser.add_argument('--repeat', type=int, default=5, help='Fresh interpreters per module (median is kept)')
+    args = parser.parse_args(argv)
+
+    print(f"{'module':<20} {'seconds':>8}  heavy")
+    for module in args.modules:
+        seconds, heavy = measure_import(module, args.repeat)
+        print(f"{module:<20} {seconds:>8.3f}  {', '.join(heavy) or '-'}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,95 @@
+"""Drive the Gemini key pool with several tenants against the stub provider
+
+Usage (from the repository root):
+    python -m benchmarks.bench_key_pool [--keys 3] [--tenants 3] [--calls 10] [--requests-per-minute 20]
+
+Gemini is never called. Every key is a stub that rejects calls over its
+per-minute quota with 429, as Gemini does, and takes --latency seconds per
+call. Tenants make their calls concurrently, the first as many as all
+the others together, and the report shows how calls were spread over the
+keys (with the 429s each received) and each tenant's tokens and latency
+from a temporary usage ledger. With --stub-requests-per-minute below
+--requests-per-minute the pool overestimates its keys, so 429s occur and
+calls fail over to other keys.
+"""
+import argparse
+import functools
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from gemini_client import GeminiClient, StubModel, StubQuota
+from key_pool import KeyPool
+from tenant_usage import UsageLedger, tenant_context
+
+def run(keys, tenants, calls, requests_per_minute, stub_requests_per_minute, latency, wait_seconds):
+    """Return (seconds, key stats, usage by key, usage by tenant, failed calls)"""
+    def stub_client(api_key):
+        return GeminiClient(api_key, rate_per_minute=requests_per_minute, burst=requests_per_minute,
+                            max_retries=0, model_factory=functools.partial(
+                                StubModel, quota=StubQuota(stub_requests_per_minute), latency=latency))
+
+    with tempfile.TemporaryDirectory() as directory:
+        ledger = UsageLedger(os.path.join(directory, 'usage.db'))
+        pool = KeyPool([f"stub-key-{number}" for number in range(keys)], requests_per_minute=requests_per_minute,
+                       wait_seconds=wait_seconds, client_factory=stub_client, ledger=ledger)
+        prompt = 'Summarize this lease. ' * 500
+        failures = []
+
+        def tenant_calls(tenant, count):
+            with tenant_context(tenant):
+                for _ in range(count):
+                    try:
+                        pool.generate('stub-model', prompt)
+                    except Exception as e:
+                        failures.append((tenant, type(e).__name__))
+
+        # The first tenant is the heavy one, with as many calls as all the others
+        plan = [('tenant-1', calls * max(1, tenants - 1))] + [(f"tenant-{number}", calls)
+                                                               for number in range(2, tenants + 1)]
+        threads = [threading.Thread(target=tenant_calls, args=(tenant, count)) for tenant, count in plan]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        seconds = time.perf_counter() - started
+        return seconds, pool.stats(), ledger.summary(by_key=True), ledger.summary(), failures
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Exercise the Gemini key pool against stub keys.')
+    parser.add_argument('--keys', type=int, default=3, help='Stub API keys in the pool')
+    parser.add_argument('--tenants', type=int, default=3, help='Tenants calling concurrently')
+    parser.add_argument('--calls', type=int, default=10, help='Calls per light tenant')
+    parser.add_argument('--requests-per-minute', type=int, default=20, help='Quota the pool assumes per key')
+    parser.add_argument('--stub-requests-per-minute', type=int,
+                        help='Quota the stub keys enforce (default: --requests-per-minute)')
+    parser.add_argument('--latency', type=float, default=0.05, help='Seconds per stub call')
+    parser.add_argument('--wait', type=float, default=5, help='Seconds a call waits for a key with quota')
+    args = parser.parse_args(argv)
+
+    seconds, keys, by_key, by_tenant, failures = run(
+        args.keys, args.tenants, args.calls, args.requests_per_minute,
+        args.stub_requests_per_minute or args.requests_per_minute, args.latency, args.wait)
+    print(f"{sum(entry['calls'] for entry in by_tenant)} calls in {seconds:.2f}s, "
+          f"{len(failures)} failed ({', '.join(sorted({error for _, error in failures})) or 'none'})")
+    print(f"\n{'key':<14} {'calls':>6} {'429s':>6} {'requests/min':>13}")
+    calls_by_key = {}
+    for entry in by_key:
+        calls_by_key.setdefault(entry['api_key'], [0, 0])
+        calls_by_key[entry['api_key']][0] += entry['calls']
+        calls_by_key[entry['api_key']][1] += entry['rate_limited']
+    for key in keys:
+        calls, rate_limited = calls_by_key.get(key['key'], (0, 0))
+        print(f"{key['key']:<14} {calls:>6} {rate_limited:>6} {key['requests_last_minute']:>13}")
+    print(f"\n{'tenant':<14} {'calls':>6} {'errors':>6} {'tokens':>10} {'mean s':>8} {'max s':>8}")
+    for entry in by_tenant:
+        print(f"{entry['tenant']:<14} {entry['calls']:>6} {entry['errors']:>6} "
+              f"{entry['input_tokens'] + entry['output_tokens']:>10} {entry['mean_seconds']:>8.3f} "
+              f"{entry['max_seconds']:>8.3f}")
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
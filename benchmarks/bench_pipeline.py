@@ -0,0 +1,201 @@
+"""Benchmark document ingestion, prompt assembly and DOCX/PDF rendering
+
+Usage (from the repository root):
+    python -m benchmarks.bench_pipeline [--pages 10 50 300] [--save NAME] [--compare NAME]
+
+Gemini is never called: the benchmark covers the local stages around the
+model call. Synthetic leases are generated in every supported format
+(TXT, HTML, DOCX, PDF) at each requested page count, and
+examples/sample_lease.txt is included as a real-world case. extract is
+always a real extraction; cached is a repeat upload found in the text
+cache (hashing plus a disk read), using a private temporary cache that
+the apps never see. Each stage
+reports its best time over --repeat runs, throughput, and peak Python
+memory (tracemalloc; allocations in PDF worker processes are not
+included). Results can be saved as JSON baselines under
+benchmarks/baselines/ and compared against later runs.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from lease_core import extract_document, render_export, build_prompt, DEFAULT_TEMPLATE
+from relevance_filter import filter_lease_text
+from text_cache import TextCache, hash_file, normalize_text
+from benchmarks.synthetic import generate_lease, WRITERS
+
+BASELINE_DIR = os.path.join(os.path.dirname(__file__), 'baselines')
+STAGES = ('extract', 'cached', 'prompt', 'render')
+# Baselines before version 2 timed read_document, whose extract results were text cache hits
+BASELINE_VERSION = 2
+SAMPLE_LEASE = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'examples', 'sample_lease.txt')
+
+def measure(fn, repeat):
+    """Return (best seconds, peak traced bytes, result) for fn()"""
+    best = None
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    # Peak memory is taken from one extra, untimed run
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak, result
+
+def stage_result(seconds, peak, size_bytes=None, pages=None):
+    result = {'seconds': seconds, 'peak_kb': peak / 1024}
+    if size_bytes is not None and seconds > 0:
+        result['mb_per_s'] = size_bytes / (1024 * 1024) / seconds
+    if pages is not None and seconds > 0:
+        result['pages_per_s'] = pages / seconds
+    return result
+
+def bench_document(data, filename, pages, repeat, text_cache):
+    """Time extraction, a text cache hit and prompt assembly for one document"""
+    extract_seconds, extract_peak, text = measure(
+        lambda: normalize_text(extract_document(io.BytesIO(data), filename)), repeat)
+
+    key = hash_file(io.BytesIO(data), filename)
+    text_cache.put(key, text)
+    cached_seconds, cached_peak, _ = measure(
+        lambda: text_cache.get(hash_file(io.BytesIO(data), filename)), repeat)
+
+    def assemble():
+        filtered = filter_lease_text(text, DEFAULT_TEMPLATE)
+        return build_prompt(DEFAULT_TEMPLATE, filtered.text)
+    prompt_seconds, prompt_peak, prompt = measure(assemble, repeat)
+
+    return {
+        'bytes': len(data),
+        'pages': pages,
+        'text_chars': len(text),
+        'prompt_chars': len(prompt),
+        'extract': stage_result(extract_seconds, extract_peak, len(data), pages),
+        'cached': stage_result(cached_seconds, cached_peak, len(data), pages),
+        'prompt': stage_result(prompt_seconds, prompt_peak, len(text.encode('utf-8'))),
+    }
+
+def bench_render(repeat, multiplier, export_format='docx'):
+    """Time DOCX or PDF rendering of a term-sheet-sized text"""
+    term_sheet = '\n'.join([DEFAULT_TEMPLATE] * multiplier)
+    seconds, peak, _ = measure(lambda: render_export(term_sheet, export_format), repeat)
+    return {
+        'lines': term_sheet.count('\n') + 1,
+        'render': stage_result(seconds, peak, len(term_sheet.encode('utf-8'))),
+    }
+
+def run(page_counts, formats, paragraphs, tables, repeat):
+    with tempfile.TemporaryDirectory() as directory:
+        # No memory tier, so every lookup reads the disk entry as a fresh process would
+        return run_cases(page_counts, formats, paragraphs, tables, repeat, TextCache(directory, max_memory_entries=0))
+
+def run_cases(page_counts, formats, paragraphs, tables, repeat, text_cache):
+    results = {}
+    for pages in page_counts:
+        lease = generate_lease(pages=pages, paragraphs_per_page=paragraphs, tables=tables)
+        for ext in formats:
+            name = f"synthetic-{pages}p{ext}"
+            print(f"benchmarking {name}...", file=sys.stderr)
+            results[name] = bench_document(WRITERS[ext](lease), f"lease{ext}", pages, repeat, text_cache)
+
+    with open(SAMPLE_LEASE, 'rb') as f:
+        sample = f.read()
+    results['sample_lease.txt'] = bench_document(sample, 'sample_lease.txt', 1, repeat, text_cache)
+
+    for multiplier in (1, 10):
+        results[f"render-x{multiplier}"] = bench_render(repeat, multiplier)
+        results[f"render-pdf-x{multiplier}"] = bench_render(repeat, multiplier, 'pdf')
+    return results
+
+def print_report(results):
+    print(f"{'case':<28} {'stage':<8} {'seconds':>10} {'pages/s':>10} {'MB/s':>8} {'peak KB':>10}")
+    for name, case in results.items():
+        for stage in STAGES:
+            if stage not in case:
+                continue
+            r = case[stage]
+            pages_per_s = f"{r['pages_per_s']:.1f}" if 'pages_per_s' in r else '-'
+            mb_per_s = f"{r['mb_per_s']:.2f}" if 'mb_per_s' in r else '-'
+            print(f"{name:<28} {stage:<8} {r['seconds']:>10.4f} {pages_per_s:>10} "
+                  f"{mb_per_s:>8} {r['peak_kb']:>10.0f}")
+
+def baseline_path(name):
+    return name if name.endswith('.json') else os.path.join(BASELINE_DIR, f"{name}.json")
+
+def compare(results, baseline, threshold, skip_stages=()):
+    """Print per-stage time ratios against a baseline; return the regressions"""
+    regressions = []
+    print(f"\n{'case':<28} {'stage':<8} {'baseline':>10} {'current':>10} {'ratio':>7}")
+    for name, case in results.items():
+        for stage in STAGES:
+            if stage in skip_stages:
+                continue
+            old = baseline.get(name, {}).get(stage)
+            if stage not in case or old is None or old['seconds'] <= 0:
+                continue
+            ratio = case[stage]['seconds'] / old['seconds']
+            flag = '  REGRESSION' if ratio > threshold else ''
+            print(f"{name:<28} {stage:<8} {old['seconds']:>10.4f} {case[stage]['seconds']:>10.4f} "
+                  f"{ratio:>7.2f}{flag}")
+            if flag:
+                regressions.append((name, stage, ratio))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the ingestion and rendering path.')
+    parser.add_argument('--pages', type=int, nargs='+', default=[10, 50, 300],
+                        help='Synthetic lease sizes in pages')
+    parser.add_argument('--formats', nargs='+', default=sorted(WRITERS),
+                        choices=sorted(WRITERS), help='Document formats to generate')
+    parser.add_argument('--paragraphs', type=int, default=6, help='Paragraphs per page')
+    parser.add_argument('--tables', type=int, default=2, help='Rent schedule tables per lease')
+    parser.add_argument('--repeat', type=int, default=3, help='Timed runs per stage (best is kept)')
+    parser.add_argument('--save', metavar='NAME', help='Save results as a JSON baseline')
+    parser.add_argument('--compare', metavar='NAME', help='Compare against a saved baseline')
+    parser.add_argument('--threshold', type=float, default=1.2,
+                        help='Time ratio above which a stage counts as a regression')
+    args = parser.parse_args(argv)
+
+    results = run(args.pages, args.formats, args.paragraphs, args.tables, args.repeat)
+    print_report(results)
+
+    if args.save:
+        path = baseline_path(args.save)
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'meta': {
+                    'version': BASELINE_VERSION,
+                    'python': platform.python_version(),
+                    'platform': platform.platform(),
+                    'cpu_count': os.cpu_count(),
+                    'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                    'args': vars(args),
+                },
+                'results': results,
+            }, f, indent=2)
+        print(f"\nBaseline saved to {path}", file=sys.stderr)
+
+    if args.compare:
+        with open(baseline_path(args.compare), 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        skip_stages = ()
+        if baseline.get('meta', {}).get('version', 1) < BASELINE_VERSION:
+            print(f"\n{args.compare} timed cached reads as extract; extract is not compared", file=sys.stderr)
+            skip_stages = ('extract',)
+        if compare(results, baseline['results'], args.threshold, skip_stages):
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
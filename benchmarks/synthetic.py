@@ -0,0 +1,124 @@
+"""Synthetic commercial leases for benchmarking, in every supported format"""
+import io
+import random
+
+from docx import Document
+
+from lease_core.pdf_writer import pdf_escape, wrap, write_pdf
+
+ARTICLE_TITLES = [
+    'PREMISES', 'TERM', 'BASE RENT', 'ADDITIONAL CHARGES', 'SECURITY DEPOSIT',
+    'TENANT IMPROVEMENTS', 'PARKING', 'INSURANCE AND INDEMNITY', 'MAINTENANCE AND REPAIRS',
+    'DEFAULT AND REMEDIES', 'ASSIGNMENT AND SUBLETTING', 'BROKERS', 'SPECIAL PROVISIONS',
+]
+
+SENTENCES = [
+    'Tenant shall pay to Landlord the monthly installment of Base Rent in advance on the first day of each calendar month.',
+    'Landlord shall deliver the Premises to Tenant in broom-clean condition with all building systems in good working order.',
+    'Tenant shall maintain commercial general liability insurance with limits of not less than $2,000,000 per occurrence.',
+    'Tenant shall have the right to use forty (40) unreserved parking spaces in the building garage at no additional charge.',
+    'The Security Deposit shall be returned to Tenant within thirty (30) days after the expiration of the Term.',
+    'Tenant shall not assign this Lease or sublet the Premises without the prior written consent of Landlord.',
+    'Operating Expenses shall include all costs of operating, maintaining and repairing the Building and the common areas.',
+    'Landlord shall provide a tenant improvement allowance of $45.00 per rentable square foot of the Premises.',
+    'Any installment of Rent not paid within five (5) days after the due date shall bear a late charge of five percent (5%).',
+    'This Lease shall be governed by and construed in accordance with the laws of the State of New York.',
+]
+
+class SyntheticLease:
+    """A generated lease: pages of paragraphs plus rent-schedule tables"""
+    def __init__(self, pages, tables):
+        self.pages = pages
+        self.tables = tables
+
+    @property
+    def page_count(self):
+        return len(self.pages)
+
+    def text(self):
+        parts = []
+        for page in self.pages:
+            parts.extend(page)
+        for table in self.tables:
+            parts.extend(' | '.join(row) for row in table)
+        return '\n\n'.join(parts)
+
+def generate_lease(pages=10, paragraphs_per_page=6, tables=2, seed=0):
+    """Build a SyntheticLease with the given size"""
+    rng = random.Random(seed)
+    article = 0
+    lease_pages = []
+    for page_number in range(pages):
+        paragraphs = []
+        for i in range(paragraphs_per_page):
+            if i == 0 and page_number % 2 == 0:
+                title = ARTICLE_TITLES[article % len(ARTICLE_TITLES)]
+                article += 1
+                paragraphs.append(f"ARTICLE {article} - {title}")
+            sentences = rng.sample(SENTENCES, 4)
+            paragraphs.append(f"{article}.{i + 1} " + ' '.join(sentences))
+        lease_pages.append(paragraphs)
+
+    lease_tables = []
+    for t in range(tables):
+        rows = [['Months of Term', 'Monthly Base Rent', 'Annual Base Rent', '% Increase']]
+        rent = 20000 + 1000 * t
+        for year in range(1, 11):
+            rows.append([f"{12 * year - 11}-{12 * year}", f"${rent:,.2f}", f"${rent * 12:,.2f}", '3%'])
+            rent *= 1.03
+        lease_tables.append(rows)
+    return SyntheticLease(lease_pages, lease_tables)
+
+def to_txt(lease):
+    return lease.text().encode('utf-8')
+
+def to_html(lease):
+    parts = ['<html><head><style>p { margin: 0; }</style></head><body>']
+    for page in lease.pages:
+        parts.extend(f"<p>{paragraph}</p>" for paragraph in page)
+    for table in lease.tables:
+        parts.append('<table>')
+        parts.extend('<tr>' + ''.join(f"<td>{cell}</td>" for cell in row) + '</tr>' for row in table)
+        parts.append('</table>')
+    parts.append('</body></html>')
+    return '\n'.join(parts).encode('utf-8')
+
+def to_docx(lease):
+    doc = Document()
+    for page in lease.pages:
+        for paragraph in page:
+            doc.add_paragraph(paragraph)
+        doc.add_page_break()
+    for table in lease.tables:
+        docx_table = doc.add_table(rows=len(table), cols=len(table[0]))
+        for r, row in enumerate(table):
+            for c, cell in enumerate(row):
+                docx_table.cell(r, c).text = cell
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
+
+def to_pdf(lease):
+    """Write a minimal text-only PDF (Helvetica, one content stream per page)"""
+    page_lines = []
+    for page in lease.pages:
+        lines = []
+        for paragraph in page:
+            lines.extend(wrap(paragraph))
+            lines.append('')
+        page_lines.append(lines)
+    if lease.tables:
+        page_lines.append(['   '.join(row) for table in lease.tables for row in table])
+
+    streams = []
+    for lines in page_lines:
+        body = ' T* '.join(f"({pdf_escape(line)}) Tj" for line in lines)
+        streams.append(f"BT /F1 9 Tf 11 TL 50 770 Td {body} ET")
+    return write_pdf(streams)
+
+WRITERS = {
+    '.txt': to_txt,
+    '.html': to_html,
+    '.docx': to_docx,
+    '.pdf': to_pdf,
+}
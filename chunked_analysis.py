@@ -0,0 +1,157 @@
+import contextvars
+import logging
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from template_model import compile_template
+
+logger = logging.getLogger(__name__)
+
+# Leases longer than this (in characters) go through the map-reduce pipeline
+CHUNKED_MIN_CHARS = int(os.environ.get('CHUNKED_ANALYSIS_MIN_CHARS', '120000'))
+# Target characters per chunk sent to a single map call
+CHUNK_SIZE = int(os.environ.get('CHUNK_SIZE', '24000'))
+# Map calls allowed in flight at once
+CHUNK_CONCURRENCY = int(os.environ.get('CHUNK_CONCURRENCY', '4'))
+# Output budget for each map call; facts are short
+MAP_MAX_OUTPUT_TOKENS = 1024
+
+# Lines that start a new article or section of a lease
+_SECTION_BREAK = re.compile(
+    r'^\s*(?:(?:ARTICLE|Article|SECTION|Section)\s+[0-9IVXLC]+\b'
+    r'|\d{1,3}\.\s+[A-Z][A-Z0-9 ,&/\'()-]{2,}$)'
+)
+
+class ChunkTiming:
+    """Size and latency of one map call"""
+    def __init__(self, index, chars, seconds):
+        self.index = index
+        self.chars = chars
+        self.seconds = seconds
+
+class ChunkFacts:
+    """Facts gathered by the map stage, ready for the reduce prompt"""
+    def __init__(self, facts, chunk_timings, map_seconds):
+        self.facts = facts
+        self.chunk_timings = chunk_timings
+        self.map_seconds = map_seconds
+
+def template_sections(template_text):
+    """Return the section headings of a term sheet template"""
+    return compile_template(template_text).section_names
+
+def split_sections(lease_text):
+    """Split a lease into sections at article/section headings"""
+    sections = []
+    current = []
+    for line in lease_text.splitlines():
+        if _SECTION_BREAK.match(line) and current:
+            sections.append('\n'.join(current))
+            current = []
+        current.append(line)
+    if current:
+        sections.append('\n'.join(current))
+    return [section for section in sections if section.strip()]
+
+def _split_oversized(section, chunk_size):
+    # Fall back to paragraph boundaries, then hard cuts, for huge sections
+    pieces = []
+    for paragraph in section.split('\n\n'):
+        while len(paragraph) > chunk_size:
+            pieces.append(paragraph[:chunk_size])
+            paragraph = paragraph[chunk_size:]
+        pieces.append(paragraph)
+    return pieces
+
+def chunk_lease(lease_text, chunk_size=CHUNK_SIZE):
+    """Pack consecutive lease sections into chunks of about chunk_size characters"""
+    chunks = []
+    current = []
+    current_len = 0
+    for section in split_sections(lease_text):
+        pieces = [section] if len(section) <= chunk_size else _split_oversized(section, chunk_size)
+        for piece in pieces:
+            if current and current_len + len(piece) > chunk_size:
+                chunks.append('\n\n'.join(current))
+                current = []
+                current_len = 0
+            current.append(piece)
+            current_len += len(piece) + 2
+    if current:
+        chunks.append('\n\n'.join(current))
+    return chunks
+
+def build_map_prompt(sections, chunk, index, total):
+    section_list = '\n'.join(f"- {name}" for name in sections) or '- Every field of a commercial lease term sheet'
+    return f"""You are an expert commercial real estate attorney. Below is excerpt {index + 1} of {total} from a commercial lease.
+
+For each of the following term sheet sections, list the facts stated in this excerpt:
+{section_list}
+
+Rules:
+1. Output a "## <section name>" heading followed by short bullet points for each section with relevant facts
+2. Quote amounts, dates, percentages and square footage exactly as written
+3. Cite the article or section number where each fact appears
+4. Omit sections for which this excerpt contains nothing
+
+LEASE EXCERPT:
+{chunk}"""
+
+def build_reduce_prompt(template_text, facts):
+    return f"""You are an expert commercial real estate attorney specializing in lease analysis and term sheet creation.
+
+The facts below were extracted, excerpt by excerpt, from a single commercial lease. Later excerpts may amend earlier ones.
+
+LEASE TERM SHEET TEMPLATE:
+{template_text}
+
+EXTRACTED LEASE FACTS:
+{facts}
+
+Please generate a completed lease term sheet that:
+1. Follows the exact structure and format of the template
+2. Uses only the extracted facts above
+3. Fills in all sections of the template with appropriate data
+4. Maintains professional formatting
+5. Uses clear, concise language
+6. If information is not found in the facts, indicate "Not specified in lease"
+
+Generate the completed lease term sheet now:"""
+
+def extract_chunk_facts(template_text, lease_text, generate,
+                        chunk_size=CHUNK_SIZE, concurrency=CHUNK_CONCURRENCY):
+    """Run the map stage: extract per-section facts from each chunk concurrently
+
+    Args:
+        template_text: The term sheet template
+        lease_text: The full lease text
+        generate: Callable (prompt, max_output_tokens) -> text making one model call
+        chunk_size: Target characters per map chunk
+        concurrency: Maximum map calls in flight
+    """
+    sections = template_sections(template_text)
+    chunks = chunk_lease(lease_text, chunk_size)
+
+    def run_map(index):
+        started = time.perf_counter()
+        prompt = build_map_prompt(sections, chunks[index], index, len(chunks))
+        facts = generate(prompt, MAP_MAX_OUTPUT_TOKENS)
+        timing = ChunkTiming(index, len(chunks[index]), time.perf_counter() - started)
+        logger.info('chunk %d/%d: %d chars in %.2fs', index + 1, len(chunks),
+                    timing.chars, timing.seconds)
+        return facts, timing
+
+    map_started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        # Each call runs in a copy of the caller's context, so it is accounted to
+        # the caller's tenant and timed in the caller's request log
+        futures = [executor.submit(contextvars.copy_context().run, run_map, index)
+                   for index in range(len(chunks))]
+        mapped = [future.result() for future in futures]
+    map_seconds = time.perf_counter() - map_started
+
+    facts = '\n\n'.join(f"### Excerpt {i + 1}\n{text.strip()}"
+                        for i, (text, _) in enumerate(mapped) if text.strip())
+    return ChunkFacts(facts, [timing for _, timing in mapped], map_seconds)
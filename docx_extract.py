@@ -0,0 +1,141 @@
+import re
+import zipfile
+import xml.etree.ElementTree as ET
+
+_W = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+_P = _W + 'p'
+_R = _W + 'r'
+_T = _W + 't'
+_TAB = _W + 'tab'
+_BREAKS = (_W + 'br', _W + 'cr')
+_TBL = _W + 'tbl'
+_TR = _W + 'tr'
+_TC = _W + 'tc'
+_BODY = _W + 'body'
+# Text boxes are stored twice (DrawingML and a VML fallback); only the first copy is read
+_FALLBACK = '{http://schemas.openxmlformats.org/markup-compatibility/2006}Fallback'
+
+_HEADER_PART = re.compile(r'^word/header(\d*)\.xml$')
+_FOOTER_PART = re.compile(r'^word/footer(\d*)\.xml$')
+
+# Separator between the cells of an extracted table row
+CELL_SEPARATOR = ' | '
+
+def _iter_part_blocks(stream):
+    """Yield paragraphs and table rows of one WordprocessingML part in order
+
+    The part is parsed incrementally and finished body-level elements are
+    discarded as soon as they are emitted, so memory stays bounded by the
+    largest single paragraph or table row.
+    """
+    body = None
+    paragraphs = []   # Text pieces of each open paragraph (text boxes nest)
+    tables = []       # Per open table: [cells of the open row, paragraphs of the open cell]
+    run_depth = 0
+    fallback_depth = 0
+
+    for event, elem in ET.iterparse(stream, events=('start', 'end')):
+        tag = elem.tag
+        if event == 'start':
+            if tag == _FALLBACK:
+                fallback_depth += 1
+            elif fallback_depth:
+                continue
+            elif tag == _P:
+                paragraphs.append([])
+            elif tag == _R:
+                run_depth += 1
+            elif tag == _TBL:
+                tables.append([None, None])
+            elif tag == _TR:
+                tables[-1][0] = []
+            elif tag == _TC:
+                tables[-1][1] = []
+            elif tag == _BODY:
+                body = elem
+            continue
+
+        if tag == _FALLBACK:
+            fallback_depth -= 1
+            elem.clear()
+            continue
+        if fallback_depth:
+            continue
+
+        block = None
+        if tag == _R:
+            run_depth -= 1
+        elif tag == _P:
+            block = ''.join(paragraphs.pop())
+            elem.clear()
+        elif tag == _TC:
+            cell = tables[-1]
+            cell[0].append(' '.join(text.strip() for text in cell[1] if text.strip()))
+            cell[1] = None
+        elif tag == _TR:
+            cells = tables[-1][0]
+            tables[-1][0] = None
+            if any(cells):
+                block = CELL_SEPARATOR.join(cells)
+            elem.clear()
+        elif tag == _TBL:
+            tables.pop()
+            elem.clear()
+        elif run_depth and paragraphs:
+            # Tab stops in paragraph properties also use <w:tab>; only runs carry text
+            if tag == _T:
+                paragraphs[-1].append(elem.text or '')
+            elif tag == _TAB:
+                paragraphs[-1].append('\t')
+            elif tag in _BREAKS:
+                paragraphs[-1].append('\n')
+
+        if block is None:
+            continue
+        # Paragraphs and nested table rows belong to the enclosing cell, if any
+        enclosing = tables[:-1] if tag == _TR else tables
+        if enclosing and enclosing[-1][1] is not None:
+            enclosing[-1][1].append(block)
+            continue
+        # A text box paragraph is emitted ahead of the paragraph anchoring it
+        yield block
+        if not paragraphs and not tables and body is not None:
+            body.clear()
+
+def _part_number(name, pattern):
+    return int(pattern.match(name).group(1) or 0)
+
+def _iter_unique_parts(archive, pattern):
+    # Headers and footers usually repeat across sections; emit each text once
+    seen = set()
+    names = sorted((name for name in archive.namelist() if pattern.match(name)),
+                   key=lambda name: _part_number(name, pattern))
+    for name in names:
+        with archive.open(name) as stream:
+            text = '\n'.join(block for block in _iter_part_blocks(stream) if block.strip())
+        if text and text not in seen:
+            seen.add(text)
+            yield text
+
+def iter_docx_blocks(file):
+    """Yield the text blocks of a DOCX file in reading order
+
+    Headers come first, then body paragraphs and table rows (cells joined
+    with CELL_SEPARATOR) in document order, then footers. word/document.xml
+    is parsed incrementally rather than loaded into a python-docx object
+    model, so large documents are read with bounded memory.
+
+    Args:
+        file: A seekable file-like object or a path
+    """
+    if hasattr(file, 'seek'):
+        file.seek(0)
+    with zipfile.ZipFile(file) as archive:
+        yield from _iter_unique_parts(archive, _HEADER_PART)
+        with archive.open('word/document.xml') as stream:
+            yield from _iter_part_blocks(stream)
+        yield from _iter_unique_parts(archive, _FOOTER_PART)
+
+def join_blocks(blocks):
+    """Join extracted blocks into one text, one trailing newline per block"""
+    return ''.join(f"{block}\n" for block in blocks)
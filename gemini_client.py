@@ -0,0 +1,331 @@
+import asyncio
+import functools
+import os
+import queue
+import random
+import threading
+import time
+from types import SimpleNamespace
+
+import google.generativeai as genai
+from google.api_core import exceptions as api_exceptions
+from google.generativeai import client as genai_client
+
+from metrics import GEMINI_RETRIES, record_tokens
+
+# Requests per minute allowed per API key (token bucket refill rate)
+RATE_PER_MINUTE = float(os.environ.get('GEMINI_RATE_PER_MINUTE', '60'))
+# Requests that may be sent back to back before the rate limit applies
+RATE_BURST = int(os.environ.get('GEMINI_RATE_BURST', '5'))
+# Calls in flight at once per API key
+MAX_IN_FLIGHT = int(os.environ.get('GEMINI_MAX_IN_FLIGHT', '4'))
+# Retries of a call rejected with 429 or a 5xx error
+MAX_RETRIES = int(os.environ.get('GEMINI_MAX_RETRIES', '4'))
+BACKOFF_BASE_SECONDS = float(os.environ.get('GEMINI_BACKOFF_BASE_SECONDS', '1'))
+BACKOFF_MAX_SECONDS = float(os.environ.get('GEMINI_BACKOFF_MAX_SECONDS', '30'))
+# How long the list of available models is reused
+MODEL_LIST_TTL_SECONDS = int(os.environ.get('GEMINI_MODEL_LIST_TTL_SECONDS', '3600'))
+# Answer every call with StubModel instead of the Gemini API (offline development)
+STUB_ENABLED = os.environ.get('GEMINI_STUB', 'off').lower() in ('1', 'true', 'on')
+# Per-key quota the stub enforces with 429s, to exercise key pooling (0: unlimited)
+STUB_REQUESTS_PER_MINUTE = int(os.environ.get('GEMINI_STUB_REQUESTS_PER_MINUTE', '0'))
+STUB_TOKENS_PER_MINUTE = int(os.environ.get('GEMINI_STUB_TOKENS_PER_MINUTE', '0'))
+# Simulated time the stub takes per call (to its first text) and per streamed line
+STUB_LATENCY_SECONDS = float(os.environ.get('GEMINI_STUB_LATENCY_SECONDS', '0'))
+STUB_SECONDS_PER_LINE = float(os.environ.get('GEMINI_STUB_SECONDS_PER_LINE', '0'))
+
+# ResourceExhausted (gRPC) subclasses TooManyRequests; ServerError covers 5xx
+RETRYABLE_ERRORS = (api_exceptions.TooManyRequests, api_exceptions.ServerError)
+
+_loop = None
+_loop_lock = threading.Lock()
+
+def _get_loop():
+    """Return the event loop every Gemini call runs on, starting its thread once"""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name='gemini-loop', daemon=True).start()
+            _loop = loop
+        return _loop
+
+def backoff_delay(attempt):
+    """Full-jitter exponential backoff for the given retry attempt (0-based)"""
+    return random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+class TokenBucket:
+    """Async token bucket: refills rate_per_second tokens, holds at most burst"""
+    def __init__(self, rate_per_second, burst):
+        self.rate_per_second = rate_per_second
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate_per_second)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate_per_second)
+
+class StubResponse:
+    """A response or streamed chunk from StubModel"""
+    def __init__(self, text, usage_metadata=None):
+        self.text = text
+        self.parts = [text] if text else []
+        self.usage_metadata = usage_metadata
+
+class StubQuota:
+    """Per-minute request and token quota of one stub API key
+
+    Calls beyond either limit in the trailing minute are rejected with
+    ResourceExhausted (429), as Gemini does for an exhausted key.
+    """
+    def __init__(self, requests_per_minute=0, tokens_per_minute=0):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._calls = []
+
+    def charge(self, tokens):
+        now = time.monotonic()
+        self._calls = [(at, used) for at, used in self._calls if now - at < 60]
+        if (self.requests_per_minute and len(self._calls) >= self.requests_per_minute) or \
+                (self.tokens_per_minute and sum(used for _, used in self._calls) + tokens > self.tokens_per_minute):
+            raise api_exceptions.ResourceExhausted('stub quota exceeded')
+        self._calls.append((now, tokens))
+
+class StubModel:
+    """Offline stand-in for GenerativeModel
+
+    JSON-mode calls get an empty object; other calls get a short text that
+    names the model and prompt size, streamed a line at a time. Token usage
+    is estimated at four characters per token. The first fail_first calls
+    raise ServiceUnavailable to exercise retries; a StubQuota shared by a
+    key's models rejects calls over its quota, and latency delays each call.
+    seconds_per_line is the time to generate each line: streamed lines
+    arrive one by one, a non-streamed response after all of them.
+    """
+    def __init__(self, model_name, fail_first=0, quota=None, latency=0, seconds_per_line=0):
+        self.model_name = model_name
+        self.fail_first = fail_first
+        self.quota = quota
+        self.latency = latency
+        self.seconds_per_line = seconds_per_line
+        self.calls = 0
+
+    async def generate_content_async(self, contents, generation_config=None, stream=False):
+        self.calls += 1
+        if self.calls <= self.fail_first:
+            raise api_exceptions.ServiceUnavailable('stub failure')
+        if self.quota is not None:
+            self.quota.charge(len(str(contents)) // 4)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        mime_type = getattr(generation_config, 'response_mime_type', None)
+        if isinstance(generation_config, dict):
+            mime_type = generation_config.get('response_mime_type')
+        if mime_type == 'application/json':
+            text = '{}'
+        else:
+            text = (f"STUB TERM SHEET\nModel: {self.model_name}\n"
+                    f"Prompt: {len(str(contents)):,} characters\n")
+        usage = SimpleNamespace(prompt_token_count=len(str(contents)) // 4,
+                                candidates_token_count=len(text) // 4)
+        lines = text.splitlines(keepends=True)
+        if not stream:
+            if self.seconds_per_line:
+                await asyncio.sleep(self.seconds_per_line * len(lines))
+            return StubResponse(text, usage)
+
+        async def chunks():
+            for index, line in enumerate(lines):
+                await asyncio.sleep(self.seconds_per_line)
+                yield StubResponse(line, usage if index == len(lines) - 1 else None)
+        return chunks()
+
+class GeminiClient:
+    """Shared Gemini access for one API key
+
+    The key's API clients and GenerativeModel objects are created once and
+    reused, instead of calling genai.configure() per request. Every call
+    waits for the key's token bucket and in-flight semaphore, and calls
+    rejected with 429 or 5xx are retried with jittered exponential backoff.
+    Calls use the async API on a shared background event loop; generate()
+    and stream() are blocking wrappers for synchronous callers.
+    """
+    def __init__(self, api_key, rate_per_minute=RATE_PER_MINUTE, burst=RATE_BURST,
+                 max_in_flight=MAX_IN_FLIGHT, max_retries=MAX_RETRIES, model_factory=None):
+        self.api_key = api_key
+        self.max_retries = max_retries
+        if model_factory is None and STUB_ENABLED:
+            # One quota per client, as Gemini quotas are per key
+            model_factory = functools.partial(
+                StubModel, quota=StubQuota(STUB_REQUESTS_PER_MINUTE, STUB_TOKENS_PER_MINUTE),
+                latency=STUB_LATENCY_SECONDS, seconds_per_line=STUB_SECONDS_PER_LINE)
+        self._model_factory = model_factory
+        self._bucket = TokenBucket(rate_per_minute / 60, burst)
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+        self._clients = genai_client._ClientManager()
+        self._clients.configure(api_key=api_key)
+        self._models = {}
+        self._model_list = None
+        self._model_list_at = 0
+        self._lock = threading.Lock()
+
+    def _model(self, model_name):
+        # Only called on the event loop thread, where the async transport lives
+        model = self._models.get(model_name)
+        if model is None:
+            if self._model_factory is not None:
+                model = self._model_factory(model_name)
+            else:
+                model = genai.GenerativeModel(model_name)
+                model._async_client = self._clients.get_default_client('generative_async')
+            self._models[model_name] = model
+        return model
+
+    async def _generate_response(self, model_name, prompt, generation_config):
+        attempt = 0
+        while True:
+            await self._bucket.acquire()
+            try:
+                async with self._semaphore:
+                    return await self._model(model_name).generate_content_async(
+                        prompt, generation_config=generation_config)
+            except RETRYABLE_ERRORS as e:
+                if attempt >= self.max_retries:
+                    raise
+                GEMINI_RETRIES.inc(error=type(e).__name__)
+                await asyncio.sleep(backoff_delay(attempt))
+                attempt += 1
+
+    async def _stream_chunks(self, model_name, prompt, generation_config):
+        # A call is only retried before its first text arrives
+        attempt = 0
+        while True:
+            await self._bucket.acquire()
+            started = False
+            try:
+                async with self._semaphore:
+                    response = await self._model(model_name).generate_content_async(
+                        prompt, generation_config=generation_config, stream=True)
+                    async for chunk in response:
+                        started = started or bool(chunk.parts)
+                        yield chunk
+                return
+            except RETRYABLE_ERRORS as e:
+                if started or attempt >= self.max_retries:
+                    raise
+                GEMINI_RETRIES.inc(error=type(e).__name__)
+                await asyncio.sleep(backoff_delay(attempt))
+                attempt += 1
+
+    @staticmethod
+    def _record_usage(model_name, usage, on_usage):
+        record_tokens(model_name, usage)
+        if on_usage is not None:
+            on_usage(usage)
+
+    async def generate_async(self, model_name, prompt, generation_config=None, on_usage=None):
+        """Return the response text of one generate call
+
+        on_usage, if given, is called with the response's usage metadata.
+        """
+        response = await self._generate_response(model_name, prompt, generation_config)
+        self._record_usage(model_name, getattr(response, 'usage_metadata', None), on_usage)
+        return response.text
+
+    async def stream_async(self, model_name, prompt, generation_config=None, on_usage=None):
+        """Yield response text as it streams in
+
+        A call is only retried before its first text arrives; later errors
+        are raised to the caller.
+        """
+        usage = None
+        async for chunk in self._stream_chunks(model_name, prompt, generation_config):
+            usage = getattr(chunk, 'usage_metadata', None) or usage
+            # The final chunk may carry only a finish reason and no text
+            if chunk.parts:
+                yield chunk.text
+        self._record_usage(model_name, usage, on_usage)
+
+    def generate(self, model_name, prompt, generation_config=None, on_usage=None):
+        """Blocking generate_async() for synchronous callers"""
+        future = asyncio.run_coroutine_threadsafe(
+            self._generate_response(model_name, prompt, generation_config), _get_loop())
+        response = future.result()
+        # Recorded on the calling thread so the tokens count toward its request
+        self._record_usage(model_name, getattr(response, 'usage_metadata', None), on_usage)
+        return response.text
+
+    def stream(self, model_name, prompt, generation_config=None, on_usage=None):
+        """Blocking iterator over stream_async() for synchronous callers"""
+        chunks = queue.Queue()
+        done = object()
+
+        async def pump():
+            try:
+                async for chunk in self._stream_chunks(model_name, prompt, generation_config):
+                    chunks.put(chunk)
+            except Exception as e:
+                chunks.put(e)
+            else:
+                chunks.put(done)
+
+        future = asyncio.run_coroutine_threadsafe(pump(), _get_loop())
+        usage = None
+        try:
+            while True:
+                chunk = chunks.get()
+                if chunk is done:
+                    break
+                if isinstance(chunk, Exception):
+                    raise chunk
+                usage = getattr(chunk, 'usage_metadata', None) or usage
+                if chunk.parts:
+                    yield chunk.text
+        finally:
+            # Stop generating if the consumer went away early
+            future.cancel()
+        self._record_usage(model_name, usage, on_usage)
+
+    def list_models(self):
+        """Return the models that support generateContent, cached for MODEL_LIST_TTL_SECONDS"""
+        with self._lock:
+            if self._model_list is None or time.time() - self._model_list_at > MODEL_LIST_TTL_SECONDS:
+                if self._model_factory is not None:
+                    models = []
+                else:
+                    model_client = self._clients.get_default_client('model')
+                    models = [model.name for model in genai.list_models(client=model_client)
+                              if 'generateContent' in model.supported_generation_methods]
+                self._model_list = models
+                self._model_list_at = time.time()
+            return self._model_list
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+def get_gemini_client(api_key):
+    """Return the process-wide GeminiClient for api_key"""
+    with _clients_lock:
+        client = _clients.get(api_key)
+        if client is None:
+            client = _clients[api_key] = GeminiClient(api_key)
+        return client
+
+def _reset_after_fork():
+    # Event loop threads and gRPC channels do not survive fork()
+    global _loop, _loop_lock, _clients_lock
+    _loop = None
+    _loop_lock = threading.Lock()
+    _clients_lock = threading.Lock()
+    _clients.clear()
+
+os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,171 @@
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+# Job states
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+# The Job a thread-pool worker is currently running
+_current = threading.local()
+
+def current_job():
+    """Return the Job running on this worker thread, or None
+
+    Job functions use this to publish partial output while they run. It is
+    always None for process-pool jobs.
+    """
+    return getattr(_current, 'job', None)
+
+class Job:
+    """A single unit of background work and its outcome"""
+    def __init__(self, job_id, tenant=None):
+        self.id = job_id
+        self.tenant = tenant
+        self.status = PENDING
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        # Partial output published by the running job, in order
+        self.output = []
+
+    def append_output(self, text):
+        self.output.append(text)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'tenant': self.tenant,
+            'status': self.status,
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+        }
+
+class JobQueue:
+    """In-process job queue backed by a thread or process pool
+
+    Jobs are tracked in memory, so every request that polls a job must be
+    served by the process that enqueued it (run gunicorn with one worker
+    process and several threads, e.g. ``--workers 1 --threads 8``).
+
+    With max_per_tenant set, jobs submitted for a tenant run at most that
+    many at a time; the rest wait in that tenant's queue, so one tenant
+    cannot hold every worker while others wait behind it.
+    """
+    def __init__(self, max_workers=4, kind='thread', retention_seconds=3600, max_per_tenant=None):
+        if kind == 'process':
+            self._executor = ProcessPoolExecutor(max_workers=max_workers)
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                                thread_name_prefix='job-worker')
+        self.kind = kind
+        self.max_workers = max_workers
+        self.retention_seconds = retention_seconds
+        self.max_per_tenant = max_per_tenant
+        self._jobs = {}
+        # Per tenant: jobs dispatched to the pool and not finished, and jobs waiting
+        self._active = {}
+        self._waiting = {}
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args, **kwargs):
+        """Enqueue fn(*args, **kwargs) and return the new job ID"""
+        return self.submit_for(None, fn, *args, **kwargs)
+
+    def submit_for(self, tenant, fn, *args, **kwargs):
+        """Enqueue fn(*args, **kwargs) on behalf of tenant and return the new job ID"""
+        job = Job(uuid.uuid4().hex, tenant)
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+            if (tenant is not None and self.max_per_tenant
+                    and self._active.get(tenant, 0) >= self.max_per_tenant):
+                self._waiting.setdefault(tenant, deque()).append((job, fn, args, kwargs))
+                return job.id
+            if tenant is not None:
+                self._active[tenant] = self._active.get(tenant, 0) + 1
+        self._dispatch(job, fn, args, kwargs)
+        return job.id
+
+    def queued(self, tenant):
+        """Number of tenant's jobs waiting or running"""
+        with self._lock:
+            return self._active.get(tenant, 0) + len(self._waiting.get(tenant, ()))
+
+    def _dispatch(self, job, fn, args, kwargs):
+        if self.kind == 'process':
+            # Functions run in another process, so timestamps are taken here
+            job.status = RUNNING
+            job.started_at = time.time()
+            future = self._executor.submit(fn, *args, **kwargs)
+        else:
+            future = self._executor.submit(self._run, job, fn, args, kwargs)
+        future.add_done_callback(lambda f: self._finish(job, f))
+
+    def get(self, job_id):
+        """Return the Job for job_id, or None if unknown or expired"""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+    def _run(self, job, fn, args, kwargs):
+        job.status = RUNNING
+        job.started_at = time.time()
+        _current.job = job
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _current.job = None
+
+    def _finish(self, job, future):
+        try:
+            job.result = future.result()
+            job.status = DONE
+        except Exception as e:
+            job.error = str(e)
+            job.status = FAILED
+        job.finished_at = time.time()
+        if job.tenant is None:
+            return
+        # Start the tenant's next waiting job in the slot this one freed
+        with self._lock:
+            waiting = self._waiting.get(job.tenant)
+            if waiting:
+                following = waiting.popleft()
+                if not waiting:
+                    del self._waiting[job.tenant]
+            else:
+                following = None
+                self._active[job.tenant] -= 1
+                if not self._active[job.tenant]:
+                    del self._active[job.tenant]
+        if following is not None:
+            self._dispatch(*following)
+
+    def _prune(self):
+        # Called with the lock held; drop finished jobs past their retention
+        cutoff = time.time() - self.retention_seconds
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.finished_at is not None and job.finished_at < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+def create_job_queue():
+    """Create a JobQueue configured from environment variables"""
+    return JobQueue(
+        max_workers=int(os.environ.get('JOB_WORKERS', '4')),
+        kind=os.environ.get('JOB_WORKER_KIND', 'thread'),
+        retention_seconds=int(os.environ.get('JOB_RETENTION_SECONDS', '3600')),
+        max_per_tenant=int(os.environ.get('JOB_MAX_PER_TENANT', '0')) or None,
+    )
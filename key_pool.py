@@ -0,0 +1,269 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+from google.api_core import exceptions as api_exceptions
+
+from gemini_client import GeminiClient, RETRYABLE_ERRORS, MAX_RETRIES, RATE_PER_MINUTE, backoff_delay
+from metrics import GEMINI_RETRIES, Counter, register
+from tenant_usage import current_tenant, get_usage_ledger
+
+logger = logging.getLogger(__name__)
+
+# Quota of each pooled key, as granted by Gemini for the project behind it
+KEY_REQUESTS_PER_MINUTE = float(os.environ.get('GEMINI_KEY_REQUESTS_PER_MINUTE', str(RATE_PER_MINUTE)))
+KEY_TOKENS_PER_MINUTE = int(os.environ.get('GEMINI_KEY_TOKENS_PER_MINUTE', '1000000'))
+# How long a call waits for a key with quota left before giving up
+KEY_POOL_WAIT_SECONDS = float(os.environ.get('KEY_POOL_WAIT_SECONDS', '30'))
+# How long a 429 counts against a key when choosing between keys
+RATE_LIMIT_MEMORY_SECONDS = 300
+
+KEY_POOL_CALLS = register(Counter(
+    'term_sheet_key_pool_calls_total', 'Gemini calls by pooled key and outcome', ['key', 'outcome']))
+
+def load_api_keys():
+    """Return the pooled API keys: GEMINI_API_KEYS (comma separated), else GEMINI_API_KEY"""
+    keys = [key.strip() for key in os.environ.get('GEMINI_API_KEYS', '').split(',') if key.strip()]
+    if not keys and os.environ.get('GEMINI_API_KEY'):
+        keys = [os.environ['GEMINI_API_KEY']]
+    return keys
+
+def key_label(api_key):
+    """Name for a key in logs, metrics and the usage ledger; the key itself is never recorded"""
+    return 'key-' + hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:8]
+
+class KeyPoolExhausted(Exception):
+    """No pooled key had quota left within the wait; retry_after is in seconds"""
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class PooledKey:
+    """Quota state of one API key in a KeyPool
+
+    Requests and tokens are counted over a trailing minute. A call's
+    tokens are estimated from its prompt when it starts and corrected from
+    the response's usage when it finishes. After a 429 or 5xx the key cools
+    down for a jittered, exponentially growing delay.
+    """
+    def __init__(self, api_key, client, requests_per_minute, tokens_per_minute):
+        self.api_key = api_key
+        self.label = key_label(api_key)
+        self.client = client
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.in_flight = 0
+        self.strikes = 0
+        self.cooldown_until = 0.0
+        # [started, tokens] per call in the trailing minute
+        self._calls = deque()
+        self._rate_limits = deque()
+
+    def _trim(self, now):
+        while self._calls and now - self._calls[0][0] >= 60:
+            self._calls.popleft()
+        while self._rate_limits and now - self._rate_limits[0] >= RATE_LIMIT_MEMORY_SECONDS:
+            self._rate_limits.popleft()
+
+    def remaining(self, now, tokens=0):
+        """Share of the key's per-minute quota left, counting a call of tokens (may be negative)"""
+        self._trim(now)
+        used_tokens = sum(call[1] for call in self._calls) + tokens
+        return min(1 - (len(self._calls) + 1) / self.requests_per_minute,
+                   1 - used_tokens / self.tokens_per_minute)
+
+    def score(self, now, tokens=0):
+        """Higher is better: quota left, discounted by recent 429s and calls in flight"""
+        return self.remaining(now, tokens) / (1 + len(self._rate_limits) + self.in_flight)
+
+    def available_at(self, now, tokens=0):
+        """When the key could take a call of tokens: now, or once its cooldown and minute window allow"""
+        at = max(now, self.cooldown_until)
+        if self.remaining(now, tokens) >= 0:
+            return at
+        # Quota frees up as the oldest calls leave the trailing minute
+        return max(at, self._calls[0][0] + 60) if self._calls else at
+
+    def stats(self, now):
+        self._trim(now)
+        return {
+            'key': self.label,
+            'requests_last_minute': len(self._calls),
+            'tokens_last_minute': sum(call[1] for call in self._calls),
+            'remaining': round(max(0.0, self.remaining(now)), 3),
+            'in_flight': self.in_flight,
+            'rate_limited_recently': len(self._rate_limits),
+            'cooldown_seconds': round(max(0.0, self.cooldown_until - now), 1),
+        }
+
+def _estimate_tokens(prompt):
+    # About four characters per token, as Gemini counts English text
+    return len(str(prompt)) // 4
+
+def _usage_tokens(usage):
+    if usage is None:
+        return None, None
+    return (getattr(usage, 'prompt_token_count', 0) or 0,
+            getattr(usage, 'candidates_token_count', 0) or 0)
+
+def _usage_recorder(usage, on_usage):
+    # Keep the response's usage for the ledger and pass it on to the caller
+    def record(metadata):
+        usage.append(metadata)
+        if on_usage is not None:
+            on_usage(metadata)
+    return record
+
+class KeyPool:
+    """Spreads Gemini calls over several API keys by remaining quota
+
+    Each call goes to the key with the most per-minute quota left,
+    discounted by its recent 429s and calls already in flight. A call
+    rejected with 429 or 5xx is retried on the best key at that moment,
+    usually a different one; when every key is cooling down or out of
+    quota, calls wait up to wait_seconds and then raise KeyPoolExhausted.
+    Every call is added to the usage ledger under the current tenant.
+    Offers the generate/stream/list_models interface of GeminiClient.
+    """
+    def __init__(self, api_keys, requests_per_minute=KEY_REQUESTS_PER_MINUTE,
+                 tokens_per_minute=KEY_TOKENS_PER_MINUTE, wait_seconds=KEY_POOL_WAIT_SECONDS,
+                 max_retries=MAX_RETRIES, client_factory=None, ledger=None):
+        if not api_keys:
+            raise ValueError('A key pool needs at least one API key')
+        # Pooled clients do not retry themselves; the pool retries on another key
+        client_factory = client_factory or (lambda api_key: GeminiClient(api_key, max_retries=0))
+        self.keys = [PooledKey(api_key, client_factory(api_key), requests_per_minute, tokens_per_minute)
+                     for api_key in dict.fromkeys(api_keys)]
+        self.wait_seconds = wait_seconds
+        self.max_retries = max_retries
+        self.ledger = ledger
+        self._changed = threading.Condition()
+
+    def _acquire(self, tokens):
+        deadline = time.monotonic() + self.wait_seconds
+        with self._changed:
+            while True:
+                now = time.monotonic()
+                ready = [key for key in self.keys if key.available_at(now, tokens) <= now]
+                if ready:
+                    key = max(ready, key=lambda key: key.score(now, tokens))
+                    call = [now, tokens]
+                    key._calls.append(call)
+                    key.in_flight += 1
+                    return key, call
+                next_at = min(key.available_at(now, tokens) for key in self.keys)
+                if next_at > deadline:
+                    raise KeyPoolExhausted(
+                        f"All {len(self.keys)} Gemini API keys are out of quota; "
+                        f"retry in {int(next_at - now) + 1}s", int(next_at - now) + 1)
+                self._changed.wait(next_at - now)
+
+    def _release(self, key, call, model_name, started, usage=None, error=None):
+        seconds = time.perf_counter() - started
+        input_tokens, output_tokens = _usage_tokens(usage)
+        rate_limited = isinstance(error, api_exceptions.TooManyRequests)
+        with self._changed:
+            key.in_flight -= 1
+            if input_tokens is not None:
+                call[1] = input_tokens + output_tokens
+            if isinstance(error, RETRYABLE_ERRORS):
+                key.cooldown_until = time.monotonic() + backoff_delay(key.strikes)
+                key.strikes += 1
+                if rate_limited:
+                    key._rate_limits.append(time.monotonic())
+            elif error is None:
+                key.strikes = 0
+            self._changed.notify_all()
+        outcome = 'rate_limited' if rate_limited else 'error' if error is not None else 'ok'
+        KEY_POOL_CALLS.inc(key=key.label, outcome=outcome)
+        if rate_limited:
+            logger.info('Gemini key %s rate limited; cooling down', key.label)
+        ledger = self.ledger or get_usage_ledger()
+        ledger.record(current_tenant(), key.label, model_name, input_tokens or 0, output_tokens or 0,
+                      seconds, error=error is not None, rate_limited=rate_limited)
+
+    def generate(self, model_name, prompt, generation_config=None, on_usage=None):
+        """Return the response text of one generate call"""
+        attempt = 0
+        while True:
+            key, call = self._acquire(_estimate_tokens(prompt))
+            started = time.perf_counter()
+            usage = []
+            record_usage = _usage_recorder(usage, on_usage)
+            try:
+                text = key.client.generate(model_name, prompt, generation_config, on_usage=record_usage)
+            except Exception as e:
+                self._release(key, call, model_name, started, error=e)
+                if not isinstance(e, RETRYABLE_ERRORS) or attempt >= self.max_retries:
+                    raise
+                GEMINI_RETRIES.inc(error=type(e).__name__)
+                attempt += 1
+                continue
+            self._release(key, call, model_name, started, usage[-1] if usage else None)
+            return text
+
+    def stream(self, model_name, prompt, generation_config=None, on_usage=None):
+        """Yield response text as it streams in; only retried before the first text arrives"""
+        attempt = 0
+        while True:
+            key, call = self._acquire(_estimate_tokens(prompt))
+            started = time.perf_counter()
+            usage = []
+            record_usage = _usage_recorder(usage, on_usage)
+            sent = False
+            try:
+                for text in key.client.stream(model_name, prompt, generation_config, on_usage=record_usage):
+                    sent = True
+                    yield text
+            except Exception as e:
+                self._release(key, call, model_name, started, error=e)
+                if sent or not isinstance(e, RETRYABLE_ERRORS) or attempt >= self.max_retries:
+                    raise
+                GEMINI_RETRIES.inc(error=type(e).__name__)
+                attempt += 1
+                continue
+            except GeneratorExit:
+                # The consumer stopped early; the call still counts
+                self._release(key, call, model_name, started)
+                raise
+            self._release(key, call, model_name, started, usage[-1] if usage else None)
+            return
+
+    def list_models(self):
+        """Return the models available to the key with the most quota left"""
+        now = time.monotonic()
+        with self._changed:
+            key = max(self.keys, key=lambda key: key.score(now))
+        return key.client.list_models()
+
+    def stats(self):
+        """Current quota state of every key"""
+        now = time.monotonic()
+        with self._changed:
+            return [key.stats(now) for key in self.keys]
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_key_pool(api_key=None):
+    """Return the process-wide KeyPool of the configured keys, or a one-key pool for api_key
+
+    A user's own key is never shared with other users, but its calls are
+    still accounted to their tenant.
+    """
+    with _pools_lock:
+        pool = _pools.get(api_key)
+        if pool is None:
+            pool = _pools[api_key] = KeyPool([api_key] if api_key else load_api_keys())
+        return pool
+
+def _reset_after_fork():
+    # Pooled clients belong to the parent's event loop, as in gemini_client
+    global _pools_lock
+    _pools_lock = threading.Lock()
+    _pools.clear()
+
+os.register_at_fork(after_in_child=_reset_after_fork)
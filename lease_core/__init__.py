@@ -0,0 +1,23 @@
+"""Document readers, prompt building, Gemini generation and DOCX rendering shared by the apps
+
+app.py, app_streamlit.py and batch_generate.py all import these from
+here. Heavy dependencies are imported on first use rather than with the
+package: the Gemini SDK on the first model call, PyPDF2 on the first PDF
+read, python-docx on the first DOCX rendered and NumPy on the first rent
+schedule. A process that only serves stored results loads none of them.
+
+Readers are looked up by file extension; register_reader() adds or
+replaces one.
+"""
+from lease_core.readers import (HTMLTextExtractor, Reader, register_reader, get_reader,
+                                read_html, read_pdf, read_docx, extract_document,
+                                read_document, read_document_pages, format_name)
+from lease_core.template import load_default_template, DEFAULT_TEMPLATE, DEFAULT_COMPILED_TEMPLATE
+from lease_core.generation import (model_router, MODEL_NAME, GENERATION_CONFIG, STRUCTURED_SCHEMA_VERSION,
+                                   get_result_cache, get_lease_index, get_gemini_client, generation_config,
+                                   list_available_models, build_prompt, generation_error_message, GenerationError,
+                                   stream_term_sheet, generate_term_sheet, stream_revised_term_sheet,
+                                   index_lease, generate_structured_record)
+from lease_core.render import (Block, parse_layout, render_docx, render_pdf, render_export, render_exports,
+                               create_docx_from_text, create_pdf_from_text, rent_terms_for,
+                               EXPORT_FORMATS, RENDER_VERSION)
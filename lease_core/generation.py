@@ -0,0 +1,314 @@
+import logging
+import sqlite3
+import time
+
+from result_cache import create_result_cache, make_cache_key
+from metrics import timed, annotate
+from chunked_analysis import extract_chunk_facts, build_reduce_prompt, CHUNK_SIZE
+from lease_diff import build_revision_prompt
+from template_model import compile_template
+from structured_extraction import (build_schema, build_structured_prompt, parse_response,
+                                   failing_sections, field_keys, encode_record, decode_record, parse_term_sheet)
+from model_router import ModelRouter, load_model_tiers, score_term_sheet
+from lease_index import create_lease_index
+from token_budget import (budget_lease_text, check_prompt, output_token_budget, output_budget_for_text,
+                          PROMPT_TOKEN_BUDGET)
+
+logger = logging.getLogger(__name__)
+
+# Models tried fastest first (MODEL_TIERS); the last tier also handles long leases
+# and revisions. The tiers and generation settings are part of the result cache key;
+# max_output_tokens here is a fallback, calls size it from the template's fields
+model_router = ModelRouter(load_model_tiers())
+MODEL_NAME = model_router.final_tier
+GENERATION_CONFIG = {
+    'temperature': 0.3,
+    'max_output_tokens': 4000,
+}
+# Bump when the structured schema or prompt changes so cached records are not reused
+STRUCTURED_SCHEMA_VERSION = 2
+
+_result_cache = None
+_lease_index = None
+
+def get_result_cache():
+    """Return the persistent cache of generated term sheets, shared by both apps"""
+    global _result_cache
+    if _result_cache is None:
+        _result_cache = create_result_cache()
+    return _result_cache
+
+def get_lease_index():
+    """Return the searchable index of generated term sheets, shared by both apps"""
+    global _lease_index
+    if _lease_index is None:
+        _lease_index = create_lease_index()
+    return _lease_index
+
+# The Gemini SDK (with gRPC and protobuf) is imported on the first model call,
+# so processes that only serve stored results never load it
+def get_gemini_client(api_key=None):
+    """Return the Gemini client for a user's own api_key, or the shared key pool for None"""
+    from key_pool import get_key_pool
+    return get_key_pool(api_key)
+
+def generation_config(**settings):
+    """Return a Gemini GenerationConfig of GENERATION_CONFIG updated with settings"""
+    import google.generativeai as genai
+    return genai.types.GenerationConfig(**{**GENERATION_CONFIG, **settings})
+
+def list_available_models(api_key):
+    """List available Gemini models"""
+    try:
+        # Cached per API key, so error reporting does not cost a round-trip each time
+        return get_gemini_client(api_key).list_models()
+    except Exception as e:
+        return []
+
+def build_prompt(template_text, lease_text):
+    """Build the single-call term sheet prompt"""
+    prompt = f"""You are a commercial real estate expert. You have been provided with:
+1. A lease term sheet template
+2. A full commercial lease document
+
+Your task is to analyze the commercial lease and extract all relevant information to create a completed lease term sheet that matches the template format exactly.
+
+LEASE TERM SHEET TEMPLATE:
+{template_text}
+
+COMMERCIAL LEASE:
+{lease_text}
+
+Please generate a completed lease term sheet that:
+1. Follows the exact structure and format of the template
+2. Extracts all relevant information from the commercial lease
+3. Fills in all sections of the template with appropriate data from the lease
+4. Maintains professional formatting
+5. Uses clear, concise language
+6. If information is not found in the lease, indicate "Not specified in lease"
+7. Lines such as [p12] mark where a lease page begins; use them to cite pages, but do not copy the markers themselves
+
+Generate the completed lease term sheet now:"""
+
+    return f"""You are an expert commercial real estate attorney specializing in lease analysis and term sheet creation.
+
+{prompt}"""
+
+class GenerationError(Exception):
+    """Gemini failed to produce a complete term sheet; the message is shown to the user"""
+
+def generation_error_message(e, api_key):
+    """Turn a Gemini exception into the error text shown to the user"""
+    error_msg = str(e)
+    # If model not found, try to list available models
+    if "not found" in error_msg.lower() or "not supported" in error_msg.lower():
+        available_models = list_available_models(api_key)
+        if available_models:
+            models_str = "\n".join([f"  - {m}" for m in available_models])
+            return f"Error: The specified model is not available.\n\nAvailable models that support content generation:\n{models_str}\n\nOriginal error: {error_msg}"
+        else:
+            return f"Error generating term sheet: {error_msg}\n\nTip: Common model names include 'gemini-2.5-pro', 'gemini-1.5-flash', 'gemini-1.5-pro', or 'gemini-pro'"
+    return f"Error generating term sheet: {error_msg}"
+
+def stream_term_sheet(template_text, lease_text, api_key, route=False):
+    """Generate term sheet using Gemini API, yielding text as it arrives
+
+    The final tier is streamed straight away, so text starts arriving after
+    one model's time to first token. With route, single-call leases go
+    through the model tiers first: a faster tier's term sheet is generated
+    in full and only used if it passes local quality checks. That delays
+    the first text by a whole fast generation, so only callers that wait
+    for the complete term sheet anyway should route. Leases over the
+    prompt token budget are compacted first. Raises GenerationError if
+    Gemini fails, also after some text has been yielded.
+    """
+    # Leases still over the token budget once compacted are analyzed chunk by chunk (map-reduce)
+    with timed('budget'):
+        budget = budget_lease_text(lease_text, MODEL_NAME)
+    chunked = budget.over_budget
+    lease_text_sent = budget.text
+    max_output = output_token_budget(len(compile_template(template_text).fields))
+    annotate(max_output_tokens=max_output)
+    cache_config = {**GENERATION_CONFIG, 'max_output_tokens': max_output, 'prompt_token_budget': PROMPT_TOKEN_BUDGET}
+    if chunked:
+        cache_config['chunk_size'] = CHUNK_SIZE
+    
+    # Identical lease/template/model/config inputs reuse the stored result. Routed
+    # term sheets may come from a faster tier, so they are cached apart from the
+    # final tier's: interactive callers never get a sheet they did not ask for
+    routed = route and not chunked
+    cache_key = make_cache_key(lease_text, template_text,
+                               model_router.cache_name if routed else MODEL_NAME, cache_config)
+    cached = get_result_cache().get(cache_key)
+    if cached is not None:
+        yield cached
+        return
+
+    parts = []
+    try:
+        gemini = get_gemini_client(api_key)
+        config = generation_config(max_output_tokens=max_output)
+        
+        if chunked:
+            def generate(chunk_prompt, max_output_tokens):
+                return gemini.generate(MODEL_NAME, chunk_prompt,
+                                       generation_config(max_output_tokens=max_output_tokens),
+                                       on_usage=check_prompt(chunk_prompt, MODEL_NAME, 'chunk'))
+            
+            # Map stage runs to completion; only the reduce call is streamed
+            with timed('map'):
+                mapped = extract_chunk_facts(template_text, lease_text_sent, generate)
+            with timed('prompt'):
+                full_prompt = build_reduce_prompt(template_text, mapped.facts)
+        else:
+            with timed('prompt'):
+                full_prompt = build_prompt(template_text, lease_text_sent)
+            
+            compiled = compile_template(template_text)
+            # Streaming callers go straight to the final tier (see above)
+            for model_name in (model_router.fast_tiers if routed else []):
+                started = time.perf_counter()
+                try:
+                    with timed('generate'):
+                        text = gemini.generate(model_name, full_prompt, config,
+                                               on_usage=check_prompt(full_prompt, model_name, 'term sheet'))
+                    failures = score_term_sheet(compiled, text).failures(model_router.max_unspecified_ratio)
+                except Exception as e:
+                    text, failures = None, [type(e).__name__]
+                if model_router.accept(model_name, failures, time.perf_counter() - started, 'term sheet'):
+                    get_result_cache().set(cache_key, text)
+                    yield text
+                    return
+        
+        started = time.perf_counter()
+        on_usage = check_prompt(full_prompt, MODEL_NAME, 'reduce' if chunked else 'term sheet')
+        with timed('generate'):
+            for text in gemini.stream(MODEL_NAME, full_prompt, config, on_usage=on_usage):
+                parts.append(text)
+                yield text
+        if not chunked:
+            model_router.finish(MODEL_NAME, time.perf_counter() - started, 'term sheet')
+        
+        get_result_cache().set(cache_key, ''.join(parts))
+        
+    except Exception as e:
+        # Raised even after text has streamed, so a truncated term sheet is never taken as complete
+        raise GenerationError(generation_error_message(e, api_key)) from e
+
+def generate_term_sheet(template_text, lease_text, api_key):
+    """Generate term sheet using Gemini API, routed through the model tiers"""
+    return ''.join(stream_term_sheet(template_text, lease_text, api_key, route=True))
+
+def stream_revised_term_sheet(prior_term_sheet, diff, api_key):
+    """Patch a prior term sheet with the changed lease sections, yielding text as it arrives
+
+    Raises GenerationError if Gemini fails, also after some text has been yielded.
+    """
+    if not diff.changes:
+        # Nothing changed between the versions; the prior term sheet still holds
+        yield prior_term_sheet
+        return
+    
+    with timed('prompt'):
+        full_prompt = build_revision_prompt(prior_term_sheet, diff)
+    cache_config = {**GENERATION_CONFIG, 'revision': True}
+    cache_key = make_cache_key(full_prompt, prior_term_sheet, MODEL_NAME, cache_config)
+    cached = get_result_cache().get(cache_key)
+    if cached is not None:
+        yield cached
+        return
+    
+    parts = []
+    try:
+        gemini = get_gemini_client(api_key)
+        # The revision rewrites the prior term sheet, so it needs about as many tokens
+        config = generation_config(max_output_tokens=output_budget_for_text(prior_term_sheet, MODEL_NAME))
+        on_usage = check_prompt(full_prompt, MODEL_NAME, 'revision')
+        with timed('generate'):
+            for text in gemini.stream(MODEL_NAME, full_prompt, config, on_usage=on_usage):
+                parts.append(text)
+                yield text
+        
+        get_result_cache().set(cache_key, ''.join(parts))
+        
+    except Exception as e:
+        raise GenerationError(generation_error_message(e, api_key)) from e
+
+def index_lease(term_sheet, lease_filename, lease_text, template_text, record=None, result_id=None):
+    """Add a generated term sheet to the lease index; failures are logged, not raised
+
+    Prose term sheets are parsed back into a record against the template,
+    so their fields can be queried like structured ones.
+    """
+    if not term_sheet.strip() or 'Error generating term sheet' in term_sheet or term_sheet.startswith('Error'):
+        return None
+    try:
+        with timed('index'):
+            if record is None:
+                record = parse_term_sheet(compile_template(template_text), term_sheet)
+            return get_lease_index().add(term_sheet, lease_filename, lease_text, record, result_id)
+    except sqlite3.Error as e:
+        logger.warning('Could not index %s: %s', lease_filename, e)
+        return None
+
+def generate_structured_record(compiled, lease_text, api_key):
+    """Extract a typed record of the template's fields using Gemini's JSON mode
+
+    Returns (record, error message). Records are cached like term sheets,
+    so rendering them again never needs another model call.
+    """
+    cache_config = {**GENERATION_CONFIG, 'structured': STRUCTURED_SCHEMA_VERSION,
+                    'prompt_token_budget': PROMPT_TOKEN_BUDGET}
+    cache_key = make_cache_key(lease_text, compiled.text, model_router.cache_name, cache_config)
+    cached = get_result_cache().get(cache_key)
+    if cached is not None:
+        return decode_record(cached), None
+    
+    try:
+        gemini = get_gemini_client(api_key)
+        with timed('budget'):
+            lease_text = budget_lease_text(lease_text, MODEL_NAME).text
+        with timed('prompt'):
+            full_prompt = build_structured_prompt(compiled, lease_text)
+        
+        # Each tier after the first is only asked for the sections that failed before it
+        record = {}
+        pending = None
+        for model_name in model_router.tiers:
+            started = time.perf_counter()
+            final = model_name == model_router.final_tier
+            # Later tiers answer only the pending sections, so need fewer output tokens
+            field_count = sum(len(keyed) for _, _, keyed in field_keys(compiled, pending))
+            try:
+                with timed('generate'):
+                    response_text = gemini.generate(
+                        model_name,
+                        full_prompt,
+                        generation_config(
+                            response_mime_type='application/json',
+                            response_schema=build_schema(compiled, pending),
+                            max_output_tokens=output_token_budget(field_count),
+                        ),
+                        on_usage=check_prompt(full_prompt, model_name, 'record'),
+                    )
+            except Exception as e:
+                if final:
+                    raise
+                model_router.accept(model_name, [type(e).__name__], time.perf_counter() - started, 'record')
+                continue
+            part, issues = parse_response(compiled, response_text, pending)
+            record.update(part)
+            if final:
+                model_router.finish(model_name, time.perf_counter() - started, 'record')
+                break
+            pending = failing_sections(compiled, part, issues, pending)
+            failures = [f"sections={','.join(pending)}"] if pending else []
+            if model_router.accept(model_name, failures, time.perf_counter() - started, 'record'):
+                break
+    except Exception as e:
+        return None, generation_error_message(e, api_key)
+    
+    if issues:
+        logger.warning('Structured extraction kept uncoerced values for: %s', ', '.join(issues))
+    get_result_cache().set(cache_key, encode_record(record))
+    return record, None
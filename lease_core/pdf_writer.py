@@ -0,0 +1,120 @@
+import io
+
+# Letter size, in points
+PAGE_WIDTH = 612
+PAGE_HEIGHT = 792
+MARGIN = 50
+# Regular and bold Helvetica, referenced as /F1 and /F2 in content streams
+FONTS = {'F1': 'Helvetica', 'F2': 'Helvetica-Bold'}
+# Average Helvetica glyph width as a share of the font size, for wrapping
+_CHAR_WIDTH = {'F1': 0.5, 'F2': 0.55}
+
+def pdf_escape(text):
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+def wrap(text, width=95):
+    """Split text into lines of at most width characters at word boundaries"""
+    lines = []
+    line = ''
+    for word in text.split():
+        if line and len(line) + len(word) + 1 > width:
+            lines.append(line)
+            line = word
+        else:
+            line = f"{line} {word}" if line else word
+    if line:
+        lines.append(line)
+    return lines
+
+def write_pdf(page_streams, media_box=(PAGE_WIDTH, PAGE_HEIGHT)):
+    """Return the bytes of a PDF with one page per content stream
+
+    Streams may use the fonts in FONTS. Text is encoded as WinAnsi
+    (cp1252); characters outside it are replaced with '?'.
+    """
+    objects = ['<< /Type /Catalog /Pages 2 0 R >>', None]
+    font_refs = []
+    for name, base_font in FONTS.items():
+        objects.append(f'<< /Type /Font /Subtype /Type1 /BaseFont /{base_font} /Encoding /WinAnsiEncoding >>')
+        font_refs.append(f"/{name} {len(objects)} 0 R")
+    resources = f"<< /Font << {' '.join(font_refs)} >> >>"
+    kids = []
+    for stream in page_streams:
+        data = stream.encode('cp1252', errors='replace')
+        objects.append(b'<< /Length %d >>\nstream\n%s\nendstream' % (len(data), data))
+        content_ref = len(objects)
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {media_box[0]} {media_box[1]}] "
+                       f"/Contents {content_ref} 0 R /Resources {resources} >>")
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+
+    out = io.BytesIO()
+    out.write(b'%PDF-1.4\n')
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        if isinstance(body, str):
+            body = body.encode('latin-1')
+        out.write(b'%d 0 obj\n%s\nendobj\n' % (number, body))
+    xref = out.tell()
+    out.write(f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode('latin-1'))
+    for offset in offsets:
+        out.write(f"{offset:010d} 00000 n \n".encode('latin-1'))
+    out.write(f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode('latin-1'))
+    return out.getvalue()
+
+class PdfLayout:
+    """Flows wrapped text lines and table rows down letter pages
+
+    A new page starts whenever the next line would cross the bottom margin.
+    """
+    def __init__(self, margin=MARGIN):
+        self.margin = margin
+        self.width = PAGE_WIDTH - 2 * margin
+        self.pages = []
+        self._ops = None
+        self._y = 0
+
+    def _need(self, height):
+        if self._ops is None or self._y - height < self.margin:
+            self._ops = []
+            self.pages.append(self._ops)
+            self._y = PAGE_HEIGHT - self.margin
+
+    def space(self, points):
+        if self._ops is not None:
+            self._y -= points
+
+    def _draw(self, text, x, font, size):
+        self._ops.append(f"BT /{font} {size} Tf {x:.1f} {self._y:.1f} Td ({pdf_escape(text)}) Tj ET")
+
+    def text(self, text, font='F1', size=10, indent=0, leading=None):
+        """Wrap text to the page width and add its lines"""
+        leading = leading or size * 1.3
+        width = int((self.width - indent) / (size * _CHAR_WIDTH[font]))
+        for line in wrap(text, width) or ['']:
+            self._need(leading)
+            self._y -= leading
+            self._draw(line, self.margin + indent, font, size)
+
+    def row(self, cells, widths, font='F1', size=9, rule=False):
+        """Add a table row; cells wrap within their column widths (fractions of the page width)"""
+        leading = size * 1.3
+        columns = [wrap(cell, max(1, int(self.width * share / (size * _CHAR_WIDTH[font])) - 1)) or ['']
+                   for cell, share in zip(cells, widths)]
+        height = leading * max(len(lines) for lines in columns) + 4
+        self._need(height)
+        top = self._y
+        x = self.margin
+        for lines, share in zip(columns, widths):
+            self._y = top
+            for line in lines:
+                self._y -= leading
+                self._draw(line, x + 2, font, size)
+            x += self.width * share
+        self._y = top - height
+        if rule:
+            self._ops.append(f"0.5 w {self.margin} {self._y + 2:.1f} m {self.margin + self.width} {self._y + 2:.1f} l S")
+
+    def to_bytes(self):
+        return write_pdf(['\n'.join(ops) for ops in self.pages] or [''])
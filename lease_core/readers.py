@@ -0,0 +1,131 @@
+import os
+from html.parser import HTMLParser
+
+from text_cache import get_text_cache, hash_file
+from upload_spool import iter_text_chunks, read_text
+from lease_corpus import PAGE_BREAK
+
+class HTMLTextExtractor(HTMLParser):
+    """Extract text content from HTML, which may be fed in chunks"""
+    def __init__(self):
+        super().__init__()
+        self.text = []
+        self.skip_tags = set()
+        # Text between two tags arrives in pieces when it spans fed chunks
+        self.pending = []
+
+    def handle_starttag(self, tag, attrs):
+        self.flush_text()
+        # Skip content inside style and script tags
+        if tag in ('style', 'script'):
+            self.skip_tags.add(tag)
+
+    def handle_endtag(self, tag):
+        self.flush_text()
+        # Re-enable content extraction when closing style/script tags
+        self.skip_tags.discard(tag)
+
+    def handle_comment(self, data):
+        self.flush_text()
+
+    def handle_data(self, data):
+        # Only add data if we're not inside a skip tag
+        if not self.skip_tags:
+            self.pending.append(data)
+
+    def flush_text(self):
+        text = ''.join(self.pending).strip()
+        self.pending = []
+        if text:
+            self.text.append(text)
+
+    def get_text(self):
+        self.flush_text()
+        return '\n'.join(self.text)
+
+def read_html(file):
+    """Extract text from HTML file
+
+    Args:
+        file: A file-like object (from user upload or opened file)
+    """
+    parser = HTMLTextExtractor()
+    for chunk in iter_text_chunks(file, errors='ignore'):
+        parser.feed(chunk)
+    parser.close()
+    return parser.get_text()
+
+# The PDF and DOCX readers import their modules on first use, so PyPDF2 is
+# not loaded by processes that never read a document
+def _pdf_pages(file):
+    from pdf_extract import iter_pdf_pages
+    return iter_pdf_pages(file)
+
+def read_pdf(file):
+    """Extract text from PDF file, page-parallel for large documents"""
+    from pdf_extract import join_pages
+    return join_pages(_pdf_pages(file))
+
+def read_docx(file):
+    """Extract text from DOCX file, including tables, headers and footers"""
+    from docx_extract import iter_docx_blocks, join_blocks
+    return join_blocks(iter_docx_blocks(file))
+
+class Reader:
+    """Text extraction for one document format
+
+    read(file) returns the document's text. pages(file), for formats with
+    pages, yields (page_number, text) pairs.
+    """
+    def __init__(self, name, read, pages=None):
+        self.name = name
+        self.read = read
+        self.pages = pages
+
+_READERS = {}
+TEXT_READER = Reader('text', read_text)
+
+def register_reader(extensions, reader):
+    """Use reader for files with the given extensions (".pdf"), replacing any earlier one"""
+    for extension in extensions:
+        _READERS[extension.lower()] = reader
+
+def get_reader(filename):
+    """Return the Reader for a filename; unknown extensions are read as plain text"""
+    return _READERS.get(os.path.splitext(filename)[1].lower(), TEXT_READER)
+
+def format_name(filename):
+    """Name of the reader registered for a filename's extension, or 'other' (for metrics labels)"""
+    reader = _READERS.get(os.path.splitext(filename)[1].lower())
+    return reader.name if reader is not None else 'other'
+
+register_reader(['.pdf'], Reader('pdf', read_pdf, pages=_pdf_pages))
+register_reader(['.docx'], Reader('docx', read_docx))
+register_reader(['.htm', '.html'], Reader('html', read_html))
+register_reader(['.txt'], TEXT_READER)
+
+def extract_document(file, filename):
+    """Extract text with the reader registered for the file's extension"""
+    return get_reader(filename).read(file)
+
+def read_document(file, filename, text_key=None):
+    """Read document text, reusing the text extracted from an identical earlier upload
+
+    Args:
+        text_key: The upload's text_cache.content_key(), if it was hashed
+            while being received; otherwise the file is hashed here
+    """
+    if text_key is None:
+        text_key = hash_file(file, filename)
+    return get_text_cache().get_or_extract(text_key, lambda: extract_document(file, filename))
+
+def read_document_pages(file, filename, text_key=None):
+    """Read document text as (page_number, text) pairs; only paged formats have page numbers"""
+    reader = get_reader(filename)
+    if reader.pages is None:
+        return [(None, read_document(file, filename, text_key))]
+    if text_key is None:
+        text_key = hash_file(file, filename)
+    text = get_text_cache().get_or_extract(f"{text_key}-pages", lambda: PAGE_BREAK.join(
+        page_text.replace(PAGE_BREAK, '\n') for _, page_text in reader.pages(file)))
+    return list(enumerate(text.split(PAGE_BREAK), 1))
@@ -0,0 +1,249 @@
+import io
+import re
+from xml.sax.saxutils import escape as xml_escape
+
+from metrics import timed
+from lease_core.pdf_writer import PdfLayout
+
+# Bump when rendered output changes so cached DOCX/PDF files are rendered again
+RENDER_VERSION = 1
+# (mimetype, file extension) of each download format
+EXPORT_FORMATS = {
+    'docx': ('application/vnd.openxmlformats-officedocument.wordprocessingml.document', '.docx'),
+    'pdf': ('application/pdf', '.pdf'),
+}
+
+TITLE = 'title'
+HEADING = 'heading'
+FIELDS = 'fields'
+TABLE = 'table'
+BULLETS = 'bullets'
+PARAGRAPH = 'paragraph'
+
+_MARKUP = re.compile(r'\*\*|__|`')
+_HEADING_MARK = re.compile(r'^#{1,6}\s+')
+_NUMBERED_HEADING = re.compile(r'^(?:\d+|[IVX]+)[.)]\s+(?P<name>[^a-z:]+):?$')
+_BULLET = re.compile(r'^(?:[-*•]|\d+[.)])\s+')
+_FIELD = re.compile(r'^(?P<label>[^:]{1,60}):\s+(?P<value>\S.*)$')
+_TABLE_RULE = re.compile(r'^\|?[\s:|-]+\|?$')
+
+class Block:
+    """One piece of a parsed term sheet
+
+    kind is TITLE, HEADING or PARAGRAPH (text set), FIELDS ((label, value)
+    rows), TABLE (rows of cells, the first is the header) or BULLETS
+    (rows of one item each).
+    """
+    def __init__(self, kind, text=None, rows=None):
+        self.kind = kind
+        self.text = text
+        self.rows = rows if rows is not None else []
+
+def _is_heading(line, raw, section_names):
+    if _HEADING_MARK.match(raw) or _NUMBERED_HEADING.match(line) or line.rstrip(':').lower() in section_names:
+        return True
+    # "BASE RENT" or "**Base Rent**" on a line of its own
+    letters = [c for c in line if c.isalpha()]
+    bold = raw.startswith('**') and raw.endswith('**')
+    return bool(letters) and len(line) <= 80 and (line.upper() == line or bold)
+
+def _clean(raw):
+    return _HEADING_MARK.sub('', _MARKUP.sub('', raw)).strip()
+
+def parse_layout(text, section_names=None):
+    """Parse term sheet text into Blocks: headings, field tables, tables, bullets and paragraphs
+
+    "Label: value" lines (or "Label:" with the value on the next line)
+    become two-column field rows and markdown pipe tables become tables.
+    Template section names (the default template's unless section_names
+    is given) and short upper-case, bold, numbered or "#" lines become
+    headings; the first becomes the title when nothing precedes it.
+    """
+    if section_names is None:
+        from lease_core.template import DEFAULT_COMPILED_TEMPLATE
+        section_names = DEFAULT_COMPILED_TEMPLATE.section_names
+    section_names = {name.lower() for name in section_names}
+    blocks = []
+
+    def add(kind, row):
+        if blocks and blocks[-1].kind == kind:
+            blocks[-1].rows.append(row)
+        else:
+            blocks.append(Block(kind, rows=[row]))
+
+    lines = [line.strip() for line in text.splitlines()]
+    index = 0
+    while index < len(lines):
+        stripped = lines[index]
+        index += 1
+        if not stripped:
+            # A blank line ends the current paragraph, table or list
+            blocks.append(Block(PARAGRAPH, ''))
+            continue
+        if stripped.startswith('|') and stripped.count('|') >= 2:
+            if not _TABLE_RULE.match(stripped):
+                add(TABLE, [_MARKUP.sub('', cell).strip() for cell in stripped.strip('|').split('|')])
+            continue
+        line = _clean(stripped)
+        item = _BULLET.sub('', line) if _BULLET.match(line) and not _NUMBERED_HEADING.match(line) else None
+        field = _FIELD.match(item if item is not None else line)
+        if field:
+            add(FIELDS, (field.group('label').strip(), field.group('value').strip()))
+        elif item is None and _is_heading(line, stripped, section_names):
+            kind = TITLE if not any(block.text or block.rows for block in blocks) else HEADING
+            blocks.append(Block(kind, line.rstrip(':').strip()))
+        elif line.endswith(':') and len(line) <= 61 and index < len(lines) and lines[index] \
+                and not _FIELD.match(_clean(lines[index])) \
+                and not _is_heading(_clean(lines[index]), lines[index], section_names):
+            # "Commencement Date:" with its value on the next line
+            add(FIELDS, ((item or line)[:-1].strip(), _clean(lines[index])))
+            index += 1
+        elif item is not None:
+            add(BULLETS, [item])
+        elif blocks and blocks[-1].kind == PARAGRAPH and blocks[-1].text:
+            # Consecutive lines stay one paragraph, with their line breaks
+            blocks[-1].text += '\n' + line
+        else:
+            blocks.append(Block(PARAGRAPH, line))
+    return [block for block in blocks if block.kind != PARAGRAPH or block.text]
+
+def rent_blocks(rent_terms):
+    """Blocks of the rent schedule table and its summary figures"""
+    # NumPy is loaded with rent_analytics, on the first rent schedule rendered
+    from rent_analytics import rent_table
+    header, rows, summary = rent_table(rent_terms)
+    return [Block(HEADING, 'Rent Schedule'), Block(TABLE, rows=[header] + rows), Block(FIELDS, rows=summary),
+            Block(PARAGRAPH, 'Computed from the extracted terms; verify against the lease before relying on it.')]
+
+# Characters XML 1.0 does not allow, which python-docx would reject
+_XML_INVALID = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+# Table width in twentieths of a point (6 inches)
+_TABLE_WIDTH = 8640
+
+def _run_xml(text, bold=False):
+    text = _XML_INVALID.sub('', text)
+    props = '<w:rPr><w:b/></w:rPr>' if bold else ''
+    lines = [f'<w:t xml:space="preserve">{xml_escape(line)}</w:t>' for line in text.split('\n')]
+    return f"<w:r>{props}{'<w:br/>'.join(lines)}</w:r>"
+
+def _paragraph_xml(text, style_id=None, bold=False):
+    props = f'<w:pPr><w:pStyle w:val="{style_id}"/></w:pPr>' if style_id else ''
+    return f"<w:p>{props}{_run_xml(text, bold) if text else ''}</w:p>"
+
+def _table_xml(rows, widths, style_id, bold_header, bold_first_column):
+    columns = [int(_TABLE_WIDTH * share) for share in widths]
+    parts = [f'<w:tbl><w:tblPr><w:tblStyle w:val="{style_id}"/><w:tblW w:w="0" w:type="auto"/></w:tblPr>',
+             '<w:tblGrid>', ''.join(f'<w:gridCol w:w="{width}"/>' for width in columns), '</w:tblGrid>']
+    for number, cells in enumerate(rows):
+        parts.append('<w:tr>')
+        for column, width in enumerate(columns):
+            value = cells[column] if column < len(cells) else ''
+            bold = (bold_header and number == 0) or (bold_first_column and column == 0)
+            parts.append(f'<w:tc><w:tcPr><w:tcW w:w="{width}" w:type="dxa"/></w:tcPr>'
+                         f'{_paragraph_xml(value, bold=bold)}</w:tc>')
+        parts.append('</w:tr>')
+    parts.append('</w:tbl>')
+    return ''.join(parts)
+
+def render_docx(blocks):
+    """Render Blocks as DOCX bytes with heading styles and bordered tables
+
+    The body is written as WordprocessingML and parsed once, which is
+    several times faster than adding paragraphs through python-docx.
+    """
+    # python-docx (and lxml) are only loaded once a DOCX is rendered
+    from docx import Document
+    from docx.oxml import parse_xml
+    from docx.oxml.ns import nsdecls
+    doc = Document()
+    style_ids = {name: doc.styles[name].style_id for name in ('Title', 'Heading 1', 'List Bullet', 'Table Grid')}
+
+    parts = []
+    for block in blocks:
+        if block.kind == TITLE:
+            parts.append(_paragraph_xml(block.text, style_ids['Title']))
+        elif block.kind == HEADING:
+            parts.append(_paragraph_xml(block.text, style_ids['Heading 1']))
+        elif block.kind == PARAGRAPH:
+            parts.append(_paragraph_xml(block.text))
+        elif block.kind == BULLETS:
+            parts.extend(_paragraph_xml(item, style_ids['List Bullet']) for (item,) in block.rows)
+        elif block.kind == FIELDS:
+            parts.append(_table_xml(block.rows, (0.35, 0.65), style_ids['Table Grid'], False, True))
+            # Word merges adjacent tables unless a paragraph separates them
+            parts.append(_paragraph_xml(''))
+        else:
+            columns = max(len(row) for row in block.rows)
+            parts.append(_table_xml(block.rows, [1 / columns] * columns, style_ids['Table Grid'], True, False))
+            parts.append(_paragraph_xml(''))
+
+    body = doc.element.body
+    section = body.sectPr
+    for element in parse_xml(f"<w:body {nsdecls('w')}>{''.join(parts)}</w:body>"):
+        if section is not None:
+            section.addprevious(element)
+        else:
+            body.append(element)
+    docx_file = io.BytesIO()
+    doc.save(docx_file)
+    return docx_file.getvalue()
+
+def render_pdf(blocks):
+    """Render Blocks as PDF bytes"""
+    layout = PdfLayout()
+    for block in blocks:
+        if block.kind == TITLE:
+            layout.text(block.text, font='F2', size=16)
+            layout.space(6)
+        elif block.kind == HEADING:
+            layout.space(8)
+            layout.text(block.text, font='F2', size=12)
+            layout.space(2)
+        elif block.kind == PARAGRAPH:
+            for line in block.text.split('\n'):
+                layout.text(line)
+            layout.space(4)
+        elif block.kind == BULLETS:
+            for (item,) in block.rows:
+                layout.text(f"• {item}", indent=10)
+        elif block.kind == FIELDS:
+            for label, value in block.rows:
+                layout.row([label, value], (0.35, 0.65), size=10)
+        else:
+            columns = max(len(row) for row in block.rows)
+            widths = [1 / columns] * columns
+            layout.row(block.rows[0], widths, font='F2', rule=True)
+            for cells in block.rows[1:]:
+                layout.row(cells, widths)
+            layout.space(6)
+    return layout.to_bytes()
+
+_RENDERERS = {'docx': render_docx, 'pdf': render_pdf}
+
+def render_exports(text, export_formats, rent_terms=None):
+    """Render a term sheet in each of export_formats from one parse; returns {format: bytes}"""
+    blocks = parse_layout(text)
+    if rent_terms is not None:
+        blocks.extend(rent_blocks(rent_terms))
+    return {export_format: _RENDERERS[export_format](blocks) for export_format in export_formats}
+
+def render_export(text, export_format='docx', rent_terms=None):
+    """Render a term sheet as DOCX or PDF bytes"""
+    return render_exports(text, [export_format], rent_terms)[export_format]
+
+def create_docx_from_text(text, rent_terms=None):
+    """Create a DOCX document from text, with a rent schedule table when rent_terms are given"""
+    return io.BytesIO(render_export(text, 'docx', rent_terms))
+
+def create_pdf_from_text(text, rent_terms=None):
+    """Create a PDF document from text, with a rent schedule table when rent_terms are given"""
+    return io.BytesIO(render_export(text, 'pdf', rent_terms))
+
+def rent_terms_for(record, term_sheet):
+    """Rent schedule inputs from a term sheet's record, or None when its rent or term is missing"""
+    if not record:
+        return None
+    # NumPy is loaded with rent_analytics, on the first download that needs it
+    from rent_analytics import terms_from_record
+    with timed('analytics'):
+        return terms_from_record(record, term_sheet)
@@ -0,0 +1,92 @@
+import os
+
+from template_model import compile_template
+from lease_core.readers import read_html
+
+# The template file sits at the repository root, next to the apps
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Load default template from file
+def load_default_template():
+    """Load the default template from Term Sheet Template_app.html"""
+    template_path = os.path.join(ROOT_DIR, "Term Sheet Template_app.html")
+    try:
+        if os.path.exists(template_path):
+            with open(template_path, 'r', encoding='utf-8', errors='ignore') as f:
+                return read_html(f)
+        else:
+            # Fallback to a basic template if file not found
+            return """COMMERCIAL LEASE TERM SHEET
+
+Property Address: [Address]
+Tenant Name: [Tenant Name]
+Landlord Name: [Landlord Name]
+
+LEASE TERMS:
+
+1. PREMISES
+   - Suite/Unit Number: [Suite]
+   - Rentable Square Feet: [SF]
+   - Use: [Permitted Use]
+
+2. LEASE TERM
+   - Commencement Date: [Date]
+   - Expiration Date: [Date]
+   - Term Length: [Years/Months]
+   - Option to Extend: [Yes/No, Terms]
+
+3. BASE RENT
+   - Initial Annual Base Rent: [Amount]
+   - Monthly Base Rent: [Amount]
+   - Rent Escalations: [Schedule]
+
+4. ADDITIONAL RENT
+   - Operating Expenses: [Details]
+   - Property Taxes: [Details]
+   - Utilities: [Responsibility]
+   - CAM Charges: [Details]
+
+5. SECURITY DEPOSIT
+   - Amount: [Amount]
+   - Terms: [Details]
+
+6. TENANT IMPROVEMENTS
+   - Tenant Improvement Allowance: [Amount]
+   - Construction Period: [Timeline]
+
+7. PARKING
+   - Number of Spaces: [Number]
+   - Type: [Reserved/Unreserved]
+   - Cost: [Amount if any]
+
+8. SPECIAL PROVISIONS
+   - [Any special terms or conditions]
+
+9. BROKER INFORMATION
+   - Landlord's Broker: [Name]
+   - Tenant's Broker: [Name]
+"""
+    except Exception as e:
+        # Return fallback template if there's an error
+        return """COMMERCIAL LEASE TERM SHEET
+
+Property Address: [Address]
+Tenant Name: [Tenant Name]
+Landlord Name: [Landlord Name]
+
+LEASE TERMS:
+
+1. PREMISES
+2. LEASE TERM
+3. BASE RENT
+4. ADDITIONAL RENT
+5. SECURITY DEPOSIT
+6. TENANT IMPROVEMENTS
+7. PARKING
+8. SPECIAL PROVISIONS
+9. BROKER INFORMATION
+"""
+
+DEFAULT_TEMPLATE = load_default_template()
+# Compiled once at startup; custom uploads are compiled and cached by content hash
+DEFAULT_COMPILED_TEMPLATE = compile_template(DEFAULT_TEMPLATE)
@@ -0,0 +1,215 @@
+import hashlib
+import logging
+import math
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Documents of one upload extracted at once
+CORPUS_WORKERS = int(os.environ.get('CORPUS_WORKERS', '4'))
+# Lines shorter than this are never dropped as duplicates (headings, "None.", ...)
+DEDUPE_MIN_CHARS = 40
+# Target characters per tagged unit of the merged text
+UNIT_CHARS = 1000
+# Separates pages in cached page-by-page text
+PAGE_BREAK = '\f'
+
+LEASE = 'lease'
+EXHIBIT = 'exhibit'
+AMENDMENT = 'amendment'
+# Order of document kinds in the corpus; amendments last, since they control
+_KIND_ORDER = {LEASE: 0, EXHIBIT: 1, AMENDMENT: 2}
+
+_ORDINALS = {'first': 1, 'second': 2, 'third': 3, 'fourth': 4, 'fifth': 5,
+             'sixth': 6, 'seventh': 7, 'eighth': 8, 'ninth': 9, 'tenth': 10}
+_AMENDMENT = re.compile(r'\b(?:amendment|addendum)\b', re.I)
+_AMENDMENT_NUMBER = re.compile(
+    r'\b(?:(first|second|third|fourth|fifth|sixth|seventh|eighth|ninth|tenth|\d+)(?:st|nd|rd|th)?'
+    r'\s+(?:amendment|addendum)\b|(?:amendment|addendum)\s*(?:no\.?|number|#)?\s*(\d+)\b)', re.I)
+_EXHIBIT = re.compile(r'\b(?:exhibit|schedule|rider)\b', re.I)
+# Title lines of an amendment ("SECOND AMENDMENT TO LEASE", "Amendment No. 3")
+# or an exhibit ("EXHIBIT B - RENT SCHEDULE", "Rider 1"); "Schedule of Rent" is not one
+_AMENDMENT_TITLE = re.compile(
+    r'^(?:(?:first|second|third|fourth|fifth|sixth|seventh|eighth|ninth|tenth|\d+(?:st|nd|rd|th))\s+)?'
+    r'(?:amendment|addendum)(?:\s+(?:to|no\.?|number)\b|\s*#?\s*\d+\b|\s*$)', re.I)
+_EXHIBIT_TITLE = re.compile(r'^(?i:exhibit|schedule|rider)\s+(?:[A-Z]{1,2}|\d+|[IVXL]+)(?:[-.]\d+)?(?![A-Za-z])')
+# Opening lines searched for a title, and the longest line taken as one
+TITLE_LINES = 6
+TITLE_MAX_CHARS = 80
+_SPACE = re.compile(r'\s+')
+
+def _amendment_number(head):
+    match = _AMENDMENT_NUMBER.search(head)
+    if not match:
+        return None
+    word = (match.group(1) or match.group(2)).lower()
+    return _ORDINALS.get(word) or int(word)
+
+def classify_document(filename, text):
+    """Return (kind, amendment number or None) from a document's name or its title
+
+    The filename decides when it names an amendment or exhibit. Otherwise
+    only a title among the first TITLE_LINES lines counts, since body text
+    mentions other documents ("shown on Exhibit A", "any amendment
+    hereto"); everything else is the lease.
+    """
+    name = re.sub(r'[_\-.]+', ' ', os.path.splitext(filename)[0])
+    if _AMENDMENT.search(name):
+        return AMENDMENT, _amendment_number(name)
+    if _EXHIBIT.search(name):
+        return EXHIBIT, None
+    lines = [line.strip() for line in text.splitlines() if line.strip()][:TITLE_LINES]
+    for line in lines:
+        if len(line) > TITLE_MAX_CHARS:
+            continue
+        if _AMENDMENT_TITLE.match(line):
+            return AMENDMENT, _amendment_number(line)
+        if _EXHIBIT_TITLE.match(line):
+            return EXHIBIT, None
+    return LEASE, None
+
+class CorpusDocument:
+    """One extracted document of a multi-document upload
+
+    pages holds (page_number, text) pairs; page_number is None for formats
+    without pages.
+    """
+    def __init__(self, filename, pages, seconds, index, size_bytes=None):
+        self.filename = filename
+        self.pages = pages
+        self.seconds = seconds
+        self.index = index
+        self.size_bytes = size_bytes
+        self.kind, self.number = classify_document(filename, pages[0][1] if pages else '')
+
+    @property
+    def chars(self):
+        return sum(len(text) for _, text in self.pages)
+
+    @property
+    def label(self):
+        if self.kind == AMENDMENT and self.number is not None:
+            return f"amendment {self.number}"
+        return self.kind
+
+    def digest(self):
+        content = PAGE_BREAK.join(text for _, text in self.pages)
+        return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+    def to_dict(self):
+        return {'filename': self.filename, 'kind': self.kind, 'number': self.number,
+                'pages': sum(1 for page, _ in self.pages if page is not None) or None,
+                'chars': self.chars, 'seconds': round(self.seconds, 4)}
+
+class LeaseCorpus:
+    """Merged text of a lease and its amendments, tagged with provenance
+
+    Every unit of text starts with a tag such as [D2 p3] (document 2 in
+    corpus order, page 3); legend lists the documents and tells the model
+    that later amendments control.
+    """
+    def __init__(self, documents, text, duplicates, lines_total, lines_dropped):
+        self.documents = documents
+        self.text = text
+        self.duplicates = duplicates
+        self.lines_total = lines_total
+        self.lines_dropped = lines_dropped
+
+    @property
+    def legend(self):
+        lines = ['LEASE DOCUMENTS (in order; where documents conflict, a later amendment '
+                 'controls over the lease, its exhibits and earlier amendments):']
+        for number, document in enumerate(self.documents, 1):
+            pages = sum(1 for page, _ in document.pages if page is not None)
+            extent = f", {pages} pages" if pages else ''
+            lines.append(f"[D{number}] {document.filename} - {document.label}{extent}")
+        lines.append('Passages are tagged with their source as [D<document> p<page>].')
+        return '\n'.join(lines) + '\n\n'
+
+    def summary(self):
+        duplicates = f", {len(self.duplicates)} duplicate documents skipped" if self.duplicates else ''
+        return (f"{len(self.documents)} documents ({', '.join(d.label for d in self.documents)}), "
+                f"{self.lines_dropped}/{self.lines_total} repeated lines dropped{duplicates}")
+
+def extract_documents(sources, extract, max_workers=CORPUS_WORKERS):
+    """Extract several documents concurrently, returning CorpusDocuments in upload order
+
+    Args:
+        sources: One item per uploaded document, passed to extract
+        extract: Callable source -> (filename, pages, size_bytes)
+        max_workers: Documents extracted at once
+    """
+    def run(index):
+        started = time.perf_counter()
+        filename, pages, size_bytes = extract(sources[index])
+        document = CorpusDocument(filename, pages, time.perf_counter() - started, index, size_bytes)
+        logger.info('document %d/%d %s: %s, %d chars in %.2fs', index + 1, len(sources),
+                    filename, document.label, document.chars, document.seconds)
+        return document
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(sources)))) as executor:
+        return list(executor.map(run, range(len(sources))))
+
+def _units(lines, chars=UNIT_CHARS):
+    # Blank lines end a unit; long paragraphs are split at line boundaries
+    unit = []
+    size = 0
+    for line in lines:
+        if not line.strip():
+            if unit:
+                yield unit
+            unit, size = [], 0
+            continue
+        if unit and size + len(line) > chars:
+            yield unit
+            unit, size = [], 0
+        unit.append(line)
+        size += len(line)
+    if unit:
+        yield unit
+
+def build_corpus(documents):
+    """Merge extracted documents into one ordered, deduplicated, tagged text
+
+    Documents are ordered lease first, then exhibits, then amendments by
+    number (falling back to upload order). Identical documents are kept
+    once, and lines already seen in an earlier document are dropped.
+    """
+    ordered = sorted(documents, key=lambda d: (
+        _KIND_ORDER[d.kind], d.number if d.number is not None else math.inf, d.index))
+    kept = []
+    duplicates = []
+    digests = set()
+    for document in ordered:
+        digest = document.digest()
+        if digest in digests:
+            duplicates.append(document)
+            continue
+        digests.add(digest)
+        kept.append(document)
+
+    seen = set()
+    parts = []
+    lines_total = lines_dropped = 0
+    for number, document in enumerate(kept, 1):
+        document_seen = set()
+        for page, text in document.pages:
+            lines = []
+            for line in text.splitlines():
+                key = _SPACE.sub(' ', line).strip().lower()
+                if len(key) >= DEDUPE_MIN_CHARS:
+                    lines_total += 1
+                    if key in seen:
+                        lines_dropped += 1
+                        continue
+                    document_seen.add(key)
+                lines.append(line)
+            tag = f"[D{number} p{page}]" if page is not None else f"[D{number}]"
+            for unit in _units(lines):
+                parts.append(f"{tag} " + '\n'.join(unit))
+        # Repeats within one document (running headers, boilerplate) are kept
+        seen |= document_seen
+    return LeaseCorpus(kept, '\n\n'.join(parts) + '\n', duplicates, lines_total, lines_dropped)
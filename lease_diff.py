@@ -0,0 +1,123 @@
+import difflib
+import os
+import re
+
+from chunked_analysis import split_sections
+
+# Revisions that change more than this share of the lease are regenerated in full
+REVISION_MAX_CHANGED_RATIO = float(os.environ.get('REVISION_MAX_CHANGED_RATIO', '0.5'))
+
+class SectionChange:
+    """One changed run of lease sections between two versions
+
+    old_text is empty for added sections and new_text is empty for removed ones.
+    """
+    def __init__(self, heading, old_text, new_text):
+        self.heading = heading
+        self.old_text = old_text
+        self.new_text = new_text
+
+    @property
+    def kind(self):
+        if not self.old_text:
+            return 'added'
+        if not self.new_text:
+            return 'removed'
+        return 'amended'
+
+class LeaseDiff:
+    """Section-level differences between a prior and a revised lease"""
+    def __init__(self, changes, sections_total, changed_chars, total_chars):
+        self.changes = changes
+        self.sections_total = sections_total
+        self.changed_chars = changed_chars
+        self.total_chars = total_chars
+
+    @property
+    def changed_ratio(self):
+        return self.changed_chars / self.total_chars if self.total_chars else 1.0
+
+    def summary(self):
+        return (f"{len(self.changes)} changed section run(s) of {self.sections_total}, "
+                f"{self.changed_chars:,} of {self.total_chars:,} characters changed")
+
+# Page markers ("[p12]" lines) and corpus tags ("[D2 p3] ") move whenever a page
+# break does, so they are left out of the comparison
+_PAGE_MARKS = re.compile(r'^\[p\d+\][ \t]*(?:\n|$)|^\[D\d+(?: p\d+)?\] ', re.M)
+
+def strip_page_marks(text):
+    """Remove page marker lines and corpus tags from lease text"""
+    return _PAGE_MARKS.sub('', text)
+
+def _normalize(section):
+    # Reflowed lines and spacing differences are not amendments
+    return ' '.join(section.split())
+
+def _heading(sections):
+    for section in sections:
+        first_line = section.strip().splitlines()[0].strip()
+        if first_line:
+            return first_line[:80]
+    return ''
+
+def diff_lease(old_text, new_text):
+    """Compare two lease versions section by section
+
+    Sections are split at article/section headings (as in chunked analysis)
+    and matched with difflib, so inserted or removed sections do not shift
+    every section after them. Page markers and corpus tags are ignored, so
+    text that only moved to another page is not a change.
+    """
+    old_text = strip_page_marks(old_text)
+    new_text = strip_page_marks(new_text)
+    old_sections = split_sections(old_text)
+    new_sections = split_sections(new_text)
+    matcher = difflib.SequenceMatcher(
+        None, [_normalize(s) for s in old_sections], [_normalize(s) for s in new_sections],
+        autojunk=False)
+
+    changes = []
+    changed_chars = 0
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            continue
+        old_run = old_sections[i1:i2]
+        new_run = new_sections[j1:j2]
+        changes.append(SectionChange(_heading(new_run) or _heading(old_run),
+                                     '\n'.join(old_run), '\n'.join(new_run)))
+        changed_chars += max(sum(map(len, old_run)), sum(map(len, new_run)))
+
+    total_chars = max(len(old_text), len(new_text))
+    return LeaseDiff(changes, len(new_sections), min(changed_chars, total_chars), total_chars)
+
+def build_revision_prompt(prior_term_sheet, diff):
+    """Build the prompt that patches a prior term sheet with the changed sections"""
+    blocks = []
+    for number, change in enumerate(diff.changes, start=1):
+        block = [f"CHANGE {number} ({change.kind}): {change.heading}"]
+        if change.old_text:
+            block.append(f"Previous text:\n{change.old_text}")
+        if change.new_text:
+            block.append(f"Revised text:\n{change.new_text}")
+        blocks.append('\n'.join(block))
+    changes = re.sub(r'\n{3,}', '\n\n', '\n\n'.join(blocks))
+
+    return f"""You are an expert commercial real estate attorney specializing in lease analysis and term sheet creation.
+
+A lease was amended. You have been provided with:
+1. The term sheet completed for the previous version of the lease
+2. Only the lease sections that changed, with their previous and revised text
+
+PREVIOUS TERM SHEET:
+{prior_term_sheet}
+
+CHANGED LEASE SECTIONS:
+{changes}
+
+Please generate the updated lease term sheet that:
+1. Keeps the exact structure, format and wording of the previous term sheet
+2. Updates only the fields affected by the changed sections
+3. Marks a field "Not specified in lease" if its only source was removed
+4. Leaves every other field exactly as it was
+
+Generate the updated lease term sheet now:"""
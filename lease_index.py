@@ -0,0 +1,318 @@
+import base64
+import json
+import math
+import os
+import re
+import sqlite3
+import time
+from contextlib import contextmanager
+from datetime import date
+
+DEFAULT_INDEX_PATH = os.path.join('/tmp', 'lease_term_sheet', 'leases.db')
+# Largest page a search returns
+MAX_PAGE_SIZE = 200
+
+# Portfolio fields derived from whichever template fields a record has, so
+# leases generated from different templates can be queried the same way
+_DERIVED_SOURCES = [
+    ('commencement_date', re.compile(r'commencement')),
+    ('expiration_date', re.compile(r'expiration|expiry|end_date')),
+    ('term_years', re.compile(r'^term(_years)?$')),
+    ('size_sf', re.compile(r'^size$|square_feet|rentable|^area$')),
+    ('annual_rent', re.compile(r'^annual(_base)?_rent(_1)?$')),
+    ('monthly_rent', re.compile(r'^monthly(_base)?_rent(_1)?$')),
+    ('security_deposit', re.compile(r'^security_deposit$')),
+    ('ti_allowance', re.compile(r'^ti_allowance$|improvement_allowance')),
+]
+
+_CONDITION = re.compile(r'^\s*([a-z0-9_.]+)\s*(>=|<=|!=|=|>|<)\s*(.+?)\s*$', re.I)
+# "$40", "40/SF", "3%" and "1,250.50" are numbers
+_NUMBER_VALUE = re.compile(r'^\$?\s*(-?[\d,]*\.?\d+)\s*(?:/\s*sf|sf|%)?$', re.I)
+_FTS_QUERY_ERRORS = ('fts5', 'syntax error', 'unterminated string', 'no such column', 'unknown special query')
+_OPERATORS = {'=': '=', '!=': '!=', '>': '>', '>=': '>=', '<': '<', '<=': '<='}
+
+class QueryError(ValueError):
+    """A search request that cannot be run (bad condition, FTS syntax or cursor)"""
+
+def _add_years(iso_date, years):
+    start = date.fromisoformat(iso_date)
+    try:
+        end = start.replace(year=start.year + years)
+    except ValueError:
+        # February 29 in a non-leap year
+        end = start.replace(year=start.year + years, day=28)
+    return end.isoformat()
+
+def index_fields(record):
+    """Flatten a record into {name: value} with "section.field" names plus derived fields
+
+    Derived fields: commencement_date, expiration_date (from commencement
+    and term when not stated), term_years, size_sf, annual_rent,
+    monthly_rent, rent_psf (annual rent per square foot), security_deposit
+    and ti_allowance.
+    """
+    fields = {}
+    for section_key, values in (record or {}).items():
+        for key, value in values.items():
+            fields[f"{section_key}.{key}"] = value
+    template_fields = list(fields.items())
+    for name, pattern in _DERIVED_SOURCES:
+        for qualified, value in template_fields:
+            if pattern.search(qualified.split('.', 1)[1]) and value is not None:
+                fields[name] = value
+                break
+
+    numeric = lambda name: fields.get(name) if isinstance(fields.get(name), (int, float)) else None
+    if numeric('annual_rent') is None and numeric('monthly_rent') is not None:
+        fields['annual_rent'] = numeric('monthly_rent') * 12
+    if numeric('annual_rent') and numeric('size_sf'):
+        fields['rent_psf'] = round(numeric('annual_rent') / numeric('size_sf'), 4)
+    commencement = fields.get('commencement_date')
+    if 'expiration_date' not in fields and isinstance(numeric('term_years'), int) and isinstance(commencement, str):
+        try:
+            fields['expiration_date'] = _add_years(commencement, numeric('term_years'))
+        except ValueError:
+            pass
+    return fields
+
+def parse_condition(condition):
+    """Parse "name>=value" into (name, operator, value); numbers become floats"""
+    match = _CONDITION.match(condition)
+    if match is None:
+        raise QueryError(f"Invalid condition: {condition!r}")
+    name, operator, raw = match.groups()
+    raw = raw.strip('"\'')
+    number = _NUMBER_VALUE.match(raw)
+    # Dates are stored as YYYY-MM-DD text and compared as text
+    if number and not name.endswith('_date'):
+        return name, _OPERATORS[operator], float(number.group(1).replace(',', ''))
+    return name, _OPERATORS[operator], raw
+
+def encode_cursor(lease_id):
+    return base64.urlsafe_b64encode(json.dumps({'before': lease_id}).encode()).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        return int(json.loads(base64.urlsafe_b64decode(padded))['before'])
+    except (ValueError, KeyError, TypeError):
+        raise QueryError('Invalid cursor')
+
+class LeaseIndex:
+    """Persistent, searchable index of generated term sheets
+
+    Each lease keeps its extracted text, term sheet and parsed fields.
+    Text is searched with an FTS5 index; fields are stored one row per
+    value, indexed by (name, value), so range conditions are index scans.
+    Results are returned newest first and paged with opaque cursors
+    (keyset pagination on the lease ID), so deep pages cost no more than
+    the first one. Unlike the result store, entries do not expire.
+    """
+    def __init__(self, path=DEFAULT_INDEX_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute("""CREATE TABLE IF NOT EXISTS leases (
+                id INTEGER PRIMARY KEY,
+                result_id TEXT,
+                lease_filename TEXT,
+                created_at REAL NOT NULL,
+                term_sheet TEXT NOT NULL,
+                lease_text TEXT,
+                record TEXT
+            )""")
+            conn.execute("""CREATE TABLE IF NOT EXISTS lease_fields (
+                lease_id INTEGER NOT NULL REFERENCES leases (id) ON DELETE CASCADE,
+                name TEXT NOT NULL,
+                num NUMERIC,
+                text TEXT
+            )""")
+            conn.execute('CREATE INDEX IF NOT EXISTS lease_fields_num ON lease_fields (name, num, lease_id)')
+            conn.execute('CREATE INDEX IF NOT EXISTS lease_fields_text ON lease_fields (name, text, lease_id)')
+            conn.execute('CREATE INDEX IF NOT EXISTS lease_fields_lease ON lease_fields (lease_id, name, num, text)')
+            conn.execute('CREATE INDEX IF NOT EXISTS leases_result ON leases (result_id)')
+            # External-content FTS table: the text itself is only stored in leases
+            conn.execute("""CREATE VIRTUAL TABLE IF NOT EXISTS leases_fts USING fts5(
+                lease_filename, term_sheet, lease_text,
+                content='leases', content_rowid='id', tokenize='porter unicode61'
+            )""")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.execute('PRAGMA foreign_keys=ON')
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def add(self, term_sheet, lease_filename=None, lease_text=None, record=None, result_id=None):
+        """Index a generated term sheet and return its lease ID
+
+        record is the structured record (decoded), either extracted in
+        structured mode or parsed from the prose term sheet.
+        """
+        fields = index_fields(record)
+        with self._connect() as conn:
+            lease_id = conn.execute(
+                'INSERT INTO leases (result_id, lease_filename, created_at, term_sheet, lease_text, record) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (result_id, lease_filename, time.time(), term_sheet, lease_text,
+                 json.dumps(record, separators=(',', ':')) if record else None)).lastrowid
+            conn.execute('INSERT INTO leases_fts (rowid, lease_filename, term_sheet, lease_text) '
+                         'VALUES (?, ?, ?, ?)', (lease_id, lease_filename, term_sheet, lease_text))
+            conn.executemany(
+                'INSERT INTO lease_fields (lease_id, name, num, text) VALUES (?, ?, ?, ?)',
+                [(lease_id, name, value if isinstance(value, (int, float)) else None,
+                  None if isinstance(value, (int, float)) else str(value))
+                 for name, value in fields.items()])
+        return lease_id
+
+    def get(self, lease_id):
+        """Return an indexed lease with its fields, or None"""
+        with self._connect() as conn:
+            row = conn.execute('SELECT id, result_id, lease_filename, created_at, term_sheet, lease_text, record '
+                               'FROM leases WHERE id = ?', (lease_id,)).fetchone()
+            if row is None:
+                return None
+            fields = conn.execute('SELECT name, num, text FROM lease_fields WHERE lease_id = ? ORDER BY name',
+                                  (lease_id,)).fetchall()
+        return {
+            'id': row[0], 'result_id': row[1], 'lease_filename': row[2], 'created_at': row[3],
+            'term_sheet': row[4], 'lease_text': row[5], 'record': json.loads(row[6]) if row[6] else None,
+            'fields': {name: num if num is not None else text for name, num, text in fields},
+        }
+
+    def record_for_result(self, result_id):
+        """Return the record indexed for a result ID (parsed from prose term sheets), or None"""
+        with self._connect() as conn:
+            row = conn.execute('SELECT record FROM leases WHERE result_id = ? ORDER BY id DESC LIMIT 1',
+                               (result_id,)).fetchone()
+        return json.loads(row[0]) if row and row[0] else None
+
+    def delete(self, lease_id):
+        with self._connect() as conn:
+            row = conn.execute('SELECT lease_filename, term_sheet, lease_text FROM leases WHERE id = ?',
+                               (lease_id,)).fetchone()
+            if row is None:
+                return False
+            # External-content FTS rows are removed by replaying the old values
+            conn.execute("INSERT INTO leases_fts (leases_fts, rowid, lease_filename, term_sheet, lease_text) "
+                         "VALUES ('delete', ?, ?, ?, ?)", (lease_id, *row))
+            conn.execute('DELETE FROM leases WHERE id = ?', (lease_id,))
+        return True
+
+    def search(self, query=None, conditions=(), limit=50, cursor=None, fields=()):
+        """Search leases by full text and field conditions, newest first
+
+        Args:
+            query: FTS5 query over filename, term sheet and lease text
+            conditions: Strings such as "expiration_date>=2027-01-01" or "rent_psf>40"
+            limit: Page size (at most MAX_PAGE_SIZE)
+            cursor: next_cursor from the previous page
+            fields: Field names to return with each hit
+
+        Returns:
+            {'results': [...], 'next_cursor': str or None}
+        """
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        parsed = [parse_condition(condition) for condition in conditions]
+        before = decode_cursor(cursor) if cursor else None
+        with self._connect() as conn:
+            try:
+                ids = self._page_ids(conn, query, parsed, before, limit + 1)
+            except sqlite3.OperationalError as e:
+                # FTS5 reports malformed queries as operational errors
+                if query and any(text in str(e) for text in _FTS_QUERY_ERRORS):
+                    raise QueryError(f"Invalid search query: {e}")
+                raise
+            page = ids[:limit]
+            rows, snippets, values = self._page_details(conn, page, query, fields)
+
+        results = [{'id': lease_id, 'result_id': rows[lease_id][0], 'lease_filename': rows[lease_id][1],
+                    'created_at': rows[lease_id][2], 'snippet': snippets.get(lease_id),
+                    'fields': values.get(lease_id, {})}
+                   for lease_id in page if lease_id in rows]
+        next_cursor = encode_cursor(page[-1]) if len(ids) > limit else None
+        return {'results': results, 'next_cursor': next_cursor}
+
+    def _page_ids(self, conn, query, conditions, before, limit):
+        # Walk leases (or FTS matches) newest first and stop at limit; FTS5
+        # serves ORDER BY rowid DESC and rowid bounds from its own index
+        table = 'leases_fts' if query else 'leases'
+        sql = [f'SELECT rowid FROM {table} WHERE']
+        if query:
+            sql.append('leases_fts MATCH ?')
+            params = [query]
+        else:
+            sql.append('1')
+            params = []
+        if before is not None:
+            sql.append('AND rowid < ?')
+            params.append(before)
+
+        # A selective condition drives the scan from its (name, value) index;
+        # the rest are checked per lease, which is cheap when matches are common
+        driver = self._selective_condition(conn, conditions, limit)
+        for condition in conditions:
+            name, operator, value = condition
+            column = 'num' if isinstance(value, float) else 'text'
+            if condition is driver:
+                sql.append(f'AND rowid IN (SELECT lease_id FROM lease_fields '
+                           f'WHERE name = ? AND {column} {operator} ?)')
+            else:
+                # Without INDEXED BY the planner may range-scan the (name, value) index instead
+                sql.append(f'AND EXISTS (SELECT 1 FROM lease_fields INDEXED BY lease_fields_lease '
+                           f'WHERE lease_id = {table}.rowid '
+                           f'AND name = ? AND {column} {operator} ?)')
+            params.extend([name, value])
+        sql.append('ORDER BY rowid DESC LIMIT ?')
+        params.append(limit)
+        return [row[0] for row in conn.execute(' '.join(sql), params)]
+
+    def _selective_condition(self, conn, conditions, limit):
+        """Return the condition with the fewest matches if it is worth driving the scan"""
+        ranges = [condition for condition in conditions if condition[1] != '!=']
+        if not ranges:
+            return None
+        leases = conn.execute('SELECT max(rowid) FROM leases').fetchone()[0] or 0
+        # Scanning newest first reads about limit * leases / matches rows;
+        # driving from the index reads matches rows
+        threshold = int(math.sqrt(limit * leases)) + 1
+        best, best_count = None, threshold
+        for condition in ranges:
+            name, operator, value = condition
+            column = 'num' if isinstance(value, float) else 'text'
+            count = conn.execute(f'SELECT count(*) FROM (SELECT 1 FROM lease_fields '
+                                 f'WHERE name = ? AND {column} {operator} ? LIMIT ?)',
+                                 (name, value, best_count)).fetchone()[0]
+            if count < best_count:
+                best, best_count = condition, count
+        return best
+
+    def _page_details(self, conn, page, query, fields):
+        if not page:
+            return {}, {}, {}
+        placeholders = ','.join('?' * len(page))
+        rows = {row[0]: row[1:] for row in conn.execute(
+            f'SELECT id, result_id, lease_filename, created_at FROM leases WHERE id IN ({placeholders})', page)}
+        snippets = {}
+        if query:
+            # Snippets are only built for the page, not for every match
+            snippets = dict(conn.execute(
+                f"SELECT rowid, snippet(leases_fts, -1, '[', ']', '...', 12) FROM leases_fts "
+                f"WHERE leases_fts MATCH ? AND rowid IN ({placeholders})", [query] + page))
+        values = {}
+        if fields:
+            names = ','.join('?' * len(fields))
+            for lease_id, name, num, text in conn.execute(
+                    f'SELECT lease_id, name, num, text FROM lease_fields '
+                    f'WHERE lease_id IN ({placeholders}) AND name IN ({names})', page + list(fields)):
+                values.setdefault(lease_id, {})[name] = num if num is not None else text
+        return rows, snippets, values
+
+def create_lease_index():
+    """Create a LeaseIndex configured from environment variables"""
+    return LeaseIndex(path=os.environ.get('LEASE_INDEX_PATH', DEFAULT_INDEX_PATH))
@@ -0,0 +1,207 @@
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Emit one JSON log line per request/job with its stage timings
+JSON_LOGS = os.environ.get('METRICS_JSON_LOGS', 'off').lower() in ('1', 'true', 'on')
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+def _format_number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    """A monotonically increasing count, one series per label combination"""
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_number(value)}"
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus style"""
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labelnames=(), buckets=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def samples(self):
+        with self._lock:
+            series = {key: ([*counts], total, count) for key, (counts, total, count) in self._series.items()}
+        for key, (counts, total, count) in sorted(series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, [('le', _format_number(bound))])
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {_format_number(total)}"
+            yield f"{self.name}_count{labels} {count}"
+
+_registry = []
+
+def register(metric):
+    _registry.append(metric)
+    return metric
+
+def render_prometheus():
+    """Render every registered metric in the Prometheus text exposition format"""
+    lines = []
+    for metric in _registry:
+        lines.append(f"# HELP {metric.name} {metric.help_text}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.samples())
+    return '\n'.join(lines) + '\n'
+
+STAGE_SECONDS = register(Histogram(
+    'term_sheet_stage_seconds', 'Latency of each pipeline stage in seconds', ['stage'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)))
+STAGE_ERRORS = register(Counter(
+    'term_sheet_stage_errors_total', 'Exceptions raised by pipeline stages', ['stage', 'error']))
+DOCUMENT_BYTES = register(Histogram(
+    'term_sheet_document_bytes', 'Size of uploaded lease documents in bytes', ['format'],
+    buckets=(10_000, 100_000, 1_000_000, 5_000_000, 10_000_000, 50_000_000, 100_000_000)))
+DOCUMENT_CHARS = register(Histogram(
+    'term_sheet_document_chars', 'Length of extracted lease text in characters', [],
+    buckets=(10_000, 50_000, 100_000, 250_000, 500_000, 1_000_000, 5_000_000)))
+GEMINI_TOKENS = register(Counter(
+    'term_sheet_gemini_tokens_total', 'Gemini tokens used, by model and direction',
+    ['model', 'direction']))
+GEMINI_RETRIES = register(Counter(
+    'term_sheet_gemini_retries_total', 'Gemini calls retried after a 429/5xx error', ['error']))
+
+# Per-request record of stage timings, filled in by timed() and friends
+_request = contextvars.ContextVar('metrics_request', default=None)
+# Guards counts added to a record; one request's map calls run on several threads
+_record_lock = threading.Lock()
+
+def current_request_id():
+    record = _request.get()
+    return record['request_id'] if record else None
+
+def annotate(**fields):
+    """Attach fields (sizes, filenames, ...) to the current request's log line"""
+    record = _request.get()
+    if record is not None:
+        record.update(fields)
+
+def accumulate(**counts):
+    """Add counts (estimated tokens, ...) to fields of the current request's log line"""
+    record = _request.get()
+    if record is not None:
+        with _record_lock:
+            for name, value in counts.items():
+                record[name] = record.get(name, 0) + value
+
+@contextmanager
+def request_log(request_id, **fields):
+    """Collect stage timings for one request and log them as JSON at the end
+
+    Logging only happens when METRICS_JSON_LOGS is on; metrics are recorded
+    either way.
+    """
+    record = {'request_id': request_id, **fields, 'stages': {}}
+    token = _request.set(record)
+    started = time.perf_counter()
+    try:
+        yield record
+    except Exception as e:
+        record['error'] = type(e).__name__
+        raise
+    finally:
+        _request.reset(token)
+        record['seconds'] = round(time.perf_counter() - started, 4)
+        if JSON_LOGS:
+            logger.info(json.dumps(record, default=str))
+
+@contextmanager
+def timed(stage):
+    """Time a pipeline stage; usable as a context manager or a decorator
+
+    The duration is observed in STAGE_SECONDS and added to the current
+    request's log line. Exceptions are counted by class and re-raised.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        STAGE_ERRORS.inc(stage=stage, error=type(e).__name__)
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        record = _request.get()
+        if record is not None:
+            with _record_lock:
+                stages = record['stages']
+                stages[stage] = round(stages.get(stage, 0) + elapsed, 6)
+
+def record_document(document_format, size_bytes, text_chars):
+    """Record the size of an ingested document and its extracted text
+
+    document_format is a label from a fixed set (lease_core.format_name),
+    never the raw upload extension, so the metric's series stay bounded.
+    """
+    DOCUMENT_BYTES.observe(size_bytes, format=document_format)
+    DOCUMENT_CHARS.observe(text_chars)
+    annotate(document_format=document_format, document_bytes=size_bytes, text_chars=text_chars)
+
+def record_tokens(model_name, usage):
+    """Record token counts from a Gemini usage_metadata object (if any)"""
+    if usage is None:
+        return
+    input_tokens = getattr(usage, 'prompt_token_count', 0) or 0
+    output_tokens = getattr(usage, 'candidates_token_count', 0) or 0
+    GEMINI_TOKENS.inc(input_tokens, model=model_name, direction='input')
+    GEMINI_TOKENS.inc(output_tokens, model=model_name, direction='output')
+    record = _request.get()
+    if record is not None:
+        with _record_lock:
+            record['input_tokens'] = record.get('input_tokens', 0) + input_tokens
+            record['output_tokens'] = record.get('output_tokens', 0) + output_tokens
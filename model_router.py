@@ -0,0 +1,131 @@
+import logging
+import os
+import re
+import threading
+
+from metrics import Counter, register
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL_TIERS = 'gemini-2.5-flash,gemini-2.5-pro'
+# Escalate when more than this share of template fields came back unspecified
+MAX_UNSPECIFIED_RATIO = float(os.environ.get('ROUTING_MAX_UNSPECIFIED', '0.5'))
+# Weight of the newest sample in each tier's moving average latency
+LATENCY_SMOOTHING = 0.2
+
+_NOT_SPECIFIED = re.compile(r'not specified', re.I)
+
+ROUTING_DECISIONS = register(Counter(
+    'term_sheet_routing_decisions_total', 'Model routing outcomes by tier', ['model', 'outcome']))
+ROUTING_SECONDS_SAVED = register(Counter(
+    'term_sheet_routing_seconds_saved_total',
+    'Estimated latency saved by accepting a faster tier, in seconds'))
+
+def load_model_tiers():
+    """Return the configured model tiers, fastest first (MODEL_TIERS, comma separated)"""
+    tiers = [name.strip() for name in os.environ.get('MODEL_TIERS', DEFAULT_MODEL_TIERS).split(',')]
+    return [name for name in tiers if name] or DEFAULT_MODEL_TIERS.split(',')
+
+class QualityReport:
+    """Local quality checks of a generated term sheet against its template"""
+    def __init__(self, fields_total, unspecified, leftover_placeholders, missing_sections, error):
+        self.fields_total = fields_total
+        self.unspecified = unspecified
+        self.leftover_placeholders = leftover_placeholders
+        self.missing_sections = missing_sections
+        self.error = error
+
+    @property
+    def unspecified_ratio(self):
+        return min(1.0, self.unspecified / self.fields_total) if self.fields_total else 0.0
+
+    def failures(self, max_unspecified_ratio=MAX_UNSPECIFIED_RATIO):
+        """Return the reasons this output should be escalated (empty if it passes)"""
+        reasons = []
+        if self.error:
+            reasons.append('error')
+        if self.unspecified_ratio > max_unspecified_ratio:
+            reasons.append(f"unspecified={self.unspecified_ratio:.0%}")
+        if self.leftover_placeholders:
+            reasons.append(f"placeholders={self.leftover_placeholders}")
+        if self.missing_sections:
+            reasons.append(f"missing_sections={len(self.missing_sections)}")
+        return reasons
+
+def score_term_sheet(compiled, text):
+    """Score a prose term sheet against the compiled template it should fill in"""
+    if not text.strip() or text.lstrip().startswith('Error'):
+        return QualityReport(len(compiled.fields), 0, 0, [], error=True)
+    lowered = text.lower()
+    unspecified = sum(1 for line in text.splitlines() if _NOT_SPECIFIED.search(line))
+    leftovers = sum(1 for field in compiled.fields for placeholder in field.placeholders
+                    if f"{{{{{placeholder}}}}}" in text or f"[{placeholder}]" in text)
+    missing = [name for name in compiled.section_names if name.lower() not in lowered]
+    return QualityReport(len(compiled.fields), unspecified, leftovers, missing, error=False)
+
+class ModelRouter:
+    """Tries model tiers fastest first and escalates output that fails local checks
+
+    Callers generate with each fast tier in turn and ask accept() whether
+    the output is good enough; the final tier's output is always used.
+    Decisions are logged and counted, along with the latency saved
+    (estimated from the final tier's moving average) whenever a faster
+    tier's output is accepted.
+    """
+    def __init__(self, tiers, max_unspecified_ratio=MAX_UNSPECIFIED_RATIO):
+        self.tiers = list(tiers)
+        self.max_unspecified_ratio = max_unspecified_ratio
+        self._latency = {}
+        self._lock = threading.Lock()
+
+    @property
+    def fast_tiers(self):
+        return self.tiers[:-1]
+
+    @property
+    def final_tier(self):
+        return self.tiers[-1]
+
+    @property
+    def cache_name(self):
+        """Name for cache keys; a different tier list yields different results"""
+        return ','.join(self.tiers)
+
+    def observe(self, model_name, seconds):
+        """Update a tier's moving average latency"""
+        with self._lock:
+            previous = self._latency.get(model_name)
+            self._latency[model_name] = seconds if previous is None else (
+                previous + LATENCY_SMOOTHING * (seconds - previous))
+
+    def accept(self, model_name, failures, seconds, label=''):
+        """Record a fast tier's outcome; return True to use its output
+
+        Args:
+            failures: Reasons the output failed local checks (empty if it passed)
+            seconds: How long the tier took
+            label: What was generated, for the log line
+        """
+        self.observe(model_name, seconds)
+        if failures:
+            ROUTING_DECISIONS.inc(model=model_name, outcome='escalated')
+            logger.info('Routing %s: %s escalated after %.1fs (%s)',
+                        label, model_name, seconds, ', '.join(failures))
+            return False
+
+        ROUTING_DECISIONS.inc(model=model_name, outcome='accepted')
+        with self._lock:
+            final_latency = self._latency.get(self.final_tier)
+        if final_latency is not None and final_latency > seconds:
+            ROUTING_SECONDS_SAVED.inc(final_latency - seconds)
+            logger.info('Routing %s: %s accepted in %.1fs, about %.1fs faster than %s',
+                        label, model_name, seconds, final_latency - seconds, self.final_tier)
+        else:
+            logger.info('Routing %s: %s accepted in %.1fs', label, model_name, seconds)
+        return True
+
+    def finish(self, model_name, seconds, label=''):
+        """Record that the final tier produced the output"""
+        self.observe(model_name, seconds)
+        ROUTING_DECISIONS.inc(model=model_name, outcome='final')
+        logger.info('Routing %s: %s finished in %.1fs', label, model_name, seconds)
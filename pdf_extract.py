@@ -0,0 +1,87 @@
+import io
+import mmap
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import PyPDF2
+
+# Below this many pages the process pool costs more than it saves
+PARALLEL_MIN_PAGES = int(os.environ.get('PDF_PARALLEL_MIN_PAGES', '16'))
+# Pages handed to a worker per task
+PAGES_PER_TASK = int(os.environ.get('PDF_PAGES_PER_TASK', '8'))
+
+# Each pool worker parses the PDF once and keeps the reader here
+_worker_reader = None
+
+def _open_reader(source):
+    # Paths are memory-mapped so pages are read from disk as they are parsed
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return PyPDF2.PdfReader(mapped)
+    return PyPDF2.PdfReader(io.BytesIO(source))
+
+def _init_worker(source):
+    global _worker_reader
+    _worker_reader = _open_reader(source)
+
+def _extract_range(page_range):
+    start, stop = page_range
+    return [(index + 1, _worker_reader.pages[index].extract_text() or '')
+            for index in range(start, stop)]
+
+def _read_bytes(file):
+    if isinstance(file, (bytes, bytearray)):
+        return bytes(file)
+    if hasattr(file, 'seek'):
+        file.seek(0)
+    return file.read()
+
+def iter_pdf_pages(file, max_workers=None):
+    """Yield (page_number, text) for each page of a PDF, in page order
+
+    Large documents are split into page ranges and extracted on a process
+    pool; results are still yielded strictly in page order. A path, or a
+    file-like with a path attribute (upload_spool.MappedFile), is
+    memory-mapped in each worker instead of being copied to it.
+
+    Args:
+        file: A path, a file-like object or the raw PDF bytes
+        max_workers: Size of the process pool (default: PDF_WORKERS or CPU count)
+    """
+    path = file if isinstance(file, (str, os.PathLike)) else getattr(file, 'path', None)
+    if path is not None:
+        source = path
+        reader = _open_reader(path)
+    else:
+        source = _read_bytes(file)
+        reader = _open_reader(source)
+    page_count = len(reader.pages)
+    if max_workers is None:
+        max_workers = int(os.environ.get('PDF_WORKERS', '0')) or os.cpu_count() or 1
+
+    if page_count < PARALLEL_MIN_PAGES or max_workers < 2:
+        for index, page in enumerate(reader.pages):
+            yield index + 1, page.extract_text() or ''
+        return
+
+    ranges = [(start, min(start + PAGES_PER_TASK, page_count))
+              for start in range(0, page_count, PAGES_PER_TASK)]
+    with ProcessPoolExecutor(max_workers=min(max_workers, len(ranges)),
+                             initializer=_init_worker,
+                             initargs=(source,)) as executor:
+        # map() returns results in submission order, so pages stay ordered
+        for pages in executor.map(_extract_range, ranges):
+            yield from pages
+
+def read_pdf_pages(file, max_workers=None):
+    """Return a list of (page_number, text) tuples for a PDF"""
+    return list(iter_pdf_pages(file, max_workers=max_workers))
+
+def page_marker(page_number):
+    """The line that opens a page in joined text, e.g. "[p3]" (as in corpus tags like "[D1 p3]")"""
+    return f"[p{page_number}]"
+
+def join_pages(pages):
+    """Join extracted pages into one text, each page opened by its page_marker line"""
+    return ''.join(f"{page_marker(page_number)}\n{text}\n" for page_number, text in pages)
@@ -0,0 +1,205 @@
+import math
+import os
+import re
+from collections import Counter
+
+from template_model import compile_template
+
+# Set RELEVANCE_FILTER=off to always send the full lease text
+FILTER_ENABLED = os.environ.get('RELEVANCE_FILTER', 'on').lower() not in ('off', 'false', '0')
+# Leases shorter than this are sent in full; filtering would save little
+FILTER_MIN_CHARS = int(os.environ.get('RELEVANCE_FILTER_MIN_CHARS', '20000'))
+# Passages kept per template section
+TOP_K = int(os.environ.get('RELEVANCE_TOP_K', '4'))
+# Target characters per passage
+PASSAGE_CHARS = 1200
+
+_WORD = re.compile(r'[a-z0-9]+')
+_SENTENCE_END = re.compile(r'(?<=[.;:])\s+')
+# Page marker lines of PDF text (pdf_extract.page_marker)
+_PAGE_MARKER = re.compile(r'^\[p\d+\]$', re.M)
+_STOPWORDS = frozenset("""a an and are as at be by for from has have in is it its of on or
+shall such that the this to was were which will with""".split())
+
+# Lease vocabulary for common template headings, so a heading like "CAM"
+# also matches passages that only say "common area maintenance"
+SECTION_SYNONYMS = {
+    'rent': ['rent', 'monthly', 'annual', 'annum', 'payable', 'installment', 'escalation', 'increase', 'per'],
+    'term': ['term', 'commencement', 'expiration', 'expire', 'years', 'months'],
+    'option': ['option', 'extend', 'renewal', 'renew', 'notice'],
+    'premises': ['premises', 'suite', 'square', 'feet', 'rentable', 'floor', 'located', 'use'],
+    'parties': ['landlord', 'tenant', 'guarantor', 'guaranty', 'between'],
+    'parking': ['parking', 'spaces', 'stalls', 'vehicles', 'garage', 'reserved', 'unreserved'],
+    'cam': ['common', 'area', 'maintenance', 'operating', 'expenses', 'proportionate', 'share'],
+    'taxes': ['taxes', 'tax', 'assessments', 'real', 'estate'],
+    'security': ['security', 'deposit', 'letter', 'credit'],
+    'deposit': ['security', 'deposit'],
+    'improvements': ['improvements', 'allowance', 'construction', 'build', 'work'],
+    'ti': ['improvements', 'allowance', 'construction', 'tenant'],
+    'utilities': ['utilities', 'electricity', 'gas', 'water', 'hvac', 'trash', 'janitorial'],
+    'insurance': ['insurance', 'liability', 'coverage', 'insured', 'policy', 'limits'],
+    'assignment': ['assign', 'assignment', 'sublet', 'sublease', 'transfer'],
+    'broker': ['broker', 'brokers', 'commission', 'agent'],
+    'default': ['default', 'defaults', 'remedies', 'cure', 'breach'],
+    'notices': ['notice', 'notices', 'address', 'attention', 'attn'],
+    'holding': ['holding', 'holdover', 'surrender'],
+    'late': ['late', 'charge', 'interest', 'overdue'],
+    'law': ['governed', 'governing', 'laws', 'state', 'jurisdiction'],
+}
+
+class FilterResult:
+    """Filtered lease text and the size reduction it achieved"""
+    def __init__(self, text, original_chars, filtered_chars, passages_kept, passages_total):
+        self.text = text
+        self.original_chars = original_chars
+        self.filtered_chars = filtered_chars
+        self.passages_kept = passages_kept
+        self.passages_total = passages_total
+
+    def summary(self):
+        if self.filtered_chars == self.original_chars:
+            return f"Lease text {self.original_chars:,} characters (full text)"
+        ratio = self.filtered_chars / self.original_chars
+        return (f"Lease text {self.original_chars:,} -> {self.filtered_chars:,} characters "
+                f"({ratio:.0%}, {self.passages_kept}/{self.passages_total} passages)")
+
+def tokenize(text):
+    return [word for word in _WORD.findall(text.lower()) if word not in _STOPWORDS]
+
+def _pack(parts, passage_chars, separator):
+    # Join consecutive parts into pieces of at most passage_chars where possible
+    pieces = []
+    current = ''
+    for part in parts:
+        if current and len(current) + len(separator) + len(part) > passage_chars:
+            pieces.append(current)
+            current = part
+        else:
+            current = f"{current}{separator}{part}" if current else part
+    if current:
+        pieces.append(current)
+    return pieces
+
+def _split_oversized(paragraph, passage_chars):
+    # DOCX, HTML and PDF text has few blank lines, so long paragraphs are
+    # split at line, then sentence boundaries, then hard cuts
+    if len(paragraph) <= passage_chars:
+        return [paragraph]
+    lines = []
+    for line in paragraph.split('\n'):
+        if len(line) <= passage_chars:
+            lines.append(line)
+            continue
+        for sentence in _pack(_SENTENCE_END.split(line), passage_chars, ' '):
+            lines.extend(sentence[start:start + passage_chars] for start in range(0, len(sentence), passage_chars))
+    return _pack(lines, passage_chars, '\n')
+
+def split_passages(lease_text, passage_chars=PASSAGE_CHARS):
+    """Group consecutive paragraphs into passages of about passage_chars
+
+    Paragraphs longer than passage_chars are split into several passages.
+    """
+    passages = []
+    current = []
+    current_len = 0
+    paragraphs = (piece for paragraph in re.split(r'\n\s*\n', lease_text)
+                  for piece in _split_oversized(paragraph.strip(), passage_chars))
+    for paragraph in paragraphs:
+        if not paragraph:
+            continue
+        if current and current_len + len(paragraph) > passage_chars:
+            passages.append('\n\n'.join(current))
+            current = []
+            current_len = 0
+        current.append(paragraph)
+        current_len += len(paragraph)
+    if current:
+        passages.append('\n\n'.join(current))
+    return passages
+
+def page_markers(passages):
+    """Return the page marker in force where each passage starts ('' before the first)"""
+    markers = []
+    current = ''
+    for passage in passages:
+        markers.append(current)
+        found = _PAGE_MARKER.findall(passage)
+        if found:
+            current = found[-1]
+    return markers
+
+def section_queries(template_text):
+    """Return {section heading: query terms} derived from the template
+
+    Each query is the heading's words, the field labels under it, and any
+    synonyms for those words from SECTION_SYNONYMS.
+    """
+    queries = {}
+    for section in compile_template(template_text).sections:
+        terms = tokenize(section.name)
+        for field in section.fields:
+            terms.extend(tokenize(field.label))
+        for word in tokenize(section.name):
+            terms.extend(SECTION_SYNONYMS.get(word, []))
+        queries[section.name] = list(dict.fromkeys(terms))
+    return queries
+
+class BM25Index:
+    """Okapi BM25 over a list of passages"""
+    def __init__(self, passages, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.term_counts = [Counter(tokenize(passage)) for passage in passages]
+        self.lengths = [sum(counts.values()) for counts in self.term_counts]
+        self.avg_length = sum(self.lengths) / len(self.lengths) if self.lengths else 0.0
+        document_freq = Counter()
+        for counts in self.term_counts:
+            document_freq.update(counts.keys())
+        n = len(passages)
+        self.idf = {term: math.log(1 + (n - df + 0.5) / (df + 0.5))
+                    for term, df in document_freq.items()}
+
+    def scores(self, query_terms):
+        scores = []
+        for counts, length in zip(self.term_counts, self.lengths):
+            norm = self.k1 * (1 - self.b + self.b * length / (self.avg_length or 1))
+            score = 0.0
+            for term in query_terms:
+                tf = counts.get(term)
+                if tf:
+                    score += self.idf[term] * tf * (self.k1 + 1) / (tf + norm)
+            scores.append(score)
+        return scores
+
+    def top_k(self, query_terms, k):
+        scores = self.scores(query_terms)
+        ranked = sorted(range(len(scores)), key=scores.__getitem__, reverse=True)
+        return [i for i in ranked[:k] if scores[i] > 0]
+
+def filter_lease_text(lease_text, template_text, top_k=TOP_K, full_text=False):
+    """Keep only the lease passages most relevant to the template's sections
+
+    Passages are kept in their original order. The full text is returned
+    unchanged when full_text is set, filtering is disabled, the lease is
+    short, or the template has no recognizable sections.
+    """
+    original_chars = len(lease_text)
+    unfiltered = FilterResult(lease_text, original_chars, original_chars, 0, 0)
+    if full_text or not FILTER_ENABLED or original_chars < FILTER_MIN_CHARS:
+        return unfiltered
+    passages = split_passages(lease_text)
+    queries = section_queries(template_text)
+    if not queries or len(passages) <= top_k:
+        return unfiltered
+
+    index = BM25Index(passages)
+    # The opening passage names the parties and premises; always keep it
+    keep = {0}
+    for terms in queries.values():
+        keep.update(index.top_k(terms, top_k))
+
+    # A kept passage that starts mid-page is given its page's marker, so pages can still be cited
+    markers = page_markers(passages)
+    text = '\n\n'.join(passages[i] if not markers[i] or _PAGE_MARKER.match(passages[i])
+                         else f"{markers[i]}\n{passages[i]}" for i in sorted(keep))
+    return FilterResult(text, original_chars, len(text), len(keep), len(passages))
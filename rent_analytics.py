@@ -0,0 +1,239 @@
+import os
+import re
+from datetime import date
+
+import numpy as np
+
+from lease_index import index_fields
+
+# Annual rate cash flows are discounted at for NPV
+DISCOUNT_RATE = float(os.environ.get('RENT_DISCOUNT_RATE', '0.08'))
+# Months between rent escalations when the lease does not say otherwise
+ESCALATION_INTERVAL_MONTHS = 12
+
+_WORD_NUMBERS = {'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5, 'six': 6,
+                 'seven': 7, 'eight': 8, 'nine': 9, 'ten': 10, 'eleven': 11, 'twelve': 12}
+_COUNT = r'(\d+|' + '|'.join(_WORD_NUMBERS) + r')'
+_ABATEMENT = [
+    re.compile(_COUNT + r'\s*(?:\(\d+\)\s*)?months?\s+(?:of\s+)?(?:free|abated)\s+(?:base\s+)?rent', re.I),
+    re.compile(r'(?:abatement|abated|free rent)\D{0,40}?' + _COUNT + r'\s*(?:\(\d+\)\s*)?months?', re.I),
+]
+_ESCALATION = re.compile(r'(?:escalat|increas)\w*\D{0,40}?(\d+(?:\.\d+)?)\s*%', re.I)
+_MONTH_RANGE = re.compile(r'(\d+)\s*(?:-|–|to|through)\s*(\d+)')
+_STEP_KEY = re.compile(r'^monthly(?:_base)?_rent_(\d+)$')
+
+class LeaseTerms:
+    """Inputs of a rent schedule
+
+    Rent starts at base_monthly_rent and grows by escalation_rate every
+    escalation_interval months; the first abatement_months are free. steps
+    optionally gives an explicit schedule of (start month, monthly rent),
+    months counted from 0; escalations then apply after the last step.
+    """
+    def __init__(self, term_months, base_monthly_rent, escalation_rate=0.0,
+                 escalation_interval=ESCALATION_INTERVAL_MONTHS, abatement_months=0,
+                 ti_allowance=0.0, size_sf=None, commencement=None, steps=None):
+        self.term_months = int(term_months)
+        self.base_monthly_rent = float(base_monthly_rent)
+        self.escalation_rate = float(escalation_rate)
+        self.escalation_interval = max(1, int(escalation_interval))
+        self.abatement_months = int(abatement_months)
+        self.ti_allowance = float(ti_allowance or 0)
+        self.size_sf = size_sf
+        self.commencement = commencement
+        self.steps = steps or []
+
+    def to_dict(self):
+        """JSON-safe form, restored with terms_from_dict"""
+        return {'term_months': self.term_months, 'base_monthly_rent': self.base_monthly_rent,
+                'escalation_rate': self.escalation_rate, 'escalation_interval': self.escalation_interval,
+                'abatement_months': self.abatement_months, 'ti_allowance': self.ti_allowance,
+                'size_sf': self.size_sf,
+                'commencement': self.commencement.isoformat() if self.commencement else None,
+                'steps': [list(step) for step in self.steps]}
+
+def terms_from_dict(data):
+    """Rebuild LeaseTerms from LeaseTerms.to_dict()"""
+    commencement = date.fromisoformat(data['commencement']) if data.get('commencement') else None
+    return LeaseTerms(data['term_months'], data['base_monthly_rent'], data['escalation_rate'],
+                      data['escalation_interval'], data['abatement_months'], data['ti_allowance'],
+                      data['size_sf'], commencement, [tuple(step) for step in data['steps']])
+
+def _count(word):
+    return _WORD_NUMBERS.get(word.lower()) or int(word)
+
+def _rent_steps(record):
+    # Template rows such as "Months 1-12 ... Monthly Rent $X"
+    steps = []
+    for section in (record or {}).values():
+        for key, value in section.items():
+            match = _STEP_KEY.match(key)
+            if not match or not isinstance(value, (int, float)):
+                continue
+            months = section.get(f"months_{match.group(1)}")
+            span = _MONTH_RANGE.search(str(months)) if months is not None else None
+            if span:
+                steps.append((int(span.group(1)) - 1, float(value)))
+    return sorted(steps)
+
+def terms_from_record(record, text=''):
+    """Build LeaseTerms from a term sheet record, or None if rent or term is missing
+
+    Escalations and abatements missing from the record are looked for in
+    text (the term sheet).
+    """
+    fields = index_fields(record)
+    number = lambda name: fields.get(name) if isinstance(fields.get(name), (int, float)) else None
+    monthly = number('monthly_rent')
+    if monthly is None and number('annual_rent') is not None:
+        monthly = number('annual_rent') / 12
+    term_years = number('term_years')
+    commencement, expiration = fields.get('commencement_date'), fields.get('expiration_date')
+    term_months = None
+    if term_years:
+        term_months = int(round(term_years * 12))
+    elif isinstance(commencement, str) and isinstance(expiration, str):
+        try:
+            start, end = date.fromisoformat(commencement), date.fromisoformat(expiration)
+            term_months = (end.year - start.year) * 12 + end.month - start.month + (end.day > start.day)
+        except ValueError:
+            pass
+    if not monthly or not term_months:
+        return None
+
+    escalation = next((value for name, value in fields.items()
+                       if re.search(r'increase|escalation', name) and isinstance(value, (int, float))), None)
+    if escalation is None:
+        match = _ESCALATION.search(text)
+        escalation = float(match.group(1)) if match else 0.0
+    abatement = 0
+    for pattern in _ABATEMENT:
+        match = pattern.search(text)
+        if match:
+            abatement = _count(match.group(1))
+            break
+    try:
+        commencement = date.fromisoformat(commencement) if isinstance(commencement, str) else None
+    except ValueError:
+        commencement = None
+    return LeaseTerms(term_months, monthly, escalation / 100, abatement_months=abatement,
+                      ti_allowance=number('ti_allowance') or 0, size_sf=number('size_sf'),
+                      commencement=commencement, steps=_rent_steps(record))
+
+def _growth(rate, periods):
+    # (1 + rate) ** periods, with the powers computed once per period count
+    factors = (1 + rate) ** np.arange(int(periods.max(initial=0)) + 1)[None, :]
+    return np.take_along_axis(factors, np.broadcast_to(periods, (rate.shape[0], periods.shape[1])), axis=1)
+
+def _stepped_rent(terms_list, month, base, rate, interval, width):
+    # Explicit steps, padded to a common width; a start past the last month never applies
+    n, months = len(terms_list), month.shape[1]
+    step_start = np.full((n, width + 1), months + 1)
+    step_rent = np.zeros((n, width + 1))
+    step_start[:, 0] = 0
+    step_rent[:, 0] = base[:, 0]
+    for row, terms in enumerate(terms_list):
+        for column, (start, rent) in enumerate(terms.steps, 1):
+            step_start[row, column] = start
+            step_rent[row, column] = rent
+    active = (step_start[:, :, None] <= month[:, None, :]).sum(axis=1) - 1
+    step_rent_by_month = np.take_along_axis(step_rent, active, axis=1)
+    step_start_by_month = np.take_along_axis(step_start, active, axis=1)
+
+    # Steps carry their own increases, so escalations only resume once the
+    # last step has run as long as the one before it (or one interval)
+    has_steps = np.array([bool(terms.steps) for terms in terms_list])[:, None]
+    last_step = np.array([terms.steps[-1][0] if terms.steps else 0 for terms in terms_list])[:, None]
+    step_length = np.array([(terms.steps[-1][0] - terms.steps[-2][0]) if len(terms.steps) > 1
+                            else interval[row, 0] for row, terms in enumerate(terms_list)])[:, None]
+    escalate_from = last_step + step_length
+    periods = np.where(has_steps,
+                       np.where(month >= escalate_from, (month - escalate_from) // interval + 1, 0),
+                       (month - step_start_by_month) // interval)
+    return step_rent_by_month * _growth(rate, periods)
+
+def monthly_schedules(terms_list, months=None):
+    """Return an (n leases, months) array of monthly rent, built in one array pass"""
+    if months is None:
+        months = max((terms.term_months for terms in terms_list), default=0)
+    if not terms_list:
+        return np.zeros((0, months))
+    month = np.arange(months)[None, :]
+    term = np.array([terms.term_months for terms in terms_list])[:, None]
+    base = np.array([terms.base_monthly_rent for terms in terms_list])[:, None]
+    rate = np.array([terms.escalation_rate for terms in terms_list])[:, None]
+    interval = np.array([terms.escalation_interval for terms in terms_list])[:, None]
+    abatement = np.array([terms.abatement_months for terms in terms_list])[:, None]
+
+    width = max((len(terms.steps) for terms in terms_list), default=0)
+    if width == 0:
+        rent = base * _growth(rate, month // interval)
+    else:
+        rent = _stepped_rent(terms_list, month, base, rate, interval, width)
+    rent = np.where((month < term) & (month >= abatement), rent, 0.0)
+    return rent
+
+def analyze_leases(terms_list, discount_rate=DISCOUNT_RATE):
+    """Evaluate many leases at once
+
+    Returns a dict of arrays, one value per lease: total_rent, npv (rent
+    paid monthly in advance, less the TI allowance paid at commencement),
+    effective_rent (monthly, net of TI), effective_rent_psf (annual) and
+    the monthly schedule itself.
+    """
+    schedule = monthly_schedules(terms_list)
+    monthly_rate = (1 + discount_rate) ** (1 / 12) - 1
+    discount = (1 + monthly_rate) ** -np.arange(schedule.shape[1])
+    ti = np.array([terms.ti_allowance for terms in terms_list])
+    term = np.array([terms.term_months for terms in terms_list], dtype=float)
+    size = np.array([terms.size_sf or np.nan for terms in terms_list], dtype=float)
+    total = schedule.sum(axis=1)
+    effective = (total - ti) / term
+    with np.errstate(invalid='ignore', divide='ignore'):
+        effective_psf = effective * 12 / size
+    return {
+        'schedule': schedule,
+        'total_rent': total,
+        'npv': schedule @ discount - ti,
+        'effective_rent': effective,
+        'effective_rent_psf': effective_psf,
+    }
+
+def annual_rows(terms, schedule):
+    """Summarize one lease's monthly schedule by lease year
+
+    Returns [(lease year, first month, last month, average monthly rent,
+    annual rent)], months numbered from 1.
+    """
+    rows = []
+    for start in range(0, terms.term_months, 12):
+        months = schedule[start:min(start + 12, terms.term_months)]
+        rows.append((start // 12 + 1, start + 1, start + len(months),
+                     float(months.mean()), float(months.sum())))
+    return rows
+
+def _money(value):
+    return f"${value:,.2f}"
+
+def rent_table(terms, discount_rate=DISCOUNT_RATE):
+    """Return (header, rows, summary) of one lease's rent schedule for rendering
+
+    rows has one row of display strings per lease year; summary holds
+    (label, value) pairs: total rent, NPV, effective rent and, when known,
+    per-SF effective rent, abated months and the TI allowance.
+    """
+    analysis = analyze_leases([terms], discount_rate)
+    header = ['Lease Year', 'Months', 'Average Monthly Rent', 'Annual Rent']
+    rows = [[str(year), f"{first}-{last}", _money(monthly), _money(annual)]
+            for year, first, last, monthly, annual in annual_rows(terms, analysis['schedule'][0])]
+
+    summary = [('Total Rent', _money(analysis['total_rent'][0])),
+               (f"NPV at {discount_rate:.1%}", _money(analysis['npv'][0])),
+               ('Effective Monthly Rent', _money(analysis['effective_rent'][0]))]
+    if not np.isnan(analysis['effective_rent_psf'][0]):
+        summary.append(('Effective Rent per SF per Year', _money(analysis['effective_rent_psf'][0])))
+    if terms.abatement_months:
+        summary.append(('Abated Months', str(terms.abatement_months)))
+    if terms.ti_allowance:
+        summary.append(('TI Allowance', _money(terms.ti_allowance)))
+    return header, rows, summary
@@ -0,0 +1,114 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_CACHE_PATH = os.path.join('/tmp', 'lease_term_sheet', 'result_cache.db')
+
+def normalize_text(text):
+    """Collapse whitespace so re-extracted copies of a lease hash the same"""
+    return ' '.join(text.split())
+
+def make_cache_key(lease_text, template_text, model_name, generation_config):
+    """Build a content-addressed key for one term sheet generation"""
+    digest = hashlib.sha256()
+    for part in (normalize_text(lease_text),
+                 template_text,
+                 model_name,
+                 json.dumps(generation_config, sort_keys=True)):
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+class ResultCache:
+    """SQLite-backed cache of generated term sheets
+
+    Entries expire after ttl_seconds and the least recently used entries are
+    evicted once the cache holds more than max_entries.
+    """
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=1000, ttl_seconds=30 * 24 * 3600):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute("""CREATE TABLE IF NOT EXISTS results (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )""")
+            conn.execute('CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed_at)')
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, key):
+        """Return the cached term sheet for key, or None on a miss"""
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute('SELECT value, created_at FROM results WHERE key = ?',
+                               (key,)).fetchone()
+            if row is not None and now - row[1] > self.ttl_seconds:
+                conn.execute('DELETE FROM results WHERE key = ?', (key,))
+                row = None
+            if row is not None:
+                conn.execute('UPDATE results SET accessed_at = ? WHERE key = ?', (now, key))
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return row[0]
+
+    def set(self, key, value):
+        """Store a term sheet and evict expired or excess entries"""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute('INSERT OR REPLACE INTO results (key, value, created_at, accessed_at) '
+                         'VALUES (?, ?, ?, ?)', (key, value, now, now))
+            evicted = conn.execute('DELETE FROM results WHERE created_at < ?',
+                                   (now - self.ttl_seconds,)).rowcount
+            evicted += conn.execute(
+                'DELETE FROM results WHERE key IN (SELECT key FROM results '
+                'ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)', (self.max_entries,)).rowcount
+        with self._lock:
+            self.evictions += evicted
+
+    def stats(self):
+        """Return hit/miss counters and the current cache size"""
+        with self._connect() as conn:
+            entries = conn.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'entries': entries,
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl_seconds,
+            }
+
+def create_result_cache():
+    """Create a ResultCache configured from environment variables"""
+    return ResultCache(
+        path=os.environ.get('RESULT_CACHE_PATH', DEFAULT_CACHE_PATH),
+        max_entries=int(os.environ.get('RESULT_CACHE_MAX_ENTRIES', '1000')),
+        ttl_seconds=int(os.environ.get('RESULT_CACHE_TTL_SECONDS', str(30 * 24 * 3600))),
+    )
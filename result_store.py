@@ -0,0 +1,141 @@
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_STORE_PATH = os.path.join('/tmp', 'lease_term_sheet', 'results.db')
+# Columns added after the table was first created, added to older stores on open
+_ADDED_COLUMNS = [('record', 'TEXT'), ('lease_text', 'TEXT')]
+
+class ResultStore:
+    """Server-side store of generated term sheets addressed by opaque IDs
+
+    Results expire ttl_seconds after they are saved. Expired rows are hidden
+    from get() immediately and deleted by sweep(), which a background
+    sweeper thread calls periodically once start_sweeper() has been called.
+    Rendered downloads (DOCX, PDF) are kept with their result and deleted
+    with it.
+    """
+    def __init__(self, path=DEFAULT_STORE_PATH, ttl_seconds=7 * 24 * 3600):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self._sweeper = None
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute("""CREATE TABLE IF NOT EXISTS results (
+                id TEXT PRIMARY KEY,
+                term_sheet TEXT NOT NULL,
+                lease_filename TEXT,
+                created_at REAL NOT NULL,
+                expires_at REAL NOT NULL,
+                record TEXT,
+                lease_text TEXT
+            )""")
+            columns = [row[1] for row in conn.execute('PRAGMA table_info(results)')]
+            for name, column_type in _ADDED_COLUMNS:
+                if name not in columns:
+                    conn.execute(f'ALTER TABLE results ADD COLUMN {name} {column_type}')
+            conn.execute('CREATE INDEX IF NOT EXISTS results_expires ON results (expires_at)')
+            conn.execute("""CREATE TABLE IF NOT EXISTS renders (
+                result_id TEXT NOT NULL,
+                name TEXT NOT NULL,
+                data BLOB NOT NULL,
+                PRIMARY KEY (result_id, name)
+            )""")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def save(self, term_sheet, lease_filename=None, record=None, lease_text=None):
+        """Store a term sheet and return its result ID
+
+        record is the encoded structured record the term sheet was rendered
+        from, when it was generated in structured mode. lease_text is the
+        extracted lease text, kept so a later revision can be diffed against it.
+        """
+        result_id = secrets.token_urlsafe(16)
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute('INSERT INTO results (id, term_sheet, lease_filename, created_at, expires_at, '
+                         'record, lease_text) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                         (result_id, term_sheet, lease_filename, now, now + self.ttl_seconds,
+                          record, lease_text))
+        return result_id
+
+    def get(self, result_id):
+        """Return the stored result as a dict, or None if missing or expired"""
+        if not result_id:
+            return None
+        with self._connect() as conn:
+            row = conn.execute('SELECT term_sheet, lease_filename, created_at, record, lease_text FROM results '
+                               'WHERE id = ? AND expires_at > ?',
+                               (result_id, time.time())).fetchone()
+        if row is None:
+            return None
+        return {
+            'id': result_id,
+            'term_sheet': row[0],
+            'lease_filename': row[1],
+            'created_at': row[2],
+            'record': row[3],
+            'lease_text': row[4],
+        }
+
+    def get_render(self, result_id, name):
+        """Return the rendered file stored as name (e.g. "docx-v1") for a result, or None"""
+        if not result_id:
+            return None
+        with self._connect() as conn:
+            row = conn.execute('SELECT data FROM renders JOIN results ON results.id = renders.result_id '
+                               'WHERE renders.result_id = ? AND renders.name = ? AND results.expires_at > ?',
+                               (result_id, name, time.time())).fetchone()
+        return row[0] if row else None
+
+    def save_render(self, result_id, name, data):
+        with self._connect() as conn:
+            conn.execute('INSERT OR REPLACE INTO renders (result_id, name, data) VALUES (?, ?, ?)',
+                         (result_id, name, data))
+
+    def delete(self, result_id):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM results WHERE id = ?', (result_id,))
+            conn.execute('DELETE FROM renders WHERE result_id = ?', (result_id,))
+
+    def sweep(self):
+        """Delete expired results and return how many were removed"""
+        with self._connect() as conn:
+            removed = conn.execute('DELETE FROM results WHERE expires_at <= ?',
+                                   (time.time(),)).rowcount
+            conn.execute('DELETE FROM renders WHERE result_id NOT IN (SELECT id FROM results)')
+            return removed
+
+    def start_sweeper(self, interval_seconds=600):
+        """Start a daemon thread that sweeps expired results periodically"""
+        if self._sweeper is not None:
+            return
+        def run():
+            while True:
+                time.sleep(interval_seconds)
+                try:
+                    self.sweep()
+                except sqlite3.Error:
+                    # A busy database is retried on the next pass
+                    pass
+        self._sweeper = threading.Thread(target=run, name='result-sweeper', daemon=True)
+        self._sweeper.start()
+
+def create_result_store():
+    """Create a ResultStore configured from environment variables"""
+    return ResultStore(
+        path=os.environ.get('RESULT_STORE_PATH', DEFAULT_STORE_PATH),
+        ttl_seconds=int(os.environ.get('RESULT_TTL_SECONDS', str(7 * 24 * 3600))),
+    )
@@ -0,0 +1,273 @@
+import json
+import re
+from datetime import date, datetime
+
+NOT_SPECIFIED = 'Not specified in lease'
+
+# Field kinds, inferred from a field's label, slot names and template line
+MONEY = 'money'
+DATE = 'date'
+AREA = 'area'
+PERCENT = 'percent'
+INTEGER = 'integer'
+TEXT = 'text'
+
+_KIND_HINTS = [
+    # Specific hints come first: "CAM due day" lines also mention area and sf
+    (INTEGER, re.compile(r'due day', re.I)),
+    # Schedules, narrative terms and kinds of coverage stay text even when they mention rent or limits
+    (TEXT, re.compile(r'schedule|escalations|\bterms\b|details|responsibility|timeline|\btype\b', re.I)),
+    (PERCENT, re.compile(r'percent|%|increase|escalation rate|holding over', re.I)),
+    (DATE, re.compile(r'\bdate\b|commencement|expiration|delivery', re.I)),
+    # Only size wording; "Common Area" expenses are money
+    (AREA, re.compile(r'square (?:feet|footage)|\br?sf\b|\bsize\b|(?:rentable|usable|floor) area', re.I)),
+    (MONEY, re.compile(r'rent\b|deposit|allowance|\bfee\b|amount|cost|charge|limit|\$|price|threshold|breakpoint|total due', re.I)),
+    (INTEGER, re.compile(r'number of|spaces|\bdays\b|radius|months of term|term years', re.I)),
+]
+
+_KIND_DESCRIPTIONS = {
+    MONEY: 'dollar amount as written, e.g. "$20,833.33"',
+    DATE: 'date as written, e.g. "February 1, 2024"',
+    AREA: 'area in square feet, e.g. "5,000"',
+    PERCENT: 'percentage, e.g. "3%"',
+    INTEGER: 'whole number',
+    TEXT: 'short text',
+}
+
+_DATE_FORMATS = ['%B %d, %Y', '%b %d, %Y', '%B %d %Y', '%m/%d/%Y', '%m/%d/%y', '%Y-%m-%d', '%d %B %Y']
+_NUMBER = re.compile(r'-?\d[\d,]*(?:\.\d+)?')
+
+def slugify(label):
+    return re.sub(r'[^a-z0-9]+', '_', label.lower()).strip('_') or 'field'
+
+def field_kind(field):
+    """Infer the value kind of a TemplateField"""
+    haystack = ' '.join([field.label, ' '.join(field.placeholders), field.line])
+    for kind, pattern in _KIND_HINTS:
+        if pattern.search(haystack):
+            return kind
+    return TEXT
+
+def field_keys(compiled, sections=None):
+    """Return [(section key, section name, [(field key, field)])] with unique keys
+
+    Header fields (above the first section) are grouped under "summary".
+    sections optionally limits the result to the given section keys.
+    """
+    groups = [('summary', 'Summary', compiled.header)]
+    groups.extend((slugify(section.name), section.name, section.fields) for section in compiled.sections)
+    layout = []
+    seen_sections = set()
+    for section_key, name, fields in groups:
+        if not fields:
+            continue
+        while section_key in seen_sections:
+            section_key += '_'
+        seen_sections.add(section_key)
+        keyed = []
+        seen_fields = {}
+        for field in fields:
+            key = slugify(field.label)
+            seen_fields[key] = seen_fields.get(key, 0) + 1
+            if seen_fields[key] > 1:
+                key = f"{key}_{seen_fields[key]}"
+            keyed.append((key, field))
+        if sections is None or section_key in sections:
+            layout.append((section_key, name, keyed))
+    return layout
+
+def build_schema(compiled, sections=None):
+    """Derive a JSON response schema from a CompiledTemplate (optionally only some sections)
+
+    Every value is a nullable string the model copies from the lease; typing
+    happens locally in validate_record() so a model formatting slip never
+    fails the whole response.
+    """
+    properties = {}
+    for section_key, name, keyed in field_keys(compiled, sections):
+        properties[section_key] = {
+            'type': 'object',
+            'description': name,
+            'properties': {
+                key: {
+                    'type': 'string',
+                    'nullable': True,
+                    'description': f"{field.label} ({_KIND_DESCRIPTIONS[field_kind(field)]})",
+                }
+                for key, field in keyed
+            },
+        }
+    return {'type': 'object', 'properties': properties}
+
+def build_structured_prompt(compiled, lease_text):
+    return f"""You are an expert commercial real estate attorney specializing in lease analysis and term sheet creation.
+
+Extract the lease terms below into JSON matching the provided schema. Each field's description says what it holds and how to format it.
+
+Rules:
+1. Copy amounts, dates, percentages and square footage exactly as stated in the lease
+2. Use null for any field that is not found in the lease
+3. Keep text values short; summarize clauses in one sentence
+
+LEASE TERM SHEET TEMPLATE (for context):
+{compiled.text}
+
+COMMERCIAL LEASE:
+{lease_text}"""
+
+def _parse_number(raw):
+    match = _NUMBER.search(raw)
+    if match is None:
+        return None
+    return float(match.group().replace(',', ''))
+
+def coerce_value(kind, raw):
+    """Coerce a model string to the field's kind
+
+    Returns (value, ok). Values that cannot be coerced are kept as the
+    original text with ok=False.
+    """
+    if raw is None:
+        return None, True
+    if not isinstance(raw, str):
+        raw = str(raw)
+    raw = raw.strip()
+    if not raw or raw.lower().startswith('not specified'):
+        return None, True
+
+    if kind == DATE:
+        cleaned = re.sub(r'(\d)(st|nd|rd|th)\b', r'\1', raw)
+        for fmt in _DATE_FORMATS:
+            try:
+                return datetime.strptime(cleaned, fmt).date().isoformat(), True
+            except ValueError:
+                continue
+        return raw, False
+    if kind in (MONEY, AREA, PERCENT, INTEGER):
+        number = _parse_number(raw)
+        if number is None:
+            return raw, False
+        if kind == INTEGER or kind == AREA:
+            return int(round(number)), True
+        return number, True
+    return raw, True
+
+def validate_record(compiled, data, sections=None):
+    """Validate model JSON against the template and coerce typed fields
+
+    Returns (record, issues). The record only contains fields that were
+    found in the lease; issues lists "section.field" keys whose values
+    could not be coerced to their kind.
+    """
+    record = {}
+    issues = []
+    if not isinstance(data, dict):
+        return record, ['response is not a JSON object']
+    for section_key, _, keyed in field_keys(compiled, sections):
+        section_data = data.get(section_key) or {}
+        if not isinstance(section_data, dict):
+            issues.append(section_key)
+            continue
+        values = {}
+        for key, field in keyed:
+            value, ok = coerce_value(field_kind(field), section_data.get(key))
+            if not ok:
+                issues.append(f"{section_key}.{key}")
+            if value is not None:
+                values[key] = value
+        if values:
+            record[section_key] = values
+    return record, issues
+
+def parse_response(compiled, response_text, sections=None):
+    """Parse a JSON-mode response into (record, issues)"""
+    try:
+        data = json.loads(response_text)
+    except ValueError:
+        return {}, ['response is not valid JSON']
+    return validate_record(compiled, data, sections)
+
+def failing_sections(compiled, record, issues, sections=None):
+    """Return the section keys whose values were empty or could not be coerced"""
+    if any('.' not in issue for issue in issues):
+        # The response as a whole (or a section object) was malformed
+        return [key for key, _, _ in field_keys(compiled, sections)]
+    with_issues = {issue.split('.', 1)[0] for issue in issues}
+    return [key for key, _, _ in field_keys(compiled, sections)
+            if key in with_issues or not record.get(key)]
+
+def encode_record(record):
+    """Serialize a record compactly for storage"""
+    return json.dumps(record, separators=(',', ':'), ensure_ascii=False)
+
+def decode_record(encoded):
+    return json.loads(encoded) if encoded else None
+
+def format_value(kind, value):
+    """Format a coerced value for the prose term sheet"""
+    if value is None:
+        return NOT_SPECIFIED
+    if isinstance(value, str):
+        if kind == DATE:
+            try:
+                parsed = date.fromisoformat(value)
+            except ValueError:
+                return value
+            return f"{parsed:%B} {parsed.day}, {parsed.year}"
+        return value
+    if kind == MONEY:
+        return f"${value:,.2f}"
+    if kind == AREA:
+        return f"{value:,} SF"
+    if kind == PERCENT:
+        return f"{value:g}%"
+    return f"{value:,}" if isinstance(value, int) else f"{value:g}"
+
+def render_term_sheet(compiled, record):
+    """Render the prose term sheet for a record locally, without a model call"""
+    lines = []
+    for section_key, name, keyed in field_keys(compiled):
+        values = record.get(section_key, {})
+        if section_key != 'summary':
+            lines.append('')
+            lines.append(name.upper())
+        for key, field in keyed:
+            lines.append(f"{field.label}: {format_value(field_kind(field), values.get(key))}")
+    return '\n'.join(lines).strip() + '\n'
+
+_LINE_MARKUP = re.compile(r'^[\s*#>\-•]+|\*+')
+
+def parse_term_sheet(compiled, text):
+    """Recover a record from a prose term sheet written to the template
+
+    The inverse of render_term_sheet() for model-written term sheets:
+    "Label: value" lines are matched to template fields, first within the
+    current section heading, then anywhere, and coerced to their kinds.
+    Values that cannot be coerced are left out.
+    """
+    layout = field_keys(compiled)
+    sections = {section_key: dict((slugify(field.label), (key, field)) for key, field in keyed)
+                for section_key, _, keyed in layout}
+    headings = {slugify(name): section_key for section_key, name, _ in layout}
+    record = {}
+    current = 'summary'
+    for line in text.splitlines():
+        line = _LINE_MARKUP.sub('', line).strip()
+        if not line:
+            continue
+        label, sep, raw = line.partition(':')
+        if not sep or not raw.strip():
+            current = headings.get(slugify(line.rstrip(':')), current)
+            continue
+        slug = slugify(label)
+        candidates = [current] + [key for key in sections if key != current]
+        for section_key in candidates:
+            match = sections.get(section_key, {}).get(slug)
+            if match is None:
+                continue
+            key, field = match
+            value, ok = coerce_value(field_kind(field), raw)
+            if ok and value is not None:
+                record.setdefault(section_key, {}).setdefault(key, value)
+            break
+    return record
@@ -0,0 +1,255 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+
+DEFAULT_TEMPLATE_CACHE_DIR = os.path.join('/tmp', 'lease_term_sheet', 'templates')
+# Bump when the compiled representation changes so stale cache files are ignored
+COMPILER_VERSION = 2
+
+# Numbered upper-case template headings such as "3. BASE RENT"
+_NUMBERED_HEADING = re.compile(r'^\s*\d{1,2}\.\s+([A-Z][A-Z0-9 &/\'-]+)\s*$')
+# Fill-in slots: {{PLACEHOLDER}} in the HTML template, [Placeholder] in text templates
+_PLACEHOLDER = re.compile(r'\{\{\s*([^}]+?)\s*\}\}|\[([^\]]+)\]')
+_BULLET = re.compile(r'^[-*•]\s*')
+# Designed slot names such as COMMENCEMENT_DATE make better labels than prose
+_IDENTIFIER = re.compile(r'^[A-Z][A-Z0-9]*(?:_[A-Z0-9]+)+$')
+
+class TemplateField:
+    """One fill-in line of a template section"""
+    __slots__ = ('label', 'placeholders', 'line')
+
+    def __init__(self, label, placeholders, line):
+        self.label = label
+        self.placeholders = placeholders
+        self.line = line
+
+class TemplateSection:
+    """A template heading and the fields listed under it"""
+    __slots__ = ('name', 'fields')
+
+    def __init__(self, name, fields):
+        self.name = name
+        self.fields = fields
+
+class CompiledTemplate:
+    """Parsed structure of a term sheet template
+
+    header holds the fields above the first section (title, parties, ...).
+    """
+    __slots__ = ('digest', 'text', 'header', 'sections')
+
+    def __init__(self, digest, text, header, sections):
+        self.digest = digest
+        self.text = text
+        self.header = header
+        self.sections = sections
+
+    @property
+    def section_names(self):
+        return [section.name for section in self.sections]
+
+    @property
+    def fields(self):
+        """All fields, header first, in template order"""
+        fields = list(self.header)
+        for section in self.sections:
+            fields.extend(section.fields)
+        return fields
+
+    def section(self, name):
+        return next((section for section in self.sections if section.name == name), None)
+
+    def to_dict(self):
+        def fields(items):
+            return [[field.label, field.placeholders, field.line] for field in items]
+        return {'digest': self.digest, 'text': self.text, 'header': fields(self.header),
+                'sections': [[section.name, fields(section.fields)] for section in self.sections]}
+
+def template_from_dict(data):
+    """Rebuild a CompiledTemplate from its to_dict() form"""
+    def fields(items):
+        return [TemplateField(label, list(placeholders), line) for label, placeholders, line in items]
+    return CompiledTemplate(data['digest'], data['text'], fields(data['header']),
+                            [TemplateSection(name, fields(items)) for name, items in data['sections']])
+
+def _is_heading_like(line):
+    return (0 < len(line) <= 40 and line[0].isupper() and not line.endswith(':')
+            and '{{' not in line and '[' not in line)
+
+def find_section_headings(lines):
+    """Return the section headings among non-blank, stripped template lines
+
+    Numbered upper-case headings ("1. PREMISES") are used when present.
+    Otherwise a short title line standing alone between filled-in lines is
+    taken as a heading, which matches the table rows of the HTML template.
+    """
+    numbered = [m.group(1).strip() for m in map(_NUMBERED_HEADING.match, lines) if m]
+    if numbered:
+        return numbered
+
+    sections = []
+    for i, line in enumerate(lines):
+        if not _is_heading_like(line):
+            continue
+        prev_line = lines[i - 1] if i > 0 else ''
+        next_line = lines[i + 1] if i + 1 < len(lines) else ''
+        if not _is_heading_like(prev_line) and not _is_heading_like(next_line):
+            sections.append(line)
+    return sections
+
+def _placeholders(line):
+    return [a or b for a, b in _PLACEHOLDER.findall(line)]
+
+def _humanize(placeholder):
+    # TENANT_NAME -> Tenant Name; bracketed text templates are already prose
+    words = placeholder.replace('_', ' ').split()
+    return ' '.join(word.capitalize() if word.isupper() else word for word in words)
+
+def _parse_fields(lines):
+    fields = []
+    pending_label = None
+    for line in lines:
+        body = _BULLET.sub('', line)
+        placeholders = _placeholders(body)
+        if not placeholders:
+            # A short "Commencement Date:" line labels the slot that follows it
+            pending_label = body[:-1].strip() if body.endswith(':') and len(body) <= 40 else None
+            continue
+
+        remainder = ' '.join(_PLACEHOLDER.sub(' ', body).split()).strip(' .,$%-–')
+        if ':' in body and _PLACEHOLDER.search(body.split(':', 1)[0]) is None:
+            label = body.split(':', 1)[0].strip()
+        elif pending_label:
+            label = pending_label
+        elif _IDENTIFIER.match(placeholders[0]) or len(remainder.split()) < 2:
+            label = _humanize(placeholders[0])
+        else:
+            label = remainder
+        pending_label = None
+        fields.append(TemplateField(label, placeholders, line))
+    return fields
+
+def parse_template(text):
+    """Parse template text into a CompiledTemplate (uncached)"""
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    headings = set(find_section_headings(lines))
+
+    header_lines = []
+    sections = []
+    current_name = None
+    current_lines = []
+    for line in lines:
+        name = _NUMBERED_HEADING.match(line)
+        name = name.group(1).strip() if name else line
+        if name in headings and name not in (section.name for section in sections):
+            if current_name is not None:
+                sections.append(TemplateSection(current_name, _parse_fields(current_lines)))
+            current_name = name
+            current_lines = []
+        elif current_name is None:
+            header_lines.append(line)
+        else:
+            current_lines.append(line)
+    if current_name is not None:
+        sections.append(TemplateSection(current_name, _parse_fields(current_lines)))
+
+    digest = hashlib.sha256(text.encode('utf-8')).hexdigest()
+    return CompiledTemplate(digest, text, _parse_fields(header_lines), sections)
+
+class TemplateCache:
+    """Compiled templates cached in memory (LRU) and as JSON on disk by content hash
+
+    The disk tier is plain data, never unpickled, so a file planted in a
+    shared cache directory cannot run code; one whose text does not match
+    its digest is ignored.
+    """
+    def __init__(self, directory=DEFAULT_TEMPLATE_CACHE_DIR, max_memory_entries=128):
+        self.directory = directory
+        self.max_memory_entries = max_memory_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.v{COMPILER_VERSION}.json")
+
+    def get(self, key):
+        with self._lock:
+            compiled = self._memory.get(key)
+            if compiled is not None:
+                self._memory.move_to_end(key)
+                return compiled
+        try:
+            with open(self._path(key), 'r', encoding='utf-8') as f:
+                compiled = template_from_dict(json.load(f))
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        if hashlib.sha256(compiled.text.encode('utf-8')).hexdigest() != compiled.digest:
+            return None
+        self._remember(key, compiled)
+        return compiled
+
+    def put(self, key, compiled):
+        self._remember(key, compiled)
+        # Write to a temporary file first so readers never see a partial file
+        tmp_path = f"{self._path(key)}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(compiled.to_dict(), f, ensure_ascii=False, separators=(',', ':'))
+            os.replace(tmp_path, self._path(key))
+        except OSError:
+            # The disk tier is best-effort; the memory tier still has it
+            pass
+
+    def _remember(self, key, compiled):
+        with self._lock:
+            self._memory[key] = compiled
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_entries:
+                self._memory.popitem(last=False)
+
+_cache = None
+
+def get_template_cache():
+    """Return the process-wide TemplateCache (TEMPLATE_CACHE_DIR sets its directory)"""
+    global _cache
+    if _cache is None:
+        _cache = TemplateCache(os.environ.get('TEMPLATE_CACHE_DIR', DEFAULT_TEMPLATE_CACHE_DIR))
+    return _cache
+
+def compile_template(text):
+    """Return the CompiledTemplate for template text, reusing cached compilations"""
+    cache = get_template_cache()
+    key = hashlib.sha256(text.encode('utf-8')).hexdigest()
+    compiled = cache.get(key)
+    if compiled is None:
+        compiled = parse_template(text)
+        cache.put(key, compiled)
+    return compiled
+
+def compile_template_upload(data, filename, read_text):
+    """Return the CompiledTemplate for an uploaded template file
+
+    The upload bytes are hashed first, so a template that was uploaded
+    before is neither re-extracted nor re-parsed.
+
+    Args:
+        data: The raw uploaded bytes
+        filename: The upload's filename (its extension selects the reader)
+        read_text: Callable (data) -> template text, used on a cache miss
+    """
+    digest = hashlib.sha256()
+    digest.update(os.path.splitext(filename)[1].lower().encode('utf-8'))
+    digest.update(b'\0')
+    digest.update(data)
+    key = f"upload-{digest.hexdigest()}"
+
+    cache = get_template_cache()
+    compiled = cache.get(key)
+    if compiled is None:
+        compiled = compile_template(read_text(data))
+        cache.put(key, compiled)
+    return compiled
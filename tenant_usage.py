@@ -0,0 +1,263 @@
+import contextvars
+import hmac
+import logging
+import os
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+from metrics import Counter, Histogram, register
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LEDGER_PATH = os.path.join('/tmp', 'lease_term_sheet', 'usage.db')
+DEFAULT_TENANT = 'default'
+# Longest tenant name kept; longer names are cut
+MAX_TENANT_LENGTH = 64
+
+TENANT_TOKENS = register(Counter(
+    'term_sheet_tenant_tokens_total', 'Gemini tokens used, by tenant and direction', ['tenant', 'direction']))
+TENANT_CALL_SECONDS = register(Histogram(
+    'term_sheet_tenant_call_seconds', 'Latency of Gemini calls by tenant in seconds', ['tenant'],
+    buckets=(0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)))
+TENANT_REJECTIONS = register(Counter(
+    'term_sheet_tenant_rejections_total', 'Jobs rejected by admission control', ['tenant', 'reason']))
+
+# The tenant Gemini calls on this thread or task are accounted to
+_tenant = contextvars.ContextVar('tenant', default=DEFAULT_TENANT)
+
+def clean_tenant(name):
+    """Normalize a tenant name from a header or form; empty names are the default tenant"""
+    name = ''.join(c for c in (name or '').strip() if c.isalnum() or c in '-_.@')
+    return name[:MAX_TENANT_LENGTH] or DEFAULT_TENANT
+
+def current_tenant():
+    return _tenant.get()
+
+@contextmanager
+def tenant_context(tenant):
+    """Account Gemini calls made inside the block to tenant"""
+    token = _tenant.set(clean_tenant(tenant))
+    try:
+        yield
+    finally:
+        _tenant.reset(token)
+
+def _today():
+    return datetime.now(timezone.utc).date().isoformat()
+
+def seconds_until_midnight():
+    """Seconds until daily budgets reset (midnight UTC)"""
+    now = datetime.now(timezone.utc)
+    tomorrow = datetime.combine(now.date() + timedelta(days=1), datetime.min.time(), timezone.utc)
+    return int((tomorrow - now).total_seconds()) + 1
+
+class UsageLedger:
+    """Per-tenant Gemini usage, persisted in SQLite
+
+    One row per day, tenant, API key and model holds call, error and 429
+    counts, input/output tokens and total and slowest call latency. API
+    keys are stored by their pool label, never in full. Rows older than
+    retention_days are deleted as new days begin.
+    """
+    def __init__(self, path=DEFAULT_LEDGER_PATH, retention_days=90):
+        self.path = path
+        self.retention_days = retention_days
+        self._pruned_day = None
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute("""CREATE TABLE IF NOT EXISTS usage (
+                day TEXT NOT NULL,
+                tenant TEXT NOT NULL,
+                api_key TEXT NOT NULL,
+                model TEXT NOT NULL,
+                calls INTEGER NOT NULL DEFAULT 0,
+                errors INTEGER NOT NULL DEFAULT 0,
+                rate_limited INTEGER NOT NULL DEFAULT 0,
+                input_tokens INTEGER NOT NULL DEFAULT 0,
+                output_tokens INTEGER NOT NULL DEFAULT 0,
+                seconds REAL NOT NULL DEFAULT 0,
+                max_seconds REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (day, tenant, api_key, model)
+            )""")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def record(self, tenant, api_key, model, input_tokens=0, output_tokens=0, seconds=0.0,
+               error=False, rate_limited=False):
+        """Add one Gemini call to a tenant's usage; failures are logged, not raised"""
+        TENANT_TOKENS.inc(input_tokens, tenant=tenant, direction='input')
+        TENANT_TOKENS.inc(output_tokens, tenant=tenant, direction='output')
+        TENANT_CALL_SECONDS.observe(seconds, tenant=tenant)
+        day = _today()
+        try:
+            with self._connect() as conn:
+                conn.execute("""INSERT INTO usage (day, tenant, api_key, model, calls, errors, rate_limited,
+                                    input_tokens, output_tokens, seconds, max_seconds)
+                                VALUES (?, ?, ?, ?, 1, ?, ?, ?, ?, ?, ?)
+                                ON CONFLICT (day, tenant, api_key, model) DO UPDATE SET
+                                    calls = calls + 1,
+                                    errors = errors + excluded.errors,
+                                    rate_limited = rate_limited + excluded.rate_limited,
+                                    input_tokens = input_tokens + excluded.input_tokens,
+                                    output_tokens = output_tokens + excluded.output_tokens,
+                                    seconds = seconds + excluded.seconds,
+                                    max_seconds = MAX(max_seconds, excluded.max_seconds)""",
+                             (day, tenant, api_key, model, int(error), int(rate_limited),
+                              input_tokens, output_tokens, seconds, seconds))
+                if self._pruned_day != day:
+                    cutoff = (datetime.now(timezone.utc).date() - timedelta(days=self.retention_days)).isoformat()
+                    conn.execute('DELETE FROM usage WHERE day < ?', (cutoff,))
+                    self._pruned_day = day
+        except sqlite3.Error as e:
+            logger.warning('Could not record usage for %s: %s', tenant, e)
+
+    def tokens_today(self, tenant):
+        """Input plus output tokens a tenant has used since midnight UTC"""
+        with self._connect() as conn:
+            row = conn.execute('SELECT SUM(input_tokens + output_tokens) FROM usage WHERE day = ? AND tenant = ?',
+                               (_today(), tenant)).fetchone()
+        return row[0] or 0
+
+    def summary(self, days=1, by_key=False):
+        """Usage per tenant (and API key with by_key) over the last days, heaviest first"""
+        since = (datetime.now(timezone.utc).date() - timedelta(days=days - 1)).isoformat()
+        group = 'tenant, api_key' if by_key else 'tenant'
+        with self._connect() as conn:
+            rows = conn.execute(f"""SELECT {group}, SUM(calls), SUM(errors), SUM(rate_limited),
+                                        SUM(input_tokens), SUM(output_tokens), SUM(seconds), MAX(max_seconds)
+                                    FROM usage WHERE day >= ? GROUP BY {group}
+                                    ORDER BY SUM(input_tokens + output_tokens) DESC""", (since,)).fetchall()
+        names = ['tenant', 'api_key'] if by_key else ['tenant']
+        summary = []
+        for row in rows:
+            entry = dict(zip(names, row))
+            calls, errors, rate_limited, input_tokens, output_tokens, seconds, max_seconds = row[len(names):]
+            entry.update(calls=calls, errors=errors, rate_limited=rate_limited, input_tokens=input_tokens,
+                         output_tokens=output_tokens, mean_seconds=round(seconds / calls, 3) if calls else 0.0,
+                         max_seconds=round(max_seconds, 3))
+            summary.append(entry)
+        return summary
+
+_ledger = None
+
+def create_usage_ledger():
+    """Create a UsageLedger configured from environment variables"""
+    return UsageLedger(
+        path=os.environ.get('USAGE_LEDGER_PATH', DEFAULT_LEDGER_PATH),
+        retention_days=int(os.environ.get('USAGE_RETENTION_DAYS', '90')),
+    )
+
+def get_usage_ledger():
+    """Return the process-wide UsageLedger"""
+    global _ledger
+    if _ledger is None:
+        _ledger = create_usage_ledger()
+    return _ledger
+
+class TenantError(Exception):
+    """A request named a tenant that is not configured, or without its key"""
+
+def parse_tenant_keys(value):
+    """Parse "team-a=key-a,team-b=key-b" into {tenant: key}"""
+    keys = {}
+    for item in (value or '').split(','):
+        name, _, key = item.partition('=')
+        if name.strip() and key.strip():
+            keys[clean_tenant(name)] = key.strip()
+    return keys
+
+class TenantDirectory:
+    """The tenants usage may be accounted to
+
+    Only configured names are accepted, so clients cannot invent tenants to
+    escape their limits and the per-tenant metrics stay bounded. A tenant
+    with a key must also present it, so others cannot charge usage to it.
+    The default tenant is always accepted without a key.
+    """
+    def __init__(self, names=(), keys=None):
+        self.keys = keys or {}
+        self.names = {DEFAULT_TENANT, *(clean_tenant(name) for name in names), *self.keys}
+
+    def resolve(self, name, key=None):
+        """Return the configured tenant for name, raising TenantError otherwise"""
+        tenant = clean_tenant(name)
+        if tenant not in self.names:
+            raise TenantError(f"Unknown team {tenant!r}; ask an administrator to add it to TENANTS.")
+        expected = self.keys.get(tenant)
+        if expected and not hmac.compare_digest(expected.encode(), (key or '').encode()):
+            raise TenantError(f"Team {tenant!r} requires its team key.")
+        return tenant
+
+def create_tenant_directory():
+    """Create a TenantDirectory of TENANTS, TENANT_KEYS and the tenants in TENANT_BUDGETS"""
+    names = [name for name in os.environ.get('TENANTS', '').split(',') if name.strip()]
+    names += list(parse_budgets(os.environ.get('TENANT_BUDGETS')))
+    return TenantDirectory(names, parse_tenant_keys(os.environ.get('TENANT_KEYS')))
+
+class AdmissionError(Exception):
+    """A job was refused before reaching Gemini; retry_after is in seconds"""
+    def __init__(self, message, reason, retry_after):
+        super().__init__(message)
+        self.reason = reason
+        self.retry_after = retry_after
+
+def parse_budgets(value):
+    """Parse "team-a=2000000,team-b=500000" into {tenant: daily tokens}"""
+    budgets = {}
+    for item in (value or '').split(','):
+        name, _, tokens = item.partition('=')
+        if name.strip() and tokens.strip():
+            budgets[clean_tenant(name)] = int(tokens)
+    return budgets
+
+class AdmissionControl:
+    """Decides whether a tenant's job may be queued at all
+
+    A job is refused when the tenant already has max_queued jobs waiting or
+    running, or has used its daily token budget (0: no limit for either).
+    Jobs that are admitted wait in the job queue, which can also limit how
+    many of a tenant's jobs run at once.
+    """
+    def __init__(self, ledger, daily_tokens=0, budgets=None, max_queued=0, retry_after=30):
+        self.ledger = ledger
+        self.daily_tokens = daily_tokens
+        self.budgets = budgets or {}
+        self.max_queued = max_queued
+        self.retry_after = retry_after
+
+    def budget(self, tenant):
+        return self.budgets.get(tenant, self.daily_tokens)
+
+    def check(self, tenant, queued=0):
+        """Raise AdmissionError if tenant may not queue another job"""
+        if self.max_queued and queued >= self.max_queued:
+            TENANT_REJECTIONS.inc(tenant=tenant, reason='queue_full')
+            raise AdmissionError(f"{queued} jobs are already queued for {tenant}; try again shortly.",
+                                 'queue_full', self.retry_after)
+        budget = self.budget(tenant)
+        if budget:
+            used = self.ledger.tokens_today(tenant)
+            if used >= budget:
+                TENANT_REJECTIONS.inc(tenant=tenant, reason='budget')
+                raise AdmissionError(f"{tenant} has used its daily budget of {budget:,} tokens "
+                                     f"({used:,} used); it resets at midnight UTC.",
+                                     'budget', seconds_until_midnight())
+
+def create_admission_control(ledger=None):
+    """Create an AdmissionControl configured from environment variables"""
+    return AdmissionControl(
+        ledger or get_usage_ledger(),
+        daily_tokens=int(os.environ.get('TENANT_DAILY_TOKENS', '0')),
+        budgets=parse_budgets(os.environ.get('TENANT_BUDGETS')),
+        max_queued=int(os.environ.get('TENANT_MAX_QUEUED', '0')),
+        retry_after=int(os.environ.get('ADMISSION_RETRY_AFTER_SECONDS', '30')),
+    )
@@ -0,0 +1,18 @@
+import os
+import sys
+import tempfile
+
+# Tests import the root modules directly and never reach Gemini or the shared /tmp caches
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+_scratch = tempfile.mkdtemp(prefix='lease-term-sheet-tests-')
+for name, value in {
+    'GEMINI_STUB': 'on',
+    'GEMINI_API_KEYS': 'test-key-1,test-key-2',
+    'TEXT_CACHE_DIR': os.path.join(_scratch, 'text'),
+    'TEMPLATE_CACHE_DIR': os.path.join(_scratch, 'templates'),
+    'RESULT_CACHE_PATH': os.path.join(_scratch, 'results.db'),
+    'RESULT_STORE_PATH': os.path.join(_scratch, 'store.db'),
+    'LEASE_INDEX_PATH': os.path.join(_scratch, 'index.db'),
+    'USAGE_LEDGER_PATH': os.path.join(_scratch, 'usage.db'),
+}.items():
+    os.environ.setdefault(name, value)
@@ -0,0 +1,28 @@
+import csv
+import os
+
+import batch_generate
+from rent_analytics import LeaseTerms, analyze_leases, terms_from_dict
+
+def test_lease_terms_survive_the_journal():
+    terms = LeaseTerms(60, 10000, 0.03, abatement_months=2, ti_allowance=50000, size_sf=5000,
+                       steps=[(0, 10000.0), (12, 10500.0)])
+    restored = terms_from_dict(terms.to_dict())
+    assert analyze_leases([restored])['npv'][0] == analyze_leases([terms])['npv'][0]
+
+def test_resumed_runs_keep_earlier_leases_in_the_rent_summary(tmp_path, monkeypatch):
+    source = tmp_path / 'leases'
+    source.mkdir()
+    monkeypatch.setattr(batch_generate, 'rent_terms_for', lambda record, term_sheet: LeaseTerms(60, 10000))
+    output_dir = str(tmp_path / 'out')
+    arguments = [str(source), '--output-dir', output_dir, '--extract-workers', '1', '--render-workers', '1']
+
+    (source / 'first.txt').write_text('Lease between Landlord and Tenant for Suite 100.\n' * 20)
+    assert batch_generate.main(arguments) == 0
+    (source / 'second.txt').write_text('Lease between Landlord and Tenant for Suite 200.\n' * 20)
+    assert batch_generate.main(arguments) == 0
+
+    with open(os.path.join(output_dir, 'summary.csv'), newline='') as f:
+        rows = list(csv.DictReader(f))
+    assert [os.path.basename(row['path']) for row in rows] == ['first.txt', 'second.txt']
+    assert all(float(row['total_rent']) == 600000 for row in rows)
@@ -0,0 +1,19 @@
+from chunked_analysis import extract_chunk_facts
+from lease_core.template import DEFAULT_TEMPLATE
+from metrics import request_log, timed, current_request_id
+from tenant_usage import tenant_context, current_tenant
+
+LEASE = '\n'.join(f"ARTICLE {number}\n" + 'Tenant shall pay rent monthly. ' * 40 for number in range(1, 13))
+
+def test_map_calls_keep_the_callers_tenant_and_request_log():
+    seen = []
+
+    def generate(prompt, max_output_tokens):
+        with timed('map_call'):
+            seen.append((current_tenant(), current_request_id()))
+        return 'facts'
+    with request_log('request-1') as record, tenant_context('legal'):
+        mapped = extract_chunk_facts(DEFAULT_TEMPLATE, LEASE, generate, chunk_size=2000, concurrency=4)
+    assert len(mapped.chunk_timings) > 1
+    assert set(seen) == {('legal', 'request-1')}
+    assert 'map_call' in record['stages']
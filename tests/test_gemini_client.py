@@ -0,0 +1,120 @@
+import asyncio
+import functools
+import threading
+import time
+
+import pytest
+from google.api_core import exceptions as api_exceptions
+
+import gemini_client
+from gemini_client import GeminiClient, StubModel, TokenBucket
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(gemini_client, 'BACKOFF_BASE_SECONDS', 0)
+
+def stub_client(max_retries=4, **model_options):
+    models = []
+
+    def factory(model_name):
+        model = StubModel(model_name, **model_options)
+        models.append(model)
+        return model
+    client = GeminiClient('stub-key', rate_per_minute=6000, burst=100, max_retries=max_retries,
+                          model_factory=factory)
+    return client, models
+
+def test_generate_returns_text_and_usage():
+    client, _ = stub_client()
+    usage = []
+    text = client.generate('stub-model', 'x' * 400, on_usage=usage.append)
+    assert text.startswith('STUB TERM SHEET\nModel: stub-model')
+    assert usage[0].prompt_token_count == 100
+
+def test_generate_json_mode_returns_empty_object():
+    client, _ = stub_client()
+    assert client.generate('stub-model', 'prompt', {'response_mime_type': 'application/json'}) == '{}'
+
+def test_stream_yields_lines_in_order_and_usage_at_the_end():
+    client, _ = stub_client()
+    usage = []
+    chunks = list(client.stream('stub-model', 'x' * 40, on_usage=usage.append))
+    assert len(chunks) == 3
+    assert ''.join(chunks) == client.generate('stub-model', 'x' * 40)
+    assert len(usage) == 1 and usage[0].prompt_token_count == 10
+
+def test_async_generate_and_stream():
+    client, _ = stub_client()
+
+    async def run():
+        text = await client.generate_async('stub-model', 'prompt')
+        streamed = [chunk async for chunk in client.stream_async('stub-model', 'prompt')]
+        return text, ''.join(streamed)
+    text, streamed = asyncio.run_coroutine_threadsafe(run(), gemini_client._get_loop()).result()
+    assert text == streamed
+
+def test_retryable_errors_are_retried():
+    client, models = stub_client(max_retries=2, fail_first=2)
+    assert client.generate('stub-model', 'prompt').startswith('STUB TERM SHEET')
+    assert models[0].calls == 3
+
+def test_retries_give_up_after_max_retries():
+    client, models = stub_client(max_retries=1, fail_first=2)
+    with pytest.raises(api_exceptions.ServiceUnavailable):
+        client.generate('stub-model', 'prompt')
+    assert models[0].calls == 2
+
+def test_stream_is_retried_before_the_first_text():
+    client, models = stub_client(max_retries=1, fail_first=1)
+    assert ''.join(client.stream('stub-model', 'prompt')).startswith('STUB TERM SHEET')
+    assert models[0].calls == 2
+
+def test_models_are_created_once_per_name():
+    client, models = stub_client()
+    client.generate('stub-model', 'prompt')
+    client.generate('stub-model', 'prompt')
+    client.generate('other-model', 'prompt')
+    assert [model.model_name for model in models] == ['stub-model', 'other-model']
+    assert models[0].calls == 2
+
+def test_clients_are_shared_per_api_key():
+    assert gemini_client.get_gemini_client('key-a') is gemini_client.get_gemini_client('key-a')
+    assert gemini_client.get_gemini_client('key-a') is not gemini_client.get_gemini_client('key-b')
+
+def test_stub_mode_clients_list_no_models():
+    assert GeminiClient('stub-key').list_models() == []
+
+def test_calls_queue_behind_the_in_flight_limit():
+    in_flight = []
+    peak = []
+    lock = threading.Lock()
+
+    class CountingModel(StubModel):
+        async def generate_content_async(self, contents, generation_config=None, stream=False):
+            with lock:
+                in_flight.append(1)
+                peak.append(len(in_flight))
+            try:
+                return await super().generate_content_async(contents, generation_config, stream)
+            finally:
+                with lock:
+                    in_flight.pop()
+
+    client = GeminiClient('stub-key', rate_per_minute=6000, burst=100, max_in_flight=2,
+                          model_factory=functools.partial(CountingModel, latency=0.05))
+    threads = [threading.Thread(target=client.generate, args=('stub-model', 'prompt')) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert max(peak) == 2
+
+def test_token_bucket_limits_the_rate_after_the_burst():
+    async def run():
+        bucket = TokenBucket(rate_per_second=20, burst=2)
+        started = time.monotonic()
+        for _ in range(4):
+            await bucket.acquire()
+        return time.monotonic() - started
+    # Two calls go at once, the next two wait 1/20 s each
+    assert asyncio.run(run()) >= 0.09
@@ -0,0 +1,97 @@
+import pytest
+from google.api_core import exceptions as api_exceptions
+
+from lease_core import generation
+from lease_core.generation import stream_term_sheet, generate_term_sheet, GenerationError
+from lease_core.template import DEFAULT_TEMPLATE
+
+LEASE = 'This Lease is made between Acme Landlord LLC and Widget Tenant Inc. for Suite 400.\n' * 20
+
+def test_term_sheet_streams_and_is_then_served_from_the_result_cache():
+    lease = LEASE + 'Streaming case.\n'
+    chunks = list(stream_term_sheet(DEFAULT_TEMPLATE, lease, None))
+    assert len(chunks) > 1
+    assert chunks[0].startswith('STUB TERM SHEET')
+
+    cache = generation.get_result_cache()
+    hits = cache.stats()['hits']
+    cached = list(stream_term_sheet(DEFAULT_TEMPLATE, lease, None))
+    assert cached == [''.join(chunks)]
+    assert cache.stats()['hits'] == hits + 1
+
+def test_different_leases_are_not_served_from_each_other():
+    first = generate_term_sheet(DEFAULT_TEMPLATE, LEASE + 'First lease.\n', None)
+    second = generate_term_sheet(DEFAULT_TEMPLATE, LEASE * 2 + 'Second lease.\n', None)
+    assert first != second
+
+def calls_by_model(monkeypatch):
+    """Record the model of every generate or stream call generation makes"""
+    calls = []
+    get_client = generation.get_gemini_client
+
+    class Recorder:
+        def __init__(self, client):
+            self.client = client
+
+        def generate(self, model_name, *args, **kwargs):
+            calls.append(('generate', model_name))
+            return self.client.generate(model_name, *args, **kwargs)
+
+        def stream(self, model_name, *args, **kwargs):
+            calls.append(('stream', model_name))
+            return self.client.stream(model_name, *args, **kwargs)
+    monkeypatch.setattr(generation, 'get_gemini_client', lambda api_key=None: Recorder(get_client(api_key)))
+    return calls
+
+def test_streaming_goes_straight_to_the_final_tier(monkeypatch):
+    calls = calls_by_model(monkeypatch)
+    list(stream_term_sheet(DEFAULT_TEMPLATE, LEASE + 'Final tier only.\n', None))
+    assert calls == [('stream', generation.MODEL_NAME)]
+
+def test_generate_tries_the_fast_tiers_first(monkeypatch):
+    calls = calls_by_model(monkeypatch)
+    generate_term_sheet(DEFAULT_TEMPLATE, LEASE + 'Routed.\n', None)
+    # The stub's term sheet fails the quality checks, so every fast tier escalates
+    assert calls == [('generate', model) for model in generation.model_router.fast_tiers] + \
+        [('stream', generation.MODEL_NAME)]
+
+def failing_stream(monkeypatch, after_lines):
+    """Make every final-tier stream fail with a 503 after yielding after_lines lines"""
+    get_client = generation.get_gemini_client
+
+    class FailingStream:
+        def __init__(self, client):
+            self.client = client
+
+        def generate(self, *args, **kwargs):
+            return self.client.generate(*args, **kwargs)
+
+        def stream(self, *args, **kwargs):
+            for number, text in enumerate(self.client.stream(*args, **kwargs)):
+                if number == after_lines:
+                    raise api_exceptions.ServiceUnavailable('stream reset')
+                yield text
+    monkeypatch.setattr(generation, 'get_gemini_client', lambda api_key=None: FailingStream(get_client(api_key)))
+
+def test_a_stream_failing_midway_raises_and_is_not_cached(monkeypatch):
+    failing_stream(monkeypatch, after_lines=2)
+    lease = LEASE + 'Fails mid-stream.\n'
+    chunks = []
+    with pytest.raises(GenerationError, match='stream reset'):
+        for text in stream_term_sheet(DEFAULT_TEMPLATE, lease, None):
+            chunks.append(text)
+    assert len(chunks) == 2
+    monkeypatch.undo()
+    assert list(stream_term_sheet(DEFAULT_TEMPLATE, lease, None)) != [''.join(chunks)]
+
+def test_generate_raises_instead_of_returning_a_truncated_term_sheet(monkeypatch):
+    failing_stream(monkeypatch, after_lines=1)
+    with pytest.raises(GenerationError):
+        generate_term_sheet(DEFAULT_TEMPLATE, LEASE + 'Truncated.\n', None)
+
+def test_routed_term_sheets_are_not_served_to_streaming_callers(monkeypatch):
+    lease = LEASE + 'Cached by batch.\n'
+    generate_term_sheet(DEFAULT_TEMPLATE, lease, None)
+    calls = calls_by_model(monkeypatch)
+    list(stream_term_sheet(DEFAULT_TEMPLATE, lease, None))
+    assert calls == [('stream', generation.MODEL_NAME)]
@@ -0,0 +1,68 @@
+import functools
+import os
+
+import pytest
+from google.api_core import exceptions as api_exceptions
+
+from gemini_client import GeminiClient, StubModel, StubQuota
+from key_pool import KeyPool, KeyPoolExhausted
+from tenant_usage import UsageLedger, tenant_context
+
+def test_stub_quota_rejects_calls_over_requests_per_minute():
+    quota = StubQuota(requests_per_minute=2)
+    quota.charge(10)
+    quota.charge(10)
+    with pytest.raises(api_exceptions.ResourceExhausted):
+        quota.charge(10)
+
+def test_stub_quota_rejects_calls_over_tokens_per_minute():
+    quota = StubQuota(tokens_per_minute=100)
+    quota.charge(60)
+    with pytest.raises(api_exceptions.ResourceExhausted):
+        quota.charge(60)
+    quota.charge(40)
+
+def stub_pool(tmp_path, keys, stub_requests_per_minute=0, requests_per_minute=100, wait_seconds=0):
+    quotas = {}
+
+    def client_factory(api_key):
+        quotas[api_key] = StubQuota(stub_requests_per_minute)
+        return GeminiClient(api_key, rate_per_minute=6000, burst=100, max_retries=0,
+                            model_factory=functools.partial(StubModel, quota=quotas[api_key]))
+    ledger = UsageLedger(os.path.join(tmp_path, 'usage.db'))
+    pool = KeyPool([f"stub-key-{number}" for number in range(keys)], requests_per_minute=requests_per_minute,
+                   wait_seconds=wait_seconds, client_factory=client_factory, ledger=ledger)
+    return pool, ledger
+
+def test_pool_spreads_calls_over_keys(tmp_path):
+    pool, ledger = stub_pool(tmp_path, keys=3)
+    for _ in range(6):
+        pool.generate('stub-model', 'prompt')
+    assert [key['requests_last_minute'] for key in pool.stats()] == [2, 2, 2]
+    assert sum(entry['calls'] for entry in ledger.summary(by_key=True)) == 6
+
+def test_pool_fails_over_when_a_key_is_rate_limited(tmp_path):
+    # The pool assumes 100 calls a minute, but the stub keys allow only 2
+    pool, ledger = stub_pool(tmp_path, keys=2, stub_requests_per_minute=2)
+    for _ in range(4):
+        pool.generate('stub-model', 'prompt')
+    with pytest.raises(KeyPoolExhausted):
+        pool.generate('stub-model', 'prompt')
+    usage = ledger.summary()[0]
+    assert usage['calls'] - usage['rate_limited'] == 4
+    assert usage['rate_limited'] >= 2
+
+def test_pool_waits_no_longer_than_wait_seconds(tmp_path):
+    pool, _ = stub_pool(tmp_path, keys=1, requests_per_minute=1)
+    pool.generate('stub-model', 'prompt')
+    with pytest.raises(KeyPoolExhausted) as excinfo:
+        pool.generate('stub-model', 'prompt')
+    assert 0 < excinfo.value.retry_after <= 61
+
+def test_pool_accounts_calls_to_the_current_tenant(tmp_path):
+    pool, ledger = stub_pool(tmp_path, keys=2)
+    with tenant_context('legal'):
+        pool.generate('stub-model', 'x' * 400)
+    pool.generate('stub-model', 'x' * 400)
+    assert {entry['tenant']: entry['calls'] for entry in ledger.summary()} == {'legal': 1, 'default': 1}
+    assert ledger.tokens_today('legal') > 100
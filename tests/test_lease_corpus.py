@@ -0,0 +1,32 @@
+import pytest
+
+from lease_corpus import AMENDMENT, EXHIBIT, LEASE, classify_document
+
+@pytest.mark.parametrize('filename, text, expected', [
+    # Body text that mentions other documents does not make a lease one of them
+    ('lease.pdf', 'OFFICE LEASE\nThe Premises are shown on Exhibit A.', (LEASE, None)),
+    ('lease.pdf', 'OFFICE LEASE\nRent Schedule\nMonths 1-12 $10,000', (LEASE, None)),
+    ('lease.pdf', 'OFFICE LEASE\nThis Lease and any amendment hereto are the entire agreement.', (LEASE, None)),
+    ('lease.pdf', 'Amendment. This Lease may be amended only in writing.', (LEASE, None)),
+    ('lease.pdf', 'Schedule of Base Rent', (LEASE, None)),
+    # Titles at the start of the text
+    ('scan.pdf', 'SECOND AMENDMENT TO LEASE\nThis Second Amendment is made...', (AMENDMENT, 2)),
+    ('scan.pdf', 'Amendment No. 3 to Office Lease', (AMENDMENT, 3)),
+    ('scan.pdf', '3rd Amendment to Lease', (AMENDMENT, 3)),
+    ('scan.pdf', 'ADDENDUM TO LEASE', (AMENDMENT, None)),
+    ('scan.pdf', 'EXHIBIT B - RENT SCHEDULE', (EXHIBIT, None)),
+    ('scan.pdf', 'Rider 1\nParking', (EXHIBIT, None)),
+    # The filename takes precedence over the text
+    ('first_amendment.pdf', 'OFFICE LEASE', (AMENDMENT, 1)),
+    ('Exhibit-C.pdf', 'SECOND AMENDMENT TO LEASE', (EXHIBIT, None)),
+    ('lease.pdf', '', (LEASE, None)),
+])
+def test_classify_document(filename, text, expected):
+    assert classify_document(filename, text) == expected
+
+def test_titles_further_down_are_ignored():
+    text = '\n'.join(['OFFICE LEASE'] + ['Recital line.'] * 10 + ['FIRST AMENDMENT TO LEASE'])
+    assert classify_document('lease.pdf', text) == (LEASE, None)
+
+def test_sentences_starting_with_amendment_are_not_titles():
+    assert classify_document('lease.pdf', 'Amendment of this Lease requires consent.') == (LEASE, None)
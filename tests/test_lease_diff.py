@@ -0,0 +1,40 @@
+from lease_diff import diff_lease, REVISION_MAX_CHANGED_RATIO
+from pdf_extract import join_pages
+
+def lease_articles(extra_clause=''):
+    articles = []
+    for number in range(1, 21):
+        body = ' '.join(f"Clause {number}.{line} of the lease binds Landlord and Tenant." for line in range(1, 9))
+        if number == 5:
+            body += extra_clause
+        articles.append(f"ARTICLE {number} - TERMS\n{body}")
+    return '\n'.join(articles)
+
+def paginate(text, page_lines=3):
+    lines = text.splitlines()
+    return join_pages((number, '\n'.join(lines[start:start + page_lines]))
+                      for number, start in enumerate(range(0, len(lines), page_lines), 1))
+
+def reflow(text, width=70):
+    # Rewrap every line, as a PDF does when a clause moves text down the page
+    wrapped = []
+    for line in text.splitlines():
+        while len(line) > width:
+            wrapped.append(line[:width])
+            line = line[width:]
+        wrapped.append(line)
+    return '\n'.join(wrapped)
+
+def test_moved_page_breaks_are_not_changes():
+    prior = paginate(reflow(lease_articles()))
+    revised = paginate(reflow(lease_articles(' Tenant may install a rooftop antenna.')), page_lines=4)
+    diff = diff_lease(prior, revised)
+    assert len(diff.changes) == 1
+    assert 'rooftop antenna' in diff.changes[0].new_text
+    assert '[p' not in diff.changes[0].new_text
+    assert diff.changed_ratio < REVISION_MAX_CHANGED_RATIO / 2
+
+def test_corpus_tags_are_not_changes():
+    prior = '\n\n'.join(f"[D1 p{number}] ARTICLE {number}\nRent is due." for number in range(1, 6))
+    revised = '\n\n'.join(f"[D1 p{number + 1}] ARTICLE {number}\nRent is due." for number in range(1, 6))
+    assert diff_lease(prior, revised).changes == []
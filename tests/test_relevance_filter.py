@@ -0,0 +1,35 @@
+from relevance_filter import split_passages, filter_lease_text, PASSAGE_CHARS
+
+TEMPLATE = """PARKING
+Parking Spaces: [Number]
+
+INSURANCE
+Liability Limit: [Amount]
+"""
+
+def docx_lease(articles=60):
+    # join_blocks puts one paragraph per line, with no blank lines between them
+    lines = []
+    for number in range(1, articles + 1):
+        lines.append(f"ARTICLE {number} - GENERAL PROVISIONS")
+        lines.extend(f"Clause {number}.{clause}. Landlord and Tenant agree to the general provisions "
+                     f"set out here, which bind their successors and assigns." for clause in range(1, 9))
+    lines[200] = 'Tenant shall have 40 unreserved parking spaces in the garage.'
+    lines[400] = 'Tenant shall carry commercial general liability insurance with limits of $2,000,000.'
+    return '\n'.join(lines)
+
+def test_long_paragraphs_are_split_into_passages():
+    passages = split_passages(docx_lease())
+    assert len(passages) > 40
+    assert max(map(len, passages)) <= PASSAGE_CHARS
+
+def test_lines_longer_than_a_passage_are_split_at_sentences():
+    line = ' '.join(f"Sentence {number} of one very long HTML paragraph." for number in range(200))
+    passages = split_passages(line)
+    assert len(passages) > 1 and max(map(len, passages)) <= PASSAGE_CHARS
+    assert all(passage.endswith('paragraph.') for passage in passages)
+
+def test_docx_text_is_filtered_to_relevant_passages():
+    result = filter_lease_text(docx_lease(), TEMPLATE)
+    assert result.filtered_chars < result.original_chars / 4
+    assert 'parking spaces' in result.text and 'liability insurance' in result.text
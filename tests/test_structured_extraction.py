@@ -0,0 +1,24 @@
+from lease_core.template import DEFAULT_COMPILED_TEMPLATE
+from structured_extraction import field_keys, field_kind, AREA, DATE, INTEGER, MONEY, PERCENT, TEXT
+
+def default_template_kinds():
+    return {f"{section_key}.{key}": field_kind(field)
+            for section_key, _, keyed in field_keys(DEFAULT_COMPILED_TEMPLATE) for key, field in keyed}
+
+def test_default_template_field_kinds():
+    kinds = default_template_kinds()
+    assert kinds['cam.cam_due_day'] == INTEGER
+    assert kinds['base_rent.rent_due_day'] == INTEGER
+    assert kinds['premises.size'] == AREA
+    assert kinds['lease_dates.commencement_date'] == DATE
+    assert kinds['base_rent.monthly_rent_1'] == MONEY
+    assert kinds['cam.cam_cost_1'] == MONEY
+    assert kinds['security_deposit.security_deposit'] == MONEY
+    assert kinds['base_rent.increase_1'] == PERCENT
+    assert kinds['holding_over.holding_over'] == PERCENT
+    assert kinds['term.term_years'] == INTEGER
+    assert kinds['radius.radius'] == INTEGER
+    assert {kinds[f"insurance.insurance_type_{number}"] for number in range(1, 5)} == {TEXT}
+
+def test_only_the_premises_size_is_typed_as_area():
+    assert [key for key, kind in default_template_kinds().items() if kind == AREA] == ['premises.size']
@@ -0,0 +1,85 @@
+import os
+import threading
+import time
+
+import pytest
+
+from job_queue import JobQueue, DONE, FAILED
+from tenant_usage import AdmissionControl, AdmissionError, TenantDirectory, TenantError, UsageLedger
+
+def test_directory_accepts_only_configured_tenants():
+    tenants = TenantDirectory(['legal', 'acquisitions'])
+    assert tenants.resolve(' legal ') == 'legal'
+    assert tenants.resolve('') == 'default'
+    with pytest.raises(TenantError):
+        tenants.resolve('made-up-team')
+
+def test_directory_requires_a_tenants_key():
+    tenants = TenantDirectory(['legal'], keys={'acquisitions': 's3cret'})
+    assert tenants.resolve('acquisitions', 's3cret') == 'acquisitions'
+    assert tenants.resolve('legal') == 'legal'
+    with pytest.raises(TenantError):
+        tenants.resolve('acquisitions')
+    with pytest.raises(TenantError):
+        tenants.resolve('acquisitions', 'guess')
+
+@pytest.fixture
+def ledger(tmp_path):
+    return UsageLedger(os.path.join(tmp_path, 'usage.db'))
+
+def test_admission_has_no_limits_by_default(ledger):
+    ledger.record('legal', 'key-1', 'stub-model', input_tokens=10 ** 9)
+    AdmissionControl(ledger).check('legal', queued=1000)
+
+def test_admission_refuses_a_full_queue(ledger):
+    admission = AdmissionControl(ledger, max_queued=2, retry_after=7)
+    admission.check('legal', queued=1)
+    with pytest.raises(AdmissionError) as excinfo:
+        admission.check('legal', queued=2)
+    assert (excinfo.value.reason, excinfo.value.retry_after) == ('queue_full', 7)
+
+def test_admission_refuses_a_tenant_over_its_budget(ledger):
+    admission = AdmissionControl(ledger, daily_tokens=1000, budgets={'legal': 100})
+    ledger.record('legal', 'key-1', 'stub-model', input_tokens=80, output_tokens=30)
+    ledger.record('acquisitions', 'key-1', 'stub-model', input_tokens=500)
+    with pytest.raises(AdmissionError) as excinfo:
+        admission.check('legal')
+    assert excinfo.value.reason == 'budget'
+    admission.check('acquisitions')
+
+def run_blocked_jobs(queue, tenant, count):
+    release = threading.Event()
+    started = []
+    lock = threading.Lock()
+
+    def job():
+        with lock:
+            started.append(tenant)
+        release.wait(5)
+    job_ids = [queue.submit_for(tenant, job) for _ in range(count)]
+    return release, started, job_ids
+
+def wait_for(queue, job_ids):
+    for job_id in job_ids:
+        while queue.get(job_id).status not in (DONE, FAILED):
+            time.sleep(0.01)
+
+def test_job_queue_runs_a_tenants_jobs_on_every_worker_by_default():
+    queue = JobQueue(max_workers=4)
+    release, started, job_ids = run_blocked_jobs(queue, 'legal', 4)
+    time.sleep(0.2)
+    assert len(started) == 4
+    release.set()
+    wait_for(queue, job_ids)
+    queue.shutdown()
+
+def test_job_queue_limits_a_tenant_when_configured():
+    queue = JobQueue(max_workers=4, max_per_tenant=2)
+    release, started, job_ids = run_blocked_jobs(queue, 'legal', 4)
+    time.sleep(0.2)
+    assert len(started) == 2
+    assert queue.queued('legal') == 4
+    release.set()
+    wait_for(queue, job_ids)
+    assert len(started) == 4 and queue.queued('legal') == 0
+    queue.shutdown()
@@ -0,0 +1,33 @@
+from token_budget import compact_lease_text
+
+def lease_pages(count, body):
+    return '\n'.join(f"[p{number}]\nACME TOWER - OFFICE LEASE\n{body(number)}\nPage {number} of {count}\nTenant initials ____"
+                     for number in range(1, count + 1))
+
+def test_running_headers_and_footers_are_dropped():
+    compaction = compact_lease_text(lease_pages(4, lambda number: f"Section {number}. Rent is due monthly."))
+    assert 'ACME TOWER' not in compaction.text
+    assert 'Tenant initials' not in compaction.text
+    assert '[p3]\n' in compaction.text and 'Section 3. Rent is due monthly.' in compaction.text
+    assert (compaction.repeated_lines, compaction.page_numbers) == (8, 4)
+
+def test_lines_repeated_within_pages_are_kept():
+    def body(number):
+        return (f"Section {number}.1 Intentionally Omitted.\nMonths 1-12   $10.00 per RSF\n"
+                f"Section {number}.2 Intentionally Omitted.\nMonths 1-12   $10.00 per RSF\nEnd of section {number}.")
+    compaction = compact_lease_text(lease_pages(4, body))
+    assert compaction.text.count('Intentionally Omitted.') == 8
+    assert compaction.text.count('Months 1-12 $10.00 per RSF') == 8
+
+def test_repeated_lines_without_page_breaks_are_kept():
+    rows = '\n'.join(['Year 1 Base Rent $10.00 per RSF'] * 5)
+    assert compact_lease_text(f"Rent Schedule\n{rows}\nEnd of schedule").text.count('Year 1 Base Rent') == 5
+
+def test_hyphens_are_kept_unless_the_lease_spells_the_word_whole():
+    text = compact_lease_text('The ten-\nant shall pay rent. The tenant pays for twenty-\nfive years.').text
+    assert 'The tenant shall pay rent.' in text
+    assert 'twenty-five years' in text
+
+def test_hyphenated_compounds_stay_hyphenated():
+    text = compact_lease_text('A build-out allowance. The build-\nout is paid by the landlord.').text
+    assert text.count('build-out') == 2
@@ -0,0 +1,161 @@
+import hashlib
+import os
+import threading
+import zlib
+from collections import OrderedDict
+
+from metrics import Counter, register
+
+DEFAULT_TEXT_CACHE_DIR = os.path.join('/tmp', 'lease_term_sheet', 'text')
+# Bump when a reader's output changes so text extracted by the old readers is ignored
+EXTRACTOR_VERSION = 2
+# Upload bytes hashed per read
+HASH_CHUNK_SIZE = 1024 * 1024
+
+TEXT_CACHE_LOOKUPS = register(Counter(
+    'term_sheet_text_cache_lookups_total', 'Extracted-text cache lookups by result',
+    ['result']))
+
+def content_key(digest, filename):
+    """Cache key for an upload's content digest and the reader its extension selects"""
+    ext = os.path.splitext(filename)[1].lower()
+    return f"{digest}-{ext.lstrip('.') or 'txt'}-v{EXTRACTOR_VERSION}"
+
+def hash_stream(stream, sink=None, chunk_size=HASH_CHUNK_SIZE):
+    """Return the sha256 hex digest of a stream, read once in chunks
+
+    Each chunk is also written to sink when given, so an upload can be
+    hashed while it is being copied into memory or a file.
+    """
+    digest = hashlib.sha256()
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        digest.update(chunk)
+        if sink is not None:
+            sink.write(chunk)
+    return digest.hexdigest()
+
+def hash_file(file, filename):
+    """Return the content key of a seekable file, leaving it at position 0"""
+    if hasattr(file, 'seek'):
+        file.seek(0)
+    digest = hash_stream(file)
+    file.seek(0)
+    return content_key(digest, filename)
+
+def normalize_text(text):
+    # Newline styles differ between readers and platforms; NULs break prompts
+    return text.replace('\r\n', '\n').replace('\r', '\n').replace('\x00', '')
+
+class TextCache:
+    """Extracted document text cached in memory (LRU) and zlib-compressed on disk
+
+    The disk tier is bounded by max_disk_bytes; the least recently used
+    files are deleted first (hits refresh a file's modification time).
+    """
+    def __init__(self, directory=DEFAULT_TEXT_CACHE_DIR, max_memory_entries=32,
+                 max_disk_bytes=512 * 1024 * 1024):
+        self.directory = directory
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._disk_bytes = sum(entry.stat().st_size for entry in os.scandir(directory)
+                               if entry.name.endswith('.txt.z'))
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.txt.z")
+
+    def get(self, key):
+        with self._lock:
+            text = self._memory.get(key)
+            if text is not None:
+                self._memory.move_to_end(key)
+                TEXT_CACHE_LOOKUPS.inc(result='memory_hit')
+                return text
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                text = zlib.decompress(f.read()).decode('utf-8')
+            os.utime(path)
+        except (OSError, zlib.error, UnicodeDecodeError):
+            TEXT_CACHE_LOOKUPS.inc(result='miss')
+            return None
+        TEXT_CACHE_LOOKUPS.inc(result='disk_hit')
+        self._remember(key, text)
+        return text
+
+    def put(self, key, text):
+        self._remember(key, text)
+        data = zlib.compress(text.encode('utf-8'), 6)
+        if len(data) > self.max_disk_bytes:
+            return
+        # Write to a temporary file first so readers never see a partial entry
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            # The disk tier is best-effort; the memory tier still has it
+            return
+        with self._lock:
+            self._disk_bytes += len(data)
+            if self._disk_bytes > self.max_disk_bytes:
+                self._evict()
+
+    def get_or_extract(self, key, extract):
+        """Return the cached text for key, or extract(), normalize and cache it"""
+        text = self.get(key)
+        if text is None:
+            text = normalize_text(extract())
+            self.put(key, text)
+        return text
+
+    def _remember(self, key, text):
+        with self._lock:
+            self._memory[key] = text
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_entries:
+                self._memory.popitem(last=False)
+
+    def _evict(self):
+        # Called with the lock held; rescan so other processes' writes are counted
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.txt.z'):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        # Evict down to 90% so a full cache does not rescan on every write
+        target = self.max_disk_bytes * 0.9
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+        self._disk_bytes = total
+
+_cache = None
+
+def get_text_cache():
+    """Return the process-wide TextCache configured from environment variables"""
+    global _cache
+    if _cache is None:
+        _cache = TextCache(
+            directory=os.environ.get('TEXT_CACHE_DIR', DEFAULT_TEXT_CACHE_DIR),
+            max_memory_entries=int(os.environ.get('TEXT_CACHE_MEMORY_ENTRIES', '32')),
+            max_disk_bytes=int(os.environ.get('TEXT_CACHE_MAX_BYTES', str(512 * 1024 * 1024))),
+        )
+    return _cache
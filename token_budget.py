@@ -0,0 +1,249 @@
+import logging
+import math
+import os
+import re
+import threading
+from collections import Counter
+
+from chunked_analysis import CHUNKED_MIN_CHARS
+from metrics import Histogram, register, accumulate
+
+logger = logging.getLogger(__name__)
+
+# Characters per token assumed until a model's actual usage has been seen
+DEFAULT_CHARS_PER_TOKEN = 4.0
+# Weight of the newest call when calibrating a model's characters per token
+CALIBRATION_SMOOTHING = 0.2
+# Lease text beyond this many tokens is compacted, then analyzed chunk by
+# chunk if it is still over (defaults to the chunked analysis threshold)
+PROMPT_TOKEN_BUDGET = int(os.environ.get('PROMPT_TOKEN_BUDGET', str(CHUNKED_MIN_CHARS // 4)))
+# Prompts estimated above this are refused before they are sent
+MAX_PROMPT_TOKENS = int(os.environ.get('MAX_PROMPT_TOKENS', '1000000'))
+# max_output_tokens is sized from the template: a base plus an allowance per field
+OUTPUT_TOKENS_BASE = 256
+OUTPUT_TOKENS_PER_FIELD = int(os.environ.get('OUTPUT_TOKENS_PER_FIELD', '40'))
+MIN_OUTPUT_TOKENS = 1024
+MAX_OUTPUT_TOKENS = int(os.environ.get('MAX_OUTPUT_TOKENS', '8192'))
+# A line at the top or bottom of this many pages is a running header or footer
+REPEATED_LINE_MIN_COUNT = 3
+# Text lines at each end of a page checked for running headers and footers
+PAGE_EDGE_LINES = 3
+
+TOKEN_ESTIMATE_RATIO = register(Histogram(
+    'term_sheet_token_estimate_ratio', 'Actual prompt tokens over the local estimate, by model', ['model'],
+    buckets=(0.5, 0.75, 0.9, 1.0, 1.1, 1.25, 1.5, 2)))
+
+_CORPUS_TAG = re.compile(r'^(\[D\d+(?: p\d+)?\] )')
+_PAGE_NUMBER = re.compile(r'^(?:page\s+\d+(?:\s+of\s+\d+)?|\d+\s+of\s+\d+|-\s*\d+\s*-)$', re.I)
+_BOILERPLATE = re.compile(r'^[\W_]*(?:(?:this\s+)?page\s+(?:is\s+)?intentionally\s+(?:left\s+)?blank|'
+                          r'signature\s+pages?\s+follows?|'
+                          r'remainder\s+of\s+(?:this\s+)?page\s+(?:is\s+)?intentionally\s+(?:left\s+)?blank)[\W_]*$',
+                          re.I)
+_LEADERS = re.compile(r'(?:\.\s?){4,}|(?:-\s?){4,}|(?:=\s?){4,}|(?:\*\s?){4,}')
+_BLANKS = re.compile(r'_{4,}')
+_SPACES = re.compile(r'[ \t\u00a0]+')
+_PAGE_MARKER = re.compile(r'^\[p\d+\]$')
+_HYPHENATED = re.compile(r'\b([A-Za-z]+)-\n([a-z]+)\b')
+_HYPHENATED_WORD = re.compile(r'\b[A-Za-z]+-[A-Za-z]+\b')
+_WORD = re.compile(r'[A-Za-z]+')
+_BLANK_LINES = re.compile(r'\n{3,}')
+
+class TokenEstimator:
+    """Local prompt token estimates, calibrated per model from actual usage
+
+    Starts at DEFAULT_CHARS_PER_TOKEN and moves each model's ratio toward
+    the one its responses report, so no count_tokens round trip is needed.
+    """
+    def __init__(self, chars_per_token=DEFAULT_CHARS_PER_TOKEN):
+        self.default = chars_per_token
+        self._ratios = {}
+        self._lock = threading.Lock()
+
+    def chars_per_token(self, model_name=None):
+        with self._lock:
+            return self._ratios.get(model_name, self.default)
+
+    def estimate(self, text, model_name=None):
+        return math.ceil(len(text) / self.chars_per_token(model_name))
+
+    def observe(self, model_name, chars, tokens):
+        if not chars or not tokens:
+            return
+        with self._lock:
+            previous = self._ratios.get(model_name, self.default)
+            self._ratios[model_name] = previous + CALIBRATION_SMOOTHING * (chars / tokens - previous)
+
+estimator = TokenEstimator()
+
+class Compaction:
+    """Compacted lease text and what was removed from it"""
+    def __init__(self, text, original_chars, repeated_lines, page_numbers, boilerplate, hyphenations):
+        self.text = text
+        self.original_chars = original_chars
+        self.repeated_lines = repeated_lines
+        self.page_numbers = page_numbers
+        self.boilerplate = boilerplate
+        self.hyphenations = hyphenations
+
+    def summary(self):
+        ratio = len(self.text) / self.original_chars if self.original_chars else 1.0
+        return (f"Compacted lease text {self.original_chars:,} -> {len(self.text):,} characters ({ratio:.0%}): "
+                f"{self.repeated_lines} header/footer lines, {self.page_numbers} page numbers, "
+                f"{self.boilerplate} boilerplate lines, {self.hyphenations} hyphenations")
+
+def _line_key(line):
+    return _SPACES.sub(' ', line).strip().lower()
+
+def _rejoin_hyphenations(text):
+    # "ten-\nant" becomes "tenant" only when the lease spells "tenant" elsewhere and
+    # never "ten-ant"; otherwise the hyphen is kept ("twenty-\nfive" -> "twenty-five")
+    words = {word.lower() for word in _WORD.findall(text)}
+    hyphenated = {word.lower() for word in _HYPHENATED_WORD.findall(text)}
+
+    def rejoin(match):
+        first, second = match.groups()
+        joined = f"{first}{second}".lower()
+        if joined in words and f"{first}-{second}".lower() not in hyphenated:
+            return first + second
+        return f"{first}-{second}"
+    return _HYPHENATED.subn(rejoin, text)
+
+def _pages(lines, breaks):
+    # Pages start at [pN] marker lines, form feeds and corpus tags naming a new page
+    pages = [[]]
+    last_tag = None
+    for index, (tag, body) in enumerate(lines):
+        if (_PAGE_MARKER.match(body) or index in breaks or (tag and tag != last_tag)) and pages[-1]:
+            pages.append([])
+        last_tag = tag or last_tag
+        pages[-1].append(index)
+    return pages
+
+def _page_edges(page, bodies):
+    # The first and last PAGE_EDGE_LINES text lines of a page, outermost first
+    text_lines = [index for index in page if bodies[index] and not _PAGE_MARKER.match(bodies[index])
+                  and not _PAGE_NUMBER.match(bodies[index]) and not _BOILERPLATE.match(bodies[index])]
+    return text_lines[:PAGE_EDGE_LINES], text_lines[::-1][:PAGE_EDGE_LINES]
+
+def compact_lease_text(text):
+    """Shrink lease text without dropping terms
+
+    Collapses runs of spaces, TOC leader dots and fill-in blanks; drops
+    page numbers, "intentionally left blank" style lines and running
+    headers and footers (lines at the top or bottom of
+    REPEATED_LINE_MIN_COUNT or more pages); and rejoins words hyphenated
+    across lines. Lines repeated within pages, such as identical rent
+    schedule rows, are kept. Corpus tags ("[D1 p3] ") are kept even when
+    the rest of their line is dropped.
+    """
+    original_chars = len(text)
+    text, hyphenations = _rejoin_hyphenations(text.replace('\r\n', '\n').replace('\f', '\n\f'))
+
+    lines = []
+    breaks = set()
+    for line in text.split('\n'):
+        if line.startswith('\f'):
+            breaks.add(len(lines))
+            line = line.lstrip('\f')
+        match = _CORPUS_TAG.match(line)
+        tag = match.group(1) if match else ''
+        body = _BLANKS.sub('___', _LEADERS.sub(' ', line[len(tag):]))
+        lines.append((tag, _SPACES.sub(' ', body).strip()))
+    bodies = [body for _, body in lines]
+    edges = [_page_edges(page, bodies) for page in _pages(lines, breaks)]
+
+    # A header or footer line sits at the same distance from the page edge on every page
+    counts = Counter()
+    for top, bottom in edges:
+        counts.update({(side, offset, _line_key(bodies[index]))
+                       for side, indices in (('top', top), ('bottom', bottom))
+                       for offset, index in enumerate(indices) if 8 <= len(bodies[index]) <= 100})
+    repeated = {key for key, count in counts.items() if count >= REPEATED_LINE_MIN_COUNT}
+    # Only the outermost repeated lines of a page go, so text below a header is kept
+    headers = set()
+    for top, bottom in edges:
+        for side, indices in (('top', top), ('bottom', bottom)):
+            for offset, index in enumerate(indices):
+                if (side, offset, _line_key(bodies[index])) not in repeated:
+                    break
+                headers.add(index)
+
+    kept = []
+    repeated_lines = page_numbers = boilerplate = 0
+    for index, (tag, _) in enumerate(lines):
+        body = bodies[index]
+        if body and _PAGE_NUMBER.match(body):
+            page_numbers += 1
+            body = ''
+        elif body and _BOILERPLATE.match(body):
+            boilerplate += 1
+            body = ''
+        elif index in headers:
+            repeated_lines += 1
+            body = ''
+        if tag or body or (kept and kept[-1]):
+            kept.append((tag + body).rstrip())
+    compacted = _BLANK_LINES.sub('\n\n', '\n'.join(kept)).strip() + '\n'
+    return Compaction(compacted, original_chars, repeated_lines, page_numbers, boilerplate, hyphenations)
+
+class PromptTooLarge(Exception):
+    """A prompt was estimated over MAX_PROMPT_TOKENS and not sent"""
+
+class LeaseBudget:
+    """Lease text fitted to the prompt budget
+
+    text is compacted when the original was over budget; over_budget says
+    it is still over afterwards, so it should be analyzed in chunks.
+    """
+    def __init__(self, text, tokens, budget, compaction=None):
+        self.text = text
+        self.tokens = tokens
+        self.budget = budget
+        self.compaction = compaction
+
+    @property
+    def over_budget(self):
+        return self.tokens > self.budget
+
+def budget_lease_text(lease_text, model_name=None, budget=PROMPT_TOKEN_BUDGET):
+    """Estimate lease_text's tokens and compact it if they exceed budget"""
+    tokens = estimator.estimate(lease_text, model_name)
+    accumulate(lease_tokens_estimated=tokens)
+    if tokens <= budget:
+        return LeaseBudget(lease_text, tokens, budget)
+    compaction = compact_lease_text(lease_text)
+    compacted_tokens = estimator.estimate(compaction.text, model_name)
+    logger.info('%s; about %s -> %s tokens (budget %s)', compaction.summary(),
+                f"{tokens:,}", f"{compacted_tokens:,}", f"{budget:,}")
+    return LeaseBudget(compaction.text, compacted_tokens, budget, compaction)
+
+def output_token_budget(field_count):
+    """max_output_tokens for a term sheet of field_count template fields"""
+    return max(MIN_OUTPUT_TOKENS, min(MAX_OUTPUT_TOKENS, OUTPUT_TOKENS_BASE + field_count * OUTPUT_TOKENS_PER_FIELD))
+
+def output_budget_for_text(text, model_name=None):
+    """max_output_tokens for rewriting text (a revised term sheet), with a quarter to spare"""
+    tokens = int(estimator.estimate(text, model_name) * 1.25) + OUTPUT_TOKENS_BASE
+    return max(MIN_OUTPUT_TOKENS, min(MAX_OUTPUT_TOKENS, tokens))
+
+def check_prompt(prompt, model_name, label=''):
+    """Estimate a prompt's tokens, refuse it if over MAX_PROMPT_TOKENS, and return a usage callback
+
+    The callback, given the response's usage metadata, logs estimated
+    against actual prompt tokens and calibrates the estimator.
+    """
+    estimated = estimator.estimate(prompt, model_name)
+    if estimated > MAX_PROMPT_TOKENS:
+        raise PromptTooLarge(f"The prompt is about {estimated:,} tokens, over the limit of "
+                             f"{MAX_PROMPT_TOKENS:,}; use a shorter lease or enable the relevance filter")
+    accumulate(input_tokens_estimated=estimated)
+
+    def on_usage(usage):
+        actual = getattr(usage, 'prompt_token_count', 0) or 0
+        if not actual:
+            return
+        TOKEN_ESTIMATE_RATIO.observe(actual / estimated, model=model_name)
+        estimator.observe(model_name, len(prompt), actual)
+        logger.info('Prompt tokens for %s on %s: estimated %s, actual %s (%+.1f%%)', label or 'call', model_name,
+                    f"{estimated:,}", f"{actual:,}", (estimated - actual) / actual * 100)
+    return on_usage
@@ -0,0 +1,104 @@
+import codecs
+import io
+import mmap
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+
+from text_cache import hash_stream
+
+# Bytes copied, hashed or decoded per read
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+class MappedFile(mmap.mmap):
+    """Read-only memory map of a file on disk; path names the mapped file
+
+    Readers that hand the document to other processes (the PDF page pool)
+    pass the path instead of copying the bytes.
+    """
+    path = None
+
+    # zipfile and other readers probe these io methods, which mmap lacks before 3.13
+    def seekable(self):
+        return True
+
+    def readable(self):
+        return True
+
+@contextmanager
+def open_mapped(path):
+    """Yield a read-only, file-like memory map of path
+
+    Pages are only read from disk as a reader touches them, so a large
+    upload does not have to fit in the worker's memory at once.
+    """
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            # Empty files cannot be mapped
+            yield io.BytesIO(b'')
+            return
+        mapped = MappedFile(f.fileno(), 0, access=mmap.ACCESS_READ)
+    mapped.path = os.fspath(path)
+    try:
+        yield mapped
+    finally:
+        mapped.close()
+
+def spool_upload(stream, directory, filename, chunk_size=UPLOAD_CHUNK_SIZE):
+    """Copy an upload stream into a new file in directory, hashing it on the way
+
+    Returns:
+        (path, sha256 hex digest, size in bytes)
+    """
+    suffix = os.path.splitext(filename)[1].lower()
+    fd, path = tempfile.mkstemp(prefix='upload-', suffix=suffix, dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as sink:
+            digest = hash_stream(stream, sink=sink, chunk_size=chunk_size)
+    except BaseException:
+        remove_upload(path)
+        raise
+    return path, digest, os.path.getsize(path)
+
+def remove_upload(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+def remove_stale_uploads(directory, max_age_seconds):
+    """Delete spooled uploads left behind by jobs that never finished"""
+    cutoff = time.time() - max_age_seconds
+    removed = 0
+    for entry in os.scandir(directory):
+        if entry.name.startswith('upload-'):
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+                    removed += 1
+            except OSError:
+                continue
+    return removed
+
+def iter_text_chunks(file, encoding='utf-8', errors='strict', chunk_size=UPLOAD_CHUNK_SIZE):
+    """Yield the text of a file a chunk at a time
+
+    Bytes are decoded incrementally, so multi-byte characters split across
+    chunks decode correctly. Text-mode files are passed through.
+    """
+    decoder = codecs.getincrementaldecoder(encoding)(errors=errors)
+    while True:
+        chunk = file.read(chunk_size)
+        if not chunk:
+            break
+        text = decoder.decode(chunk) if isinstance(chunk, bytes) else chunk
+        if text:
+            yield text
+    text = decoder.decode(b'', final=True)
+    if text:
+        yield text
+
+def read_text(file, encoding='utf-8', errors='strict'):
+    """Decode a whole file without holding its bytes and text at once"""
+    return ''.join(iter_text_chunks(file, encoding, errors))